@@ -1,72 +1,53 @@
 import streamlit as st
 import streamlit.components.v1 as components
-import requests
-from bs4 import BeautifulSoup
 import pandas as pd
-from urllib.parse import urlparse, urljoin
+from urllib.parse import urlparse
 import re
 import json
+import time
+
+from sitemap_server import CrawlCache, follow_job, url_inventory, filter_inventory
 
 # --- CONFIGURATION ---
 st.set_page_config(page_title="Sitemap CrawlSync", layout="wide")
 
 # --- SESSION STATE ---
 if 'all_urls' not in st.session_state:
-    st.session_state.all_urls = []
+    st.session_state.all_urls = url_inventory([])
 if 'ia_data' not in st.session_state:
     st.session_state.ia_data = []
 
 # --- CORE LOGIC (PYTHON NATIVE) ---
-def get_sitemap_urls(url):
-    url = url.strip()
-    if not url.startswith("http"):
-        url = "https://" + url
-    if url.endswith(".xml") or url.endswith(".xml.gz"):
-        return [url]
-
-    domain = f"{urlparse(url).scheme}://{urlparse(url).netloc}"
-    robots_url = urljoin(domain, "robots.txt")
-    sitemaps = []
-    
-    try:
-        response = requests.get(robots_url, timeout=10)
-        if response.status_code == 200:
-            for line in response.text.splitlines():
-                if line.lower().startswith("sitemap:"):
-                    sitemaps.append(line.split(":", 1)[1].strip())
-    except:
-        pass
-
-    return sitemaps if sitemaps else [urljoin(domain, "sitemap.xml")]
-
-def parse_sitemap(url, found_urls=None, searched_sitemaps=None):
-    if found_urls is None: found_urls = set()
-    if searched_sitemaps is None: searched_sitemaps = set()
-    if url in searched_sitemaps: return found_urls
-    searched_sitemaps.add(url)
-    
-    try:
-        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
-        response = requests.get(url, headers=headers, timeout=10)
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.content, 'xml')
-            
-            # 1. Sitemap Indexes
-            sitemaps = soup.find_all("sitemap")
-            for sm in sitemaps:
-                loc = sm.find("loc")
-                if loc:
-                    parse_sitemap(loc.text.strip(), found_urls, searched_sitemaps)
-            
-            # 2. Page URLs
-            urls = soup.find_all("url")
-            for tag in urls:
-                loc = tag.find("loc")
-                if loc:
-                    found_urls.add(loc.text.strip())
-    except:
-        pass
-    return found_urls
+@st.cache_resource
+def crawl_cache():
+    """One crawl cache for every session — repeat lookups of a domain are instant."""
+    return CrawlCache()
+
+@st.cache_resource(max_entries=16)
+def job_inventory(_job, job_id):
+    """URL inventory (sorted URLs + feature columns) of a finished crawl, built once per crawl."""
+    return url_inventory(_job.result["urls"] if _job.result else [])
+
+def crawl_domain(target, status, refresh=False):
+    """URL inventory for a domain, streaming sitemap progress into `status`."""
+    job, hit = crawl_cache().lookup(target, refresh=refresh)
+    seen = 0
+    if hit and job.finished:
+        seen = len(job.log)
+        st.write(f"Served from the shared cache — crawled {int(time.time() - job.finished) // 60} min ago.")
+    elif hit:
+        st.write("Already being crawled — following that crawl...")
+    else:
+        st.write("Searching robots.txt...")
+    for lines in follow_job(job, seen):
+        for line in lines:
+            if line.startswith(("Scanning:", "Using ", "Budget exhausted", "Could not fetch")):
+                st.write(line)
+        status.update(label=f"Crawling Sitemaps... {len(job.visited)} scanned, {len(job.collected):,} URLs")
+    if job.status == "error":
+        status.update(label=f"Extraction failed: {job.error}", state="error", expanded=True)
+        return url_inventory([])
+    return job_inventory(job, job.id)
 
 # --- UI LOGIC ---
 st.markdown("""
@@ -100,6 +81,7 @@ with tab_extractor:
             st.markdown("<p style='font-size: 12px; font-weight: 700; color: #9CA3AF; text-transform: uppercase;'>Target Website</p>", unsafe_allow_html=True)
             target_url = st.text_input("Domain", placeholder="pillowtalk.com.au", label_visibility="collapsed")
             start_btn = st.button("Start Deep Extraction", use_container_width=True, type="primary")
+            refresh = st.checkbox("Ignore cached results", value=False)
             
         with st.container(border=True):
             st.markdown("<p style='font-size: 12px; font-weight: 700; color: #9CA3AF; text-transform: uppercase;'>Refine Stack</p>", unsafe_allow_html=True)
@@ -109,19 +91,15 @@ with tab_extractor:
     with col_out:
         if start_btn and target_url:
             with st.status("Crawling Sitemaps...", expanded=True) as status:
-                st.write("Searching robots.txt...")
-                master_sitemaps = get_sitemap_urls(target_url)
-                all_found = set()
-                for ms in master_sitemaps:
-                    st.write(f"Scanning branch: {ms}")
-                    all_found.update(parse_sitemap(ms))
-                st.session_state.all_urls = sorted(list(all_found))
-                status.update(label="Extraction Complete!", state="complete", expanded=False)
+                st.session_state.all_urls = crawl_domain(target_url, status, refresh)
+                if len(st.session_state.all_urls):
+                    status.update(label=f"Extraction Complete! {len(st.session_state.all_urls):,} URLs",
+                                  state="complete", expanded=False)
+                else:
+                    status.update(label="No URLs found", state="error")
 
         # Filtering Logic
-        urls_to_show = [u for u in st.session_state.all_urls if 
-                        (not inc or inc.lower() in u.lower()) and 
-                        (not exc or exc.lower() not in u.lower())]
+        urls_to_show = filter_inventory(st.session_state.all_urls, inc, exc)["url"].tolist()
 
         with st.container(border=True):
             res_col1, res_col2 = st.columns([1, 1])
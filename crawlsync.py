@@ -1,9 +1,47 @@
 import streamlit as st
 import streamlit.components.v1 as components
+import json
+
+from sitemap_server import CrawlCache, follow_job
 
 # Set page config for a wide, professional workspace
 st.set_page_config(page_title="Sitemap CrawlSync", layout="wide")
 
+
+@st.cache_resource
+def crawl_cache():
+    # Shared by every session: a domain crawled once is served from here until it expires
+    return CrawlCache()
+
+
+# Sitemaps are crawled here on the server (not through public CORS proxies from
+# the browser) and the result is handed to the embedded app below.
+if "crawl" not in st.session_state:
+    st.session_state.crawl = {"target": "", "urls": [], "log": []}
+
+col_target, col_go, col_fresh = st.columns([6, 2, 2])
+target = col_target.text_input("Target Website", placeholder="pillowtalk.com.au")
+start = col_go.button("Start Deep Extraction", type="primary", use_container_width=True)
+refresh = col_fresh.checkbox("Ignore cached results")
+
+if start and target.strip():
+    job, hit = crawl_cache().lookup(target, refresh=refresh)
+    with st.status("Crawling sitemaps...", expanded=True) as status:
+        seen = len(job.log) if hit and job.finished else 0
+        if seen:
+            st.write("Served from the shared cache.")
+        for lines in follow_job(job, seen):
+            for line in lines:
+                if line.startswith(("Scanning:", "Using ", "Could not fetch", "Budget exhausted")):
+                    st.write(line)
+            status.update(label=f"Crawling sitemaps... {len(job.visited)} scanned, {len(job.collected):,} URLs")
+        urls = job.result["urls"] if job.result else []
+        if job.status == "error":
+            status.update(label=f"Extraction failed: {job.error}", state="error")
+        else:
+            status.update(label=f"Found {len(urls):,} URLs", state="complete" if urls else "error", expanded=False)
+    st.session_state.crawl = {"target": target.strip(), "urls": urls, "log": job.log[:]}
+
 # The unified HTML/JS/CSS application
 html_content = r"""
 <!doctype html>
@@ -42,8 +80,7 @@ html_content = r"""
                 <div class="lg:col-span-4 space-y-6">
                     <div class="bg-white rounded-2xl shadow-sm border border-gray-200 p-6">
                         <h2 class="text-xs font-bold text-gray-400 uppercase tracking-wider mb-4">Target Website</h2>
-                        <textarea id="sitemapInput" class="w-full h-24 p-3 bg-gray-50 border border-gray-200 rounded-lg text-sm font-mono focus:ring-2 focus:ring-black outline-none resize-none placeholder-gray-400 transition" placeholder="pillowtalk.com.au"></textarea>
-                        <button onclick="startDeepExtraction()" id="extractBtn" class="w-full mt-4 bg-black hover:bg-gray-800 text-white font-semibold py-3 px-4 rounded-xl shadow-lg transition">Start Deep Extraction</button>
+                        <div id="crawlTarget" class="text-sm font-mono text-gray-500">Enter a domain above to begin</div>
                         <div id="statusLog" class="hidden mt-4 text-xs font-mono text-gray-500 bg-gray-50 p-3 rounded border border-gray-200 h-32 overflow-y-auto scroller"></div>
                     </div>
                     <div class="bg-white rounded-2xl shadow-sm border border-gray-200 p-6">
@@ -104,7 +141,7 @@ html_content = r"""
         </div>
 
         <script>
-            const CORS_PROXY = "https://corsproxy.io/?";
+            const CRAWL = __CRAWL__;
             let allExtractedUrls = [];
             let displayedUrls = [];
             let processedIAData = [];
@@ -125,82 +162,13 @@ html_content = r"""
                 el.scrollTop = el.scrollHeight;
             }
 
-            async function fetchText(url) {
-                try {
-                    const res = await fetch(CORS_PROXY + encodeURIComponent(url));
-                    if (res.ok) return await res.text();
-                    
-                    // Fallback proxy for Cloudflare-protected sites
-                    const res2 = await fetch("https://api.allorigins.win/get?url=" + encodeURIComponent(url));
-                    const data = await res2.json();
-                    return data.contents;
-                } catch (e) { return null; }
-            }
-
-            async function discoverSitemaps(input) {
-                let url = input.trim();
-                if (!url.startsWith("http")) url = "https://" + url;
-                if (url.toLowerCase().endsWith(".xml") || url.toLowerCase().endsWith(".xml.gz")) return [url];
-
-                let robotsUrl = url.replace(/\/$/, "") + "/robots.txt";
-                log("Checking robots.txt...");
-                const robots = await fetchText(robotsUrl);
-                
-                if (robots) {
-                    // Match ALL sitemaps in the file
-                    const matches = [...robots.matchAll(/Sitemap:\s*(https?:\/\/[^\s]+)/gi)];
-                    if (matches.length > 0) {
-                        const sitemaps = matches.map(m => m[1]);
-                        log("Found " + sitemaps.length + " entry sitemaps.");
-                        return sitemaps;
-                    }
-                }
-                return [url.replace(/\/$/, "") + "/sitemap.xml"];
-            }
-
-            async function fetchSitemapRecursive(url, visited = new Set()) {
-                if (visited.has(url)) return;
-                visited.add(url);
-                
-                log("Scanning: " + url);
-                const text = await fetchText(url);
-                if (!text) return;
-                
-                const xml = new DOMParser().parseFromString(text, "text/xml");
-                const sitemaps = xml.getElementsByTagName("sitemap");
-                
-                if (sitemaps.length > 0) {
-                    for (let i = 0; i < sitemaps.length; i++) {
-                        const loc = sitemaps[i].getElementsByTagName("loc")[0]?.textContent;
-                        if (loc) await fetchSitemapRecursive(loc, visited);
-                    }
-                } else {
-                    const urls = xml.getElementsByTagName("loc");
-                    for (let i = 0; i < urls.length; i++) {
-                        allExtractedUrls.push(urls[i].textContent);
-                    }
-                    log("Collected " + urls.length + " URLs from branch.");
-                }
-            }
-
-            async function startDeepExtraction() {
-                const input = document.getElementById("sitemapInput").value;
-                if (!input) return;
-                const btn = document.getElementById("extractBtn");
-                btn.disabled = true; btn.textContent = "Crawling...";
-                document.getElementById("statusLog").innerHTML = "";
-                allExtractedUrls = [];
-
-                try {
-                    const sitemaps = await discoverSitemaps(input);
-                    for (const sm of sitemaps) {
-                        await fetchSitemapRecursive(sm);
-                    }
-                    allExtractedUrls = [...new Set(allExtractedUrls)];
-                    applyFilters();
-                    log("DONE. Total unique URLs: " + allExtractedUrls.length);
-                } catch (e) { log("Error: " + e.message); }
-                finally { btn.disabled = false; btn.textContent = "Start Deep Extraction"; }
+            // Crawled server-side by the Streamlit app; load it straight into the results
+            function loadCrawl() {
+                if (!CRAWL.target) return;
+                document.getElementById("crawlTarget").textContent = CRAWL.target;
+                CRAWL.log.forEach(log);
+                allExtractedUrls = CRAWL.urls;
+                applyFilters();
             }
 
             function applyFilters() {
@@ -286,9 +254,12 @@ html_content = r"""
                 navigator.clipboard.writeText(displayedUrls.join('\n'));
                 alert("Copied all URLs!");
             }
+
+            loadCrawl();
         </script>
     </body>
 </html>
 """
 
-components.html(html_content, height=1000, scrolling=True)
+crawl_json = json.dumps(st.session_state.crawl).replace("</", "<\\/")
+components.html(html_content.replace("__CRAWL__", crawl_json), height=1000, scrolling=True)
@@ -11,7 +11,6 @@ import sys
 import platform
 import threading
 import time
-import urllib.request
 import importlib
 import importlib.util
 
@@ -68,6 +67,7 @@ def _load_sitemap_server():
     import sitemap_server
     return sitemap_server
 
+_t_import = time.perf_counter()
 if platform.system() == "Windows":
     # On Windows, PyInstaller freezes sitemap_server as a proper module.
     # Dynamic exec_module() loading causes sub-imports to fail in the frozen bundle.
@@ -75,6 +75,7 @@ if platform.system() == "Windows":
 else:
     # On macOS the frozen module can be stale; force-load from the data file copy.
     sitemap_server = _load_sitemap_server()
+_t_import = time.perf_counter() - _t_import
 
 
 class CrawlSyncAPI:
@@ -86,221 +87,89 @@ class CrawlSyncAPI:
         )
         return result[0] if result else None
 
-    @staticmethod
-    def _add_hyperlink(para, url, text):
-        """Insert a clickable hyperlink run into para."""
-        from docx.oxml.ns import qn
-        import docx.oxml as oxml
-        r_id = para.part.relate_to(
-            url,
-            'http://schemas.openxmlformats.org/officeDocument/2006/relationships/hyperlink',
-            is_external=True,
-        )
-        hl = oxml.OxmlElement('w:hyperlink')
-        hl.set(qn('r:id'), r_id)
-        wr = oxml.OxmlElement('w:r')
-        rPr = oxml.OxmlElement('w:rPr')
-        rStyle = oxml.OxmlElement('w:rStyle')
-        rStyle.set(qn('w:val'), 'Hyperlink')
-        rPr.append(rStyle)
-        wr.append(rPr)
-        t = oxml.OxmlElement('w:t')
-        t.text = text
-        wr.append(t)
-        hl.append(wr)
-        para._p.append(hl)
-
-    @staticmethod
-    def _fill_para_from_html(para, html_str):
-        """Parse an HTML snippet and add runs/hyperlinks to an existing paragraph."""
-        from html.parser import HTMLParser
-        from docx.shared import RGBColor
-        import html as html_mod
-
-        class _P(HTMLParser):
-            def __init__(self):
-                super().__init__()
-                self._href = None
-                self._buf  = []
-                self._bold = False
-                self._ital = False
-
-            def _commit(self):
-                text = ''.join(self._buf).replace('\xa0', ' ')
-                self._buf = []
-                return text
-
-            def _flush(self):
-                text = self._commit()
-                if text:
-                    run = para.add_run(text)
-                    run.bold   = self._bold
-                    run.italic = self._ital
-
-            def _flush_link(self):
-                text = self._commit()
-                if not text:
-                    return
-                if self._href:
-                    try:
-                        CrawlSyncAPI._add_hyperlink(para, self._href, text)
-                        return
-                    except Exception:
-                        pass
-                run = para.add_run(text)
-                run.font.color.rgb = RGBColor(0x00, 0x56, 0xD2)
-
-            def handle_starttag(self, tag, attrs):
-                d = dict(attrs)
-                if tag == 'a':
-                    self._flush()
-                    self._href = d.get('href', '')
-                elif tag in ('b', 'strong'):
-                    self._flush(); self._bold = True
-                elif tag in ('i', 'em'):
-                    self._flush(); self._ital = True
-
-            def handle_endtag(self, tag):
-                if tag == 'a':
-                    self._flush_link(); self._href = None
-                elif tag in ('b', 'strong'):
-                    self._flush(); self._bold = False
-                elif tag in ('i', 'em'):
-                    self._flush(); self._ital = False
-
-            def handle_data(self, data):
-                self._buf.append(data)
-
-            def handle_entityref(self, name):
-                self._buf.append(html_mod.unescape(f'&{name};'))
-
-            def handle_charref(self, name):
-                c = chr(int(name[1:], 16) if name.startswith('x') else int(name))
-                self._buf.append(c)
-
-        p = _P()
-        p.feed(html_str)
-        p._flush()
-
     def save_files(self, folder, files):
         """Write files as .docx into folder, open in Finder, return count saved."""
-        import subprocess
         import traceback
-        from docx.shared import RGBColor
-        try:
-            import docx as _docx
-            from docx import Document
-            template = os.path.join(os.path.dirname(_docx.__file__), 'templates', 'default.docx')
-            if not os.path.exists(template):
-                template = None
-        except Exception:
-            template = None
-            Document = None
+        have_docx = sitemap_server.backend("docx") is not None
 
         saved = 0
         log   = []
-        for f in files:
-            try:
-                name = f.get('name', 'page.docx') if isinstance(f, dict) else 'page.docx'
-                path = os.path.join(folder, name)
-                if Document:
-                    doc = Document(template) if template else Document()
-
-                    # Source URL as hyperlink
-                    url = (f.get('url', '') if isinstance(f, dict) else '') or ''
-                    if url:
-                        p = doc.add_paragraph()
-                        try:
-                            self._add_hyperlink(p, url, url)
-                        except Exception:
-                            run = p.add_run(url)
-                            run.font.color.rgb = RGBColor(0x00, 0x56, 0xD2)
-                        doc.add_paragraph()
-
-                    # Sections — passed as JSON string to avoid pywebview bridge issues
-                    import json as _json
-                    raw_json = (f.get('sections_json', '[]') if isinstance(f, dict) else '[]') or '[]'
-                    sections = _json.loads(raw_json)
-
-                    seen = set()
-                    for s in sections:
-                        key = (s.get('heading', '') or '').strip().lower()
-                        if key and key in seen:
-                            continue
-                        if key:
-                            seen.add(key)
-
-                        level   = max(1, min(int(s.get('level', 1) or 1), 9))
-                        heading = (s.get('heading', '') or '').strip()
-                        if heading:
-                            doc.add_heading(heading, level=level)
-
-                        for c in (s.get('content', []) or []):
-                            ctype = c.get('type', '')
-                            if ctype == 'text':
-                                txt = (c.get('text', '') or '').strip()
-                                if txt:
-                                    doc.add_paragraph(txt)
-                            elif ctype == 'html':
-                                html_src = (c.get('html', '') or '').strip()
-                                if html_src:
-                                    p = doc.add_paragraph()
-                                    self._fill_para_from_html(p, html_src)
-                            elif ctype == 'list':
-                                for item in (c.get('items', []) or []):
-                                    if isinstance(item, dict):
-                                        item_html = item.get('html', '')
-                                        item_txt  = item.get('text', '')
-                                    else:
-                                        item_html = ''
-                                        item_txt  = str(item)
-                                    try:
-                                        lp = doc.add_paragraph(style='List Bullet')
-                                    except Exception:
-                                        lp = doc.add_paragraph()
-                                    if item_html:
-                                        self._fill_para_from_html(lp, item_html)
-                                    elif item_txt:
-                                        lp.add_run(item_txt.strip())
-                    doc.save(path)
+        files = [f if isinstance(f, dict) else {} for f in files]
+        if have_docx:
+            # Same renderer as /save-bulk-files: cached template, process pool
+            jobs = [(f, os.path.join(folder, f.get('name', 'page.docx'))) for f in files]
+            for path, err in sitemap_server._docx_render_many(sitemap_server._docx_job_to_folder, jobs):
+                if err:
+                    log.append(err)
                 else:
+                    saved += 1
+        else:
+            for f in files:
+                try:
                     # Fallback: plain text
+                    path = os.path.join(folder, f.get('name', 'page.docx'))
                     with open(path.replace('.docx', '.txt'), 'w', encoding='utf-8') as fh:
-                        fh.write(f.get('content', '') if isinstance(f, dict) else '')
-                saved += 1
-            except Exception:
-                log.append(traceback.format_exc())
+                        fh.write(f.get('content', ''))
+                    saved += 1
+                except Exception:
+                    log.append(traceback.format_exc())
 
         if saved:
-            import platform as _platform
-            try:
-                if _platform.system() == 'Windows':
-                    os.startfile(folder)
-                elif _platform.system() == 'Darwin':
-                    subprocess.Popen(['open', folder])
-                else:
-                    subprocess.Popen(['xdg-open', folder])
-            except Exception:
-                pass
+            sitemap_server._open_folder(folder)
         if log:
             with open(os.path.join(folder, '_errors.txt'), 'w') as fh:
                 fh.write('\n\n'.join(log))
         return saved
 
 
-def run_server():
+_server_error = None
+
+
+def run_server(ready=None):
+    """Serve the app on 127.0.0.1:5050.
+
+    `ready` is set once the socket is listening — or once binding has failed,
+    in which case _server_error holds the exception.
+    """
+    global _server_error
+    # CRAWLSYNC_ASGI=1 serves the async handlers under uvicorn (see
+    # sitemap_server.serve_asgi); without uvicorn installed it's ignored.
+    if os.environ.get("CRAWLSYNC_ASGI", "") not in ("", "0") and sitemap_server.backend_available("uvicorn"):
+        try:
+            sitemap_server.serve_asgi(port=5050, ready=ready)
+            return
+        except OSError as e:
+            _server_error = e
+            _server_log(f"server failed to start: {e}")
+            if ready is not None:
+                ready.set()
+            return
     # On Windows the built-in Werkzeug dev server can be unreliable in frozen
     # bundles (no console, stdout redirected to NUL).  Waitress is a
     # production-grade WSGI server that works cleanly on Windows.
+    # Both servers bind in their constructor, so connections made after
+    # `ready` is set queue on the socket until the serve loop picks them up.
     if platform.system() == "Windows":
         try:
-            from waitress import serve
-            serve(sitemap_server.app, host="127.0.0.1", port=5050, threads=4)
+            from waitress import create_server
+            server = create_server(sitemap_server.app, host="127.0.0.1", port=5050, threads=4)
+            if ready is not None:
+                ready.set()
+            server.run()
             return
         except Exception as e:
             _server_log(f"waitress failed ({e}), falling back to werkzeug")
-    sitemap_server.app.run(host="127.0.0.1", port=5050, debug=False,
-                           use_reloader=False, threaded=True)
+    from werkzeug.serving import make_server
+    try:
+        server = make_server("127.0.0.1", 5050, sitemap_server.app, threaded=True)
+    except (Exception, SystemExit) as e:    # werkzeug exits on "address in use"
+        _server_error = e
+        _server_log(f"server failed to start: {e}")
+        return
+    finally:
+        if ready is not None:
+            ready.set()
+    server.serve_forever()
 
 
 def _server_log(msg):
@@ -313,16 +182,16 @@ def _server_log(msg):
         pass
 
 
-def wait_for_server(timeout=15):
-    """Poll until Flask/Waitress is ready or timeout is reached."""
-    deadline = time.time() + timeout
-    while time.time() < deadline:
-        try:
-            urllib.request.urlopen("http://127.0.0.1:5050/ping", timeout=1)
-            return True
-        except Exception:
-            time.sleep(0.2)
-    return False
+def start_prewarm():
+    """Warm parsers, bypass backends and the headless browser in the background.
+
+    CRAWLSYNC_PREWARM=0 skips it; CRAWLSYNC_PREWARM_BROWSER=0 skips launching Chromium.
+    """
+    if os.environ.get("CRAWLSYNC_PREWARM", "1") == "0":
+        return
+    browser = os.environ.get("CRAWLSYNC_PREWARM_BROWSER", "1") != "0"
+    threading.Thread(target=sitemap_server.prewarm, kwargs={"browser": browser, "log": _server_log},
+                     name="crawlsync-prewarm", daemon=True).start()
 
 
 def _find_edge():
@@ -380,9 +249,14 @@ def main():
         except Exception:
             pass
 
-    threading.Thread(target=run_server, daemon=True).start()
+    t0 = time.perf_counter()
+    server_ready = threading.Event()
+    threading.Thread(target=run_server, args=(server_ready,), daemon=True).start()
 
-    if not wait_for_server():
+    ready = server_ready.wait(15) and _server_error is None
+    _server_log(f"startup: sitemap_server import {_t_import * 1000:.0f} ms, "
+                f"server listening after {(time.perf_counter() - t0) * 1000:.0f} ms")
+    if not ready:
         if platform.system() == "Windows":
             import tkinter as _tk
             from tkinter import messagebox as _mb
@@ -395,6 +269,8 @@ def main():
             webview.start()
         return
 
+    # The window opens straight away; cold costs are paid behind it
+    start_prewarm()
     if platform.system() == "Windows":
         _run_windows()
     else:
@@ -412,4 +288,8 @@ def main():
 
 
 if __name__ == "__main__":
+    # Bulk .docx export renders in a process pool; frozen bundles need this so
+    # worker processes run the pool bootstrap instead of launching another app.
+    import multiprocessing
+    multiprocessing.freeze_support()
     main()
@@ -7,61 +7,172 @@ Run:           python sitemap_server.py
 Then open:     sitemap + IA v2.html
 """
 
+import time
+_IMPORT_T0 = time.perf_counter()    # module import cost, reported by /backends
+
+import heapq
+import io
 import os
 import re
 import sys
-import time
-import gzip as _gzip
 import threading
+import uuid
+import html as html_mod
 import xml.etree.ElementTree as ET
+from html.parser import HTMLParser
+from collections import OrderedDict
 from urllib.parse import urlparse
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import requests
-try:
-    import cloudscraper as _cloudscraper
-    _SCRAPER = _cloudscraper.create_scraper()
-except Exception:
-    _SCRAPER = None
-
-try:
-    from curl_cffi import requests as _cffi_requests
-    _CFFI = True
-except Exception:
-    _CFFI = False
+
+# ── Optional backends — imported on first use ───────────────────────────────
+# cloudscraper, curl_cffi and Playwright together take seconds to import, which
+# the desktop app used to spend on a blank window before /ping could answer.
+# Nothing heavy is imported at startup any more: backend(name) imports (and for
+# cloudscraper, builds the scraper) the first time it's needed, records how long
+# that took, and returns None if the package is missing or broken.
+# backend_available(name) only checks the package is installed.
+
+class _Backend:
+    __slots__ = ("name", "module", "loader", "value", "loaded", "error", "seconds", "lock")
+
+    def __init__(self, name, module, loader):
+        self.name    = name
+        self.module  = module      # top-level import name, for availability checks
+        self.loader  = loader      # () -> object handed out by backend()
+        self.value   = None
+        self.loaded  = False
+        self.error   = None
+        self.seconds = None
+        self.lock    = threading.Lock()
+
+
+def _load_cloudscraper():
+    import cloudscraper
+    return cloudscraper.create_scraper()
+
+
+def _load_curl_cffi():
+    from curl_cffi import requests as cffi_requests
+    return cffi_requests
+
+
+def _load_playwright():
+    from playwright.sync_api import sync_playwright
+    return sync_playwright
+
+
+def _load_module(name):
+    import importlib
+    return lambda: importlib.import_module(name)
+
+
+_BACKENDS = {b.name: b for b in (
+    _Backend("cloudscraper", "cloudscraper", _load_cloudscraper),
+    _Backend("curl_cffi",    "curl_cffi",    _load_curl_cffi),
+    _Backend("playwright",   "playwright",   _load_playwright),
+    _Backend("bs4",          "bs4",          _load_module("bs4")),
+    _Backend("lxml",         "lxml",         _load_module("lxml.etree")),
+    _Backend("openpyxl",     "openpyxl",     _load_module("openpyxl")),
+    _Backend("docx",         "docx",         _load_module("docx")),
+    _Backend("httpx",        "httpx",        _load_module("httpx")),
+    _Backend("h2",           "h2",           _load_module("h2")),
+    _Backend("uvicorn",      "uvicorn",      _load_module("uvicorn")),
+    _Backend("gunicorn",     "gunicorn",     _load_module("gunicorn")),
+    _Backend("orjson",       "orjson",       _load_module("orjson")),
+    _Backend("brotli",       "brotli",       _load_module("brotli")),
+    _Backend("zstandard",    "zstandard",    _load_module("zstandard")),
+    _Backend("pandas",       "pandas",       _load_module("pandas")),
+)}
+
+
+def backend(name):
+    """The loaded backend object, importing it on first call; None if unavailable."""
+    b = _BACKENDS[name]
+    if not b.loaded:
+        with b.lock:
+            if not b.loaded:
+                t0 = time.perf_counter()
+                try:
+                    b.value = b.loader()
+                except Exception as e:
+                    b.error = f"{type(e).__name__}: {e}"
+                b.seconds = time.perf_counter() - t0
+                b.loaded  = True
+    return b.value
+
+
+def backend_available(name):
+    """True if the backend is (probably) usable — without importing it."""
+    b = _BACKENDS[name]
+    if b.loaded:
+        return b.value is not None
+    import importlib.util
+    try:
+        return importlib.util.find_spec(b.module) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def backend_status():
+    return {
+        name: {
+            "available": backend_available(name),
+            "loaded":    b.loaded,
+            "import_ms": round(b.seconds * 1000, 1) if b.seconds is not None else None,
+            "error":     b.error,
+        }
+        for name, b in _BACKENDS.items()
+    }
+
 
 # ── Headless browser (Playwright) — persistent background instance ───────────
-# Launched once on first use; shared across all requests via a threading lock.
+# Launched once on first use (or by prewarm()) and shared across all requests.
+# Playwright's sync API only works on the thread that started it, so every
+# browser call runs on one owner thread; request threads hand work to it.
 # Falls back gracefully when Playwright / Chromium is not available.
-try:
-    from playwright.sync_api import sync_playwright as _sync_playwright
-    _PW_AVAILABLE = True
-except ImportError:
-    _PW_AVAILABLE = False
 
 _pw_lock     = threading.Lock()
+_pw_owner    = None   # single-thread executor that owns every Playwright object
 _pw_instance = None   # playwright context manager
 _pw_browser  = None   # persistent Browser object
 
 
-def _get_pw_browser():
-    """Return the shared Playwright Browser, launching it if needed."""
+def _pw_call(fn, *args):
+    """Run fn(*args) on the Playwright owner thread and return its result."""
+    global _pw_owner
+    with _pw_lock:
+        if _pw_owner is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _pw_owner = ThreadPoolExecutor(max_workers=1, thread_name_prefix="crawlsync-pw")
+    return _pw_owner.submit(fn, *args).result()
+
+
+def _pw_launch():
     global _pw_instance, _pw_browser
-    if not _PW_AVAILABLE:
+    sync_playwright = backend("playwright")
+    if sync_playwright is None:
         return None
-    with _pw_lock:
-        if _pw_browser is None or not _pw_browser.is_connected():
-            try:
-                _pw_instance = _sync_playwright().start()
-                _pw_browser  = _pw_instance.chromium.launch(
-                    headless=True,
-                    args=["--no-sandbox", "--disable-dev-shm-usage",
-                          "--disable-blink-features=AutomationControlled"],
-                )
-            except Exception as e:
-                print(f"[Playwright] Failed to launch: {e}")
-                return None
-        return _pw_browser
+    if _pw_browser is None or not _pw_browser.is_connected():
+        try:
+            if _pw_instance is None:
+                _pw_instance = sync_playwright().start()
+            _pw_browser = _pw_instance.chromium.launch(
+                headless=True,
+                args=["--no-sandbox", "--disable-dev-shm-usage",
+                      "--disable-blink-features=AutomationControlled"],
+            )
+        except Exception as e:
+            print(f"[Playwright] Failed to launch: {e}")
+            return None
+    return _pw_browser
+
+
+def _get_pw_browser():
+    """Return the shared Playwright Browser, launching it if needed."""
+    return _pw_call(_pw_launch)
 
 
 def _render_with_playwright(url, timeout_ms=20000):
@@ -70,7 +181,11 @@ def _render_with_playwright(url, timeout_ms=20000):
     Opens a fresh BrowserContext per call (separate cookies/cache) so
     requests don't bleed into each other.  Returns None on failure.
     """
-    browser = _get_pw_browser()
+    return _pw_call(_pw_render, url, timeout_ms)
+
+
+def _pw_render(url, timeout_ms):
+    browser = _pw_launch()
     if not browser:
         return None
     ctx  = None
@@ -113,6 +228,47 @@ def _render_with_playwright(url, timeout_ms=20000):
             pass
 
 
+def prewarm(browser=True, log=None):
+    """Pay the cold-start costs up front, off the request path.
+
+    Imports the parser and bypass backends (building the cloudscraper
+    session), loads the CA bundle and charset detector every fetch touches,
+    and optionally launches the shared headless browser.  Returns a
+    {step: milliseconds} timing dict.
+    """
+    timings = {}
+
+    def step(name, fn):
+        t0 = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            if log:
+                log(f"prewarm {name} failed: {e}")
+        timings[name] = round((time.perf_counter() - t0) * 1000, 1)
+
+    def _tls():
+        import ssl
+        ssl.create_default_context(cafile=requests.certs.where())
+        http_session()
+
+    def _charset():
+        r = requests.models.Response()
+        r._content = "<html><body>prewarm é</body></html>".encode("utf-8")
+        r.apparent_encoding
+
+    for name in ("bs4", "lxml", "curl_cffi", "cloudscraper"):
+        if backend_available(name):
+            step(name, lambda name=name: backend(name))
+    step("tls", _tls)
+    step("charset", _charset)
+    if browser and backend_available("playwright"):
+        step("browser", _get_pw_browser)
+    if log:
+        log("prewarm: " + ", ".join(f"{k} {v:.0f} ms" for k, v in timings.items()))
+    return timings
+
+
 def resource_path(rel):
     # Search all candidate locations so the app works regardless of which
     # directory PyInstaller sets sys._MEIPASS to (MacOS vs Frameworks vs Resources).
@@ -138,6 +294,161 @@ CORS(app)
 app.config["MAX_CONTENT_LENGTH"] = 100 * 1024 * 1024   # 100 MB — allow large bulk-save payloads
 
 
+# ── Response encoding — fast JSON, negotiated compression ────────────────────
+# /extract can return millions of URLs and /inspect-page several MB of
+# sections and schema, so responses are built for size.  JSON goes through
+# orjson when it's installed — the same sorted, compact output as Flask's
+# provider at a fraction of the cost — and any compressible body over
+# COMPRESS_MIN_BYTES is encoded with the best codec the client accepts: zstd,
+# then brotli, then gzip.  Streamed responses (NDJSON, exports) are
+# compressed chunk by chunk with a flush after each, so progress lines still
+# reach the client as they're produced.
+
+COMPRESS_MIN_BYTES = 1024
+_COMPRESS_FILE_MAX = 8 << 20      # send_file bodies above this go out as-is
+_COMPRESSIBLE      = ("application/json", "application/x-ndjson", "application/xml",
+                      "application/javascript", "image/svg+xml", "text/")
+_CODECS            = ("zstd", "br", "gzip")      # server preference
+
+
+class _FastJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, serialising with orjson when available."""
+
+    def _orjson(self, obj, option=0):
+        orjson = backend("orjson")
+        option |= orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option)
+
+    def dumps(self, obj, **kwargs):
+        if backend("orjson") is None or set(kwargs) - {"separators"}:
+            return super().dumps(obj, **kwargs)
+        try:
+            return self._orjson(obj).decode("utf-8")
+        except TypeError:           # e.g. ints beyond 64 bits — let json try
+            return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        pretty = (self.compact is None and self._app.debug) or self.compact is False
+        if backend("orjson") is None or pretty:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        try:
+            body = self._orjson(obj, backend("orjson").OPT_APPEND_NEWLINE)
+        except TypeError:
+            return super().response(*args, **kwargs)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+app.json = _FastJSONProvider(app)
+
+
+class _Compressor:
+    """One zstd / br / gzip stream: compress() + flush() per chunk, then finish()."""
+
+    def __init__(self, enc):
+        self.enc = enc
+        if enc == "zstd":
+            self._zstd = backend("zstandard")
+            self._c    = self._zstd.ZstdCompressor(level=3).compressobj()
+        elif enc == "br":
+            self._c = backend("brotli").Compressor(quality=4)
+        else:
+            import zlib
+            self._c = zlib.compressobj(1, zlib.DEFLATED, 31)     # fastest level; wbits 31 → gzip framing
+
+    def compress(self, data):
+        return self._c.process(data) if self.enc == "br" else self._c.compress(data)
+
+    def flush(self):
+        if self.enc == "zstd":
+            return self._c.flush(self._zstd.COMPRESSOBJ_FLUSH_BLOCK)
+        if self.enc == "br":
+            return self._c.flush()
+        import zlib
+        return self._c.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._c.finish() if self.enc == "br" else self._c.flush()
+
+
+def _codec_available(enc):
+    return enc == "gzip" or backend_available({"zstd": "zstandard", "br": "brotli"}[enc])
+
+
+def negotiate_encoding(accept_encoding):
+    """The preferred codec the Accept-Encoding header allows, or None."""
+    q = {}
+    for part in (accept_encoding or "").split(","):
+        name, *params = part.strip().split(";")
+        weight = 1.0
+        for p in params:
+            k, _, v = p.strip().partition("=")
+            if k == "q":
+                try:
+                    weight = float(v)
+                except ValueError:
+                    weight = 0.0
+        if name.strip():
+            q[name.strip().lower()] = weight
+    for enc in _CODECS:
+        if q.get(enc, q.get("*", 0)) > 0 and _codec_available(enc):
+            return enc
+    return None
+
+
+def compress_bytes(data, enc):
+    c = _Compressor(enc)
+    return c.compress(data) + c.finish()
+
+
+def _compress_stream(chunks, enc):
+    c = _Compressor(enc)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            out = c.compress(chunk) + c.flush()
+            if out:
+                yield out
+        yield c.finish()
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+
+@app.after_request
+def _compress_response(response):
+    mimetype = response.mimetype or ""
+    if (response.status_code < 200 or response.status_code in (204, 206, 304)
+            or "Content-Encoding" in response.headers
+            or not mimetype.startswith(_COMPRESSIBLE)):
+        return response
+    response.vary.add("Accept-Encoding")
+    enc = negotiate_encoding(request.headers.get("Accept-Encoding"))
+    if enc is None:
+        return response
+    if response.direct_passthrough:     # send_file — small enough to encode in one go?
+        if (response.content_length or _COMPRESS_FILE_MAX + 1) > _COMPRESS_FILE_MAX:
+            return response
+        response.direct_passthrough = False
+        response.set_data(response.get_data())
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, enc)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_BYTES:
+            return response
+        response.set_data(compress_bytes(data, enc))
+    response.headers["Content-Encoding"] = enc
+    return response
+
+
 @app.route("/debug-paths")
 def debug_paths():
     import traceback
@@ -194,44 +505,434 @@ HEADERS_GOOGLEBOT = {
 }
 
 
-def _decode_response(r):
-    """Try multiple encodings to robustly decode a requests-like Response."""
-    import zlib as _zlib
-    raw = r.content
-    # Manually decompress if auto-decompression didn't fire.
-    # IMPORTANT: on failure return None — do NOT fall through with raw compressed
-    # bytes, as latin-1 would silently decode them to garbage and lxml would then
-    # throw zlib.error -3 ("incorrect header check") when it tries to parse it.
-    if raw[:2] == b'\x1f\x8b':  # gzip magic
-        try:
-            raw = _gzip.decompress(raw)
-        except Exception:
-            return None   # unrecoverable — let caller handle missing content
-    elif len(raw) >= 2 and raw[0] == 0x78 and raw[1] in (0x01, 0x5e, 0x9c, 0xda):  # zlib/deflate
+# ── HTTP client backends ─────────────────────────────────────────────────────
+# One pooled session for all crawl fetches: keep-alive across the many sitemap
+# requests to the same host, and /prefetch can open connections ahead of time.
+# Cookies are refused so each request stays as stateless as a bare requests.get.
+#
+# CRAWLSYNC_HTTP=http2 swaps in an httpx client with HTTP/2 enabled, so the
+# children of a sitemap index share one multiplexed connection per origin
+# instead of one connection each.  Hosts that don't negotiate h2 over ALPN
+# get HTTP/1.1 from the same client; if httpx or h2 isn't installed the
+# requests session is used.  Either way callers see requests' interface.
+#
+# CRAWLSYNC_HOST_RPS caps requests per second to any one host (0 = no cap).
+# Slots are reserved through shared_state() when several workers serve the
+# app, so the cap holds for the whole deployment, not per process.
+
+HTTP_BACKEND  = os.environ.get("CRAWLSYNC_HTTP", "http1").lower()
+HOST_RPS      = float(os.environ.get("CRAWLSYNC_HOST_RPS") or 0)
+_http_session = None
+_http_lock    = threading.Lock()
+_host_next    = {}           # host → monotonic time of its next free slot
+_host_lock    = threading.Lock()
+
+
+def _host_reserve(host, interval):
+    """Reserve `host`'s next slot in this process; returns seconds to wait for it."""
+    with _host_lock:
+        now = time.monotonic()
+        if len(_host_next) > 4096:
+            for h in [h for h, t in _host_next.items() if t < now]:
+                del _host_next[h]
+        at = max(now, _host_next.get(host, 0.0))
+        _host_next[host] = at + interval
+    return at - now
+
+
+def host_throttle(url):
+    """Sleep until `url`'s host has a free request slot under HOST_RPS."""
+    if HOST_RPS <= 0:
+        return
+    host, interval = (urlparse(url).hostname or "").lower(), 1.0 / HOST_RPS
+    shared = shared_state()
+    wait = shared.host_slot(host, interval) if shared is not None else _host_reserve(host, interval)
+    if wait > 0:
+        time.sleep(wait)
+
+
+def _h2_errors(fn):
+    """Re-raise httpx errors as the requests exceptions fetch code catches."""
+    import httpx
+    try:
+        return fn()
+    except httpx.TimeoutException as e:
+        raise requests.exceptions.Timeout(str(e)) from e
+    except httpx.ConnectError as e:
+        if "ssl" in str(e).lower() or "certificate" in str(e).lower():
+            raise requests.exceptions.SSLError(str(e)) from e
+        raise requests.exceptions.ConnectionError(str(e)) from e
+    except httpx.TransportError as e:
+        raise requests.exceptions.ConnectionError(str(e)) from e
+    except httpx.HTTPError as e:
+        raise requests.exceptions.RequestException(str(e)) from e
+
+
+class _H2Response:
+    """The slice of requests.Response the fetch code uses, over an httpx.Response."""
+
+    def __init__(self, r):
+        self._r                = r
+        self.status_code       = r.status_code
+        self.headers           = r.headers
+        self.url               = str(r.url)
+        self.http_version      = r.http_version
+        self._content          = None
+        self._content_consumed = False
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def content(self):
+        if self._content is None:
+            self._content = _h2_errors(self._r.read)
+            self._content_consumed = True
+        return self._content
+
+    @property
+    def text(self):
+        return body_of(self).text or ""
+
+    def iter_content(self, chunk_size=8192):
+        it = self._r.iter_bytes(chunk_size)
+        while True:
+            chunk = _h2_errors(lambda: next(it, None))
+            if chunk is None:
+                return
+            yield chunk
+
+    def close(self):
+        self._r.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _H2Session:
+    """requests.Session-compatible get() over a shared HTTP/2-capable httpx.Client."""
+
+    def __init__(self):
+        import httpx
+        from http.cookiejar import CookieJar, DefaultCookiePolicy
+        self._client = httpx.Client(
+            http2=True,
+            verify=requests.certs.where(),
+            cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+            limits=httpx.Limits(max_connections=128, max_keepalive_connections=64),
+        )
+
+    def get(self, url, headers=None, timeout=15, allow_redirects=True, stream=False):
+        import httpx
+        host_throttle(url)
+        req = self._client.build_request("GET", url, headers=headers,
+                                         timeout=httpx.Timeout(timeout))
+        r = _h2_errors(lambda: self._client.send(req, stream=True, follow_redirects=allow_redirects))
+        resp = _H2Response(r)
+        return resp if stream else read_bounded(resp)
+
+
+class _CrawlSession(requests.Session):
+    """Throttled per host; non-streamed bodies are read through read_bounded()."""
+
+    def request(self, method, url, *args, stream=False, **kwargs):
+        host_throttle(url)
+        r = super().request(method, url, *args, stream=True, **kwargs)
+        return r if stream else read_bounded(r)
+
+
+def _requests_session():
+    from http.cookiejar import DefaultCookiePolicy
+    from requests.adapters import HTTPAdapter
+    sess = _CrawlSession()
+    sess.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    adapter = HTTPAdapter(pool_connections=64, pool_maxsize=16)
+    sess.mount("http://", adapter)
+    sess.mount("https://", adapter)
+    return sess
+
+
+def http_session():
+    """The shared HTTP client — an _H2Session when CRAWLSYNC_HTTP=http2 and httpx[http2] is installed."""
+    global _http_session
+    if _http_session is None:
+        with _http_lock:
+            if _http_session is None:
+                sess = None
+                if HTTP_BACKEND in ("http2", "h2") and backend("httpx") is not None:
+                    try:
+                        sess = _H2Session()
+                    except Exception as e:      # e.g. h2 missing: httpx raises ImportError
+                        print(f"[http] HTTP/2 backend unavailable ({e}) — using HTTP/1.1", file=sys.stderr)
+                _http_session = sess or _requests_session()
+    return _http_session
+
+
+def http_backend_name():
+    return "http2" if isinstance(http_session(), _H2Session) else "http1"
+
+
+# ── Bounded downloads ────────────────────────────────────────────────────────
+# Every body the crawler reads is streamed through bounded_chunks(): a size
+# cap picked by Content-Type, an overall deadline and a minimum-throughput
+# watchdog.  The socket timeout alone restarts on every byte, so a trickling
+# or endless response could otherwise hold a thread — and its memory — for as
+# long as the server keeps sending.  A body that hits a limit is cut short
+# and flagged (r.truncated = "size" | "deadline" | "slow"); callers get what
+# arrived rather than an exception.
+#
+# CRAWLSYNC_DOWNLOAD_CAPS overrides caps in MB, e.g. "html=8,xml=128,*=32".
+
+DOWNLOAD_CAPS = {               # Content-Type substring → max bytes; first match wins
+    "html":       16 << 20,
+    "xml":        64 << 20,     # the sitemap protocol allows 50 MB uncompressed
+    "gzip":       64 << 20,
+    "json":       32 << 20,
+    "text/plain": 32 << 20,     # robots.txt, llms-full.txt
+    "*":          64 << 20,
+}
+DOWNLOAD_DEADLINE = float(os.environ.get("CRAWLSYNC_DOWNLOAD_DEADLINE") or 120)   # seconds per body
+DOWNLOAD_MIN_RATE = 2048        # bytes/s a body must average once past the grace period
+DOWNLOAD_GRACE    = 10.0        # seconds before the throughput watchdog applies
+_DOWNLOAD_CHUNK   = 65536
+
+for _spec in filter(None, (os.environ.get("CRAWLSYNC_DOWNLOAD_CAPS") or "").split(",")):
+    _kind, _, _mb = _spec.partition("=")
+    try:
+        DOWNLOAD_CAPS[_kind.strip().lower()] = int(float(_mb) * (1 << 20))
+    except ValueError:
+        print(f"[download] ignoring cap {_spec!r}", file=sys.stderr)
+
+
+def download_cap(content_type):
+    ct = (content_type or "").lower()
+    for kind, cap in DOWNLOAD_CAPS.items():
+        if kind != "*" and kind in ct:
+            return cap
+    return DOWNLOAD_CAPS["*"]
+
+
+def _download_check(got, cap, start):
+    """Why a body read should stop now ("size", "deadline", "slow"), or None."""
+    if got > cap:
+        return "size"
+    elapsed = time.monotonic() - start
+    if elapsed > DOWNLOAD_DEADLINE:
+        return "deadline"
+    if elapsed > DOWNLOAD_GRACE and got < DOWNLOAD_MIN_RATE * elapsed:
+        return "slow"
+    return None
+
+
+def _live_chunks(r, size=_DOWNLOAD_CHUNK):
+    """Body chunks as they arrive — not once `size` bytes have piled up, which
+    a trickling server could postpone indefinitely."""
+    raw = getattr(r, "raw", None)
+    if raw is None or not hasattr(raw, "read1"):     # _H2Response yields as received
+        yield from r.iter_content(None)
+        return
+    import urllib3.exceptions as u3
+    while True:
+        # the same mapping requests' iter_content applies
         try:
-            raw = _zlib.decompress(raw)
-        except Exception:
+            chunk = raw.read1(size, decode_content=True)
+        except u3.ReadTimeoutError as e:
+            raise requests.exceptions.ConnectionError(e) from e
+        except u3.SSLError as e:
+            raise requests.exceptions.SSLError(e) from e
+        except u3.ProtocolError as e:
+            raise requests.exceptions.ChunkedEncodingError(e) from e
+        except u3.DecodeError as e:
+            raise requests.exceptions.ContentDecodingError(e) from e
+        if not chunk:
+            return
+        yield chunk
+
+
+def bounded_chunks(r):
+    """Chunks of streamed response `r` within the download limits; sets
+    r.truncated to the limit that stopped it early, else None."""
+    cap, start, got = download_cap(r.headers.get("Content-Type", "")), time.monotonic(), 0
+    r.truncated = None
+    for chunk in _live_chunks(r):
+        got += len(chunk)
+        reason = _download_check(got, cap, start)
+        if reason == "size":
+            chunk = chunk[:len(chunk) - (got - cap)]
+        yield chunk
+        if reason:
+            r.truncated = reason
+            return
+
+
+def read_bounded(r, head=b"", chunks=None):
+    """Read the rest of streamed response `r` (after `head`, from `chunks` if
+    already started) within the download limits and store it as r.content."""
+    try:
+        data = head + b"".join(bounded_chunks(r) if chunks is None else chunks)
+    except BaseException:
+        r.close()
+        raise
+    if r.truncated and hasattr(r, "raw"):
+        r.raw.close()               # drop the connection rather than return it to the pool
+    r._content, r._content_consumed = data, True
+    r.close()
+    return r
+
+
+_BOMS = ((b"\xef\xbb\xbf", "utf-8-sig"), (b"\xff\xfe\x00\x00", "utf-32"), (b"\x00\x00\xfe\xff", "utf-32"),
+         (b"\xff\xfe", "utf-16"), (b"\xfe\xff", "utf-16"))
+_XML_ENC_RE  = re.compile(rb'encoding=["\']([^"\']+)["\']')
+_META_ENC_RE = re.compile(rb'<meta[^>]+charset=["\']?([\w.:-]+)', re.IGNORECASE)
+_CT_ENC_RE   = re.compile(r'charset=["\']?([\w.:-]+)', re.IGNORECASE)
+
+
+class ResponseBody:
+    """A fetched body, decompressed and decoded at most once.
+
+    head()/head_text() give the first bytes for marker checks without
+    decoding the rest; .text decodes the whole body a single time, trying a
+    BOM, UTF-8, then the declared charset (Content-Type header, XML
+    declaration or <meta>), and only then statistical detection.  Manual
+    inflation stops at download_cap(); a body cut there has truncated = "size".
+    """
+    __slots__ = ("_raw", "_data", "_text", "_decoded", "content_type", "truncated")
+
+    def __init__(self, raw, content_type=""):
+        self._raw         = raw or b""
+        self._data        = None      # decompressed bytes; False if undecompressable
+        self._text        = None
+        self._decoded     = False
+        self.content_type = content_type or ""
+        self.truncated    = None      # "size" once inflation hit the download cap
+
+    @property
+    def data(self):
+        """Body bytes, manually decompressed if the transport didn't do it (None if corrupt)."""
+        if self._data is None:
+            import zlib as _zlib
+            raw = self._raw
+            # IMPORTANT: on failure give None — do NOT fall through with raw compressed
+            # bytes, as latin-1 would silently decode them to garbage and lxml would then
+            # throw zlib.error -3 ("incorrect header check") when it tries to parse it.
             try:
-                raw = _zlib.decompress(raw, -15)  # raw deflate (no header)
+                if raw[:2] == b"\x1f\x8b":  # gzip magic
+                    raw = self._inflate(raw, 16 + _zlib.MAX_WBITS)
+                elif len(raw) >= 2 and raw[0] == 0x78 and raw[1] in (0x01, 0x5e, 0x9c, 0xda):  # zlib
+                    try:
+                        raw = self._inflate(raw, _zlib.MAX_WBITS)
+                    except _zlib.error:
+                        raw = self._inflate(raw, -15)  # raw deflate (no header)
+                self._data = raw
             except Exception:
-                return None
-    xml_enc = None
-    try:
-        header = raw[:300].decode("ascii", errors="ignore")
-        m = re.search(r'encoding=["\']([^"\']+)["\']', header)
+                self._data = False
+        return self._data if self._data is not False else None
+
+    def _inflate(self, raw, wbits):
+        """Decompress within the Content-Type's download cap — a small archive
+        can expand a thousandfold.  Concatenated gzip members are followed."""
+        import zlib as _zlib
+        room, out = download_cap(self.content_type), []
+        while raw and room > 0:
+            d = _zlib.decompressobj(wbits)
+            chunk = d.decompress(raw, room)
+            out.append(chunk)
+            room -= len(chunk)
+            if d.unconsumed_tail or (room <= 0 and not d.eof):
+                self.truncated = "size"
+                break
+            raw = d.unused_data if wbits > 16 and d.unused_data[:2] == b"\x1f\x8b" else b""
+        else:
+            if raw:
+                self.truncated = "size"
+        return b"".join(out)
+
+    def head(self, n=2048):
+        """First n body bytes; a compressed prefix is inflated without touching the rest."""
+        if self._data is not None:
+            return (self._data or b"")[:n]
+        raw = self._raw
+        if raw[:2] == b"\x1f\x8b":
+            import zlib as _zlib
+            try:
+                return _zlib.decompressobj(16 + _zlib.MAX_WBITS).decompress(raw[:max(n, 4096)], n)
+            except _zlib.error:
+                return b""
+        if len(raw) >= 2 and raw[0] == 0x78:
+            return (self.data or b"")[:n]
+        return raw[:n]
+
+    def head_text(self, n=2048):
+        """Lower-cased, left-stripped text of the first n bytes — for marker checks."""
+        return self.head(n).decode("utf-8", errors="ignore").lstrip("﻿ \t\r\n").lower()
+
+    def declared_encoding(self):
+        m = _CT_ENC_RE.search(self.content_type)
         if m:
-            xml_enc = m.group(1)
-    except Exception:
-        pass
-    apparent = getattr(r, "apparent_encoding", None)  # not present on curl_cffi responses
-    for enc in filter(None, ["utf-8-sig", xml_enc, apparent, "utf-8", "latin-1"]):
+            return m.group(1)
+        head = self.head(1024)
+        m = _XML_ENC_RE.search(head[:300]) or _META_ENC_RE.search(head)
+        return m.group(1).decode("ascii", errors="ignore") if m else None
+
+    @property
+    def text(self):
+        """Decoded, stripped body text, or None if empty / undecodable."""
+        if not self._decoded:
+            self._decoded = True
+            self._text = self._decode()
+        return self._text
+
+    def _decode(self):
+        raw = self.data
+        if not raw:
+            return None
+        candidates = [enc for bom, enc in _BOMS if raw.startswith(bom)][:1]
+        candidates += ["utf-8", self.declared_encoding()]
+        for enc in filter(None, candidates):
+            try:
+                return raw.decode(enc).strip() or None
+            except (UnicodeDecodeError, LookupError):
+                continue
+        # Nothing declared fits — fall back to (expensive) statistical detection
         try:
-            text = raw.decode(enc).strip()
-            if text:
-                return text
-        except (UnicodeDecodeError, LookupError):
-            continue
-    return None
+            detected = requests.compat.chardet.detect(raw[:65536])["encoding"]
+        except Exception:
+            detected = None
+        for enc in filter(None, [detected, "latin-1"]):
+            try:
+                return raw.decode(enc).strip() or None
+            except (UnicodeDecodeError, LookupError):
+                continue
+        return None
+
+
+def body_of(r):
+    """The ResponseBody for a requests-like response, built once and cached on it."""
+    body = getattr(r, "_crawl_body", None)
+    if body is None:
+        body = ResponseBody(r.content, r.headers.get("Content-Type", ""))
+        try:
+            r._crawl_body = body
+        except AttributeError:
+            pass
+    return body
+
+
+def _decode_response(r):
+    """Robustly decode a requests-like Response (see ResponseBody); a body cut
+    short while inflating is reported through r.truncated like a capped download."""
+    body = body_of(r)
+    text = body.text
+    if body.truncated and not getattr(r, "truncated", None):
+        try:
+            r.truncated = body.truncated
+        except AttributeError:
+            pass
+    return text
 
 
 def _is_cloudflare_block(r):
@@ -239,7 +940,14 @@ def _is_cloudflare_block(r):
     # returns 200 with a JS-challenge page ("Enable JavaScript and cookies").
     if r.status_code not in (200, 403, 429, 503):
         return False
-    body = r.text[:2000].lower()
+    return _cloudflare_markers(r.status_code, body_of(r).head_text(2000))
+
+
+def _cloudflare_markers(status_code, body):
+    """Challenge-page check on the first ~2 KB of a lower-cased body."""
+    body = body[:2000]
+    if status_code not in (200, 403, 429, 503):
+        return False
     cf_markers = (
         "just a moment", "checking your browser", "_cf_chl",
         "challenge-platform", "cf-browser-verification", "cloudflare ray id",
@@ -249,7 +957,7 @@ def _is_cloudflare_block(r):
         return False
     # For 200 responses, also require the page to be near-empty content-wise
     # so we don't false-positive on pages that legitimately mention Cloudflare.
-    if r.status_code == 200:
+    if status_code == 200:
         return len(body) < 20_000
     return True
 
@@ -263,9 +971,10 @@ def _try_cloudflare_bypass(url, timeout, log_lines):
     bypass_timeout = min(timeout, 12)  # shorter timeout for bypass attempts
 
     # 1. curl_cffi — best Chrome TLS fingerprint mimic
-    if _CFFI:
+    cffi_requests = backend("curl_cffi")
+    if cffi_requests is not None:
         try:
-            r = _cffi_requests.get(url, impersonate="chrome120", timeout=bypass_timeout)
+            r = cffi_requests.get(url, impersonate="chrome120", timeout=bypass_timeout)
             text = _decode_response(r)
             if text and not _is_cloudflare_block(r):
                 _log("  curl_cffi bypass succeeded")
@@ -274,9 +983,10 @@ def _try_cloudflare_bypass(url, timeout, log_lines):
             _log(f"  curl_cffi failed: {e}")
 
     # 2. cloudscraper — JS challenge solver
-    if _SCRAPER:
+    scraper = backend("cloudscraper")
+    if scraper is not None:
         try:
-            r = _SCRAPER.get(url, timeout=bypass_timeout)
+            r = scraper.get(url, timeout=bypass_timeout)
             text = _decode_response(r)
             if text and not _is_cloudflare_block(r):
                 _log("  cloudscraper bypass succeeded")
@@ -286,7 +996,7 @@ def _try_cloudflare_bypass(url, timeout, log_lines):
 
     # 3. Googlebot UA — whitelisted in many Cloudflare configs
     try:
-        r = requests.get(url, headers=HEADERS_GOOGLEBOT, timeout=bypass_timeout, allow_redirects=True)
+        r = http_session().get(url, headers=HEADERS_GOOGLEBOT, timeout=bypass_timeout, allow_redirects=True)
         if r.ok and not _is_cloudflare_block(r):
             text = _decode_response(r)
             if text:
@@ -307,7 +1017,7 @@ def fetch(url, timeout=15, retries=1, log_lines=None):  # reduced defaults
     for headers in [HEADERS, HEADERS_CRAWLER]:
         for attempt in range(retries):
             try:
-                r = requests.get(url, headers=headers, timeout=timeout, allow_redirects=True)
+                r = http_session().get(url, headers=headers, timeout=timeout, allow_redirects=True)
                 if _is_cloudflare_block(r):
                     _log("  Cloudflare protection detected — trying bypass methods")
                     return _try_cloudflare_bypass(url, timeout, log_lines)
@@ -317,6 +1027,8 @@ def fetch(url, timeout=15, retries=1, log_lines=None):  # reduced defaults
                         time.sleep(1)
                     continue
                 text = _decode_response(r)
+                if r.truncated:
+                    _log(f"  Download cut short ({r.truncated}) for {url}")
                 if text:
                     return text
                 _log(f"  Empty/undecodable response from {url}")
@@ -383,8 +1095,123 @@ def _sitemap_www_alt(url):
     return url.replace(f"://{p.netloc}", f"://{alt_netloc}", 1)
 
 
-def discover_sitemaps(raw_input, log_lines=None):
-    """Return a list of reachable sitemap URLs for the given domain/URL."""
+# ── Crawl budget ─────────────────────────────────────────────────────────────
+# Caps a single extraction so one pathological site (self-referencing or
+# generated indexes) can't run forever.  Once a limit is hit no more sitemaps
+# are fetched; the crawl returns what it has plus a truncation report.
+
+DEFAULT_BUDGET = {
+    "max_sitemaps": 10_000,
+    "max_urls":     5_000_000,
+    "max_bytes":    2 * 1024 ** 3,   # decoded sitemap/robots text
+    "max_depth":    8,               # nested index levels below a root sitemap
+    "deadline":     30 * 60,         # seconds of wall-clock time
+}
+
+
+class CrawlBudget:
+    def __init__(self, max_sitemaps=None, max_urls=None, max_bytes=None,
+                 max_depth=None, deadline=None, stop=None):
+        d = DEFAULT_BUDGET
+        self.max_sitemaps = d["max_sitemaps"] if max_sitemaps is None else max_sitemaps
+        self.max_urls     = d["max_urls"]     if max_urls     is None else max_urls
+        self.max_bytes    = d["max_bytes"]    if max_bytes    is None else max_bytes
+        self.max_depth    = d["max_depth"]    if max_depth    is None else max_depth
+        self.deadline     = d["deadline"]     if deadline     is None else deadline
+        self.stop         = stop            # threading.Event — set to cancel
+        self.started      = time.monotonic()
+        self.sitemaps     = 0
+        self.bytes        = 0
+        self.reason       = None            # first limit that was hit
+        self.depth_cut    = 0               # index children skipped for depth
+        self.skipped      = []              # sample of sitemaps never fetched
+        self.skipped_n    = 0
+        self.dropped_urls = 0               # <loc>s discarded once max_urls was hit
+
+    @classmethod
+    def from_request(cls, spec, stop=None):
+        """Build from a JSON {"max_urls": …, "deadline": …} dict; invalid keys fall back to defaults."""
+        kw = {}
+        for k in DEFAULT_BUDGET:
+            v = (spec or {}).get(k) if isinstance(spec, dict) else None
+            if isinstance(v, (int, float)) and not isinstance(v, bool) and (v > 0 or k == "max_depth" and v == 0):
+                kw[k] = v       # max_depth 0: read root sitemaps only, don't follow indexes
+        return cls(stop=stop, **kw)
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def timeout(self, default):
+        """Per-request timeout that never runs past the deadline."""
+        return max(1, min(default, self.deadline - self.elapsed()))
+
+    def charge(self, text):
+        if text:
+            self.bytes += len(text)
+        return text
+
+    def exhausted(self, urls=0):
+        """Return why the crawl must stop (remembered once set), or None."""
+        if self.reason:
+            return self.reason
+        if self.stop is not None and self.stop.is_set():
+            self.reason = "cancelled"
+        elif self.elapsed() >= self.deadline:
+            self.reason = "deadline"
+        elif self.sitemaps >= self.max_sitemaps:
+            self.reason = "max_sitemaps"
+        elif self.bytes >= self.max_bytes:
+            self.reason = "max_bytes"
+        elif urls >= self.max_urls:
+            self.reason = "max_urls"
+        return self.reason
+
+    def skip(self, url):
+        self.skipped_n += 1
+        if len(self.skipped) < 50:
+            self.skipped.append(url)
+
+    def report(self):
+        reason = self.reason or ("max_depth" if self.depth_cut else None)
+        return {
+            "truncated":        reason is not None,
+            "reason":           reason,
+            "limits":           {k: getattr(self, k) for k in DEFAULT_BUDGET},
+            "used":             {"sitemaps": self.sitemaps, "bytes": self.bytes,
+                                 "seconds": round(self.elapsed(), 1)},
+            "skipped_sitemaps": self.skipped_n,
+            "skipped_sample":   self.skipped[:20],
+            "depth_cut":        self.depth_cut,
+            "dropped_urls":     self.dropped_urls,
+        }
+
+
+_SITEMAP_ENTRY_RE = re.compile(r"<sitemap[\s>].*?</sitemap>", re.IGNORECASE | re.DOTALL)
+_LASTMOD_RE       = re.compile(r"<lastmod>\s*([^<\s]+)\s*</lastmod>", re.IGNORECASE)
+
+
+def prioritize_children(text, locs):
+    """Order sitemap-index children so a budget-limited crawl spends it well:
+    plain urlsets before nested indexes, newest <lastmod> first, otherwise
+    document order."""
+    lastmod = {}
+    for m in _SITEMAP_ENTRY_RE.finditer(text):
+        block = m.group(0)
+        lm = _LASTMOD_RE.search(block)
+        if lm:
+            for loc in parse_locs(block)[:1]:
+                lastmod[loc] = lm.group(1)
+    # Both sorts are stable, so ties keep their previous order
+    ordered = sorted(locs, key=lambda l: lastmod.get(l, ""), reverse=True)
+    return sorted(ordered, key=lambda l: "index" in l.rsplit("/", 1)[-1].lower())
+
+
+def discover_sitemaps(raw_input, log_lines=None, budget=None, bodies=None):
+    """Return a list of reachable sitemap URLs for the given domain/URL.
+
+    If `bodies` is a dict, the validated sitemap text is stored in it by URL
+    so extraction can parse it without fetching it again.
+    """
     def _log(msg):
         if log_lines is not None:
             log_lines.append(msg)
@@ -410,7 +1237,14 @@ def discover_sitemaps(raw_input, log_lines=None):
         if robots_url in seen_robots:
             continue
         seen_robots.add(robots_url)
-        robots = fetch(robots_url)
+        if budget is not None and budget.exhausted():
+            break
+        timeout = budget.timeout(15) if budget is not None else 15
+        hit, robots = prefetched(robots_url, timeout)
+        if not hit:
+            robots = fetch(robots_url, timeout=timeout)
+        if budget is not None:
+            budget.charge(robots)
         if robots:
             hits = re.findall(r"Sitemap:\s*(https?://[^\s]+)", robots, re.IGNORECASE)
             for h in hits:
@@ -423,15 +1257,21 @@ def discover_sitemaps(raw_input, log_lines=None):
         for su in all_found:
             # Try declared URL first, then www↔non-www variant
             for candidate in dict.fromkeys([su, _sitemap_www_alt(su)]):
-                content = fetch_sitemap(candidate)
+                if budget is not None and budget.exhausted():
+                    break
+                content = fetch_sitemap(candidate, timeout=budget.timeout(15) if budget is not None else 15,
+                                        fallback=False)
+                if budget is not None:
+                    budget.charge(content)
                 if _is_xml_sitemap(content):
                     if candidate != su:
                         _log(f"  {su} — soft-404; using alternate: {candidate}")
                     reachable.append(candidate)
+                    if bodies is not None:
+                        bodies[candidate] = content
                     break
             else:
-                reason = "not reachable" if not fetch(su) else "soft-404 (HTML response)"
-                _log(f"  {su} — {reason}, skipping")
+                _log(f"  {su} — {_unreachable_reason(su)}, skipping")
 
         if reachable:
             return reachable
@@ -440,16 +1280,124 @@ def discover_sitemaps(raw_input, log_lines=None):
     # ── 2. Try common paths on both www and non-www origins ─────────────
     for base in dict.fromkeys([origin, alt_origin]):
         for path in FALLBACK_PATHS:
+            if budget is not None and budget.exhausted():
+                break
             candidate = base + path
-            content = fetch_sitemap(candidate)
+            content = fetch_sitemap(candidate, timeout=budget.timeout(15) if budget is not None else 15,
+                                    fallback=False)
+            if budget is not None:
+                budget.charge(content)
             if _is_xml_sitemap(content):
                 _log(f"  Found sitemap via fallback: {candidate}")
+                if bodies is not None:
+                    bodies[candidate] = content
                 return [candidate]
 
     # Nothing found — return best guess so the caller can log a clear error
     return [origin + "/sitemap.xml"]
 
 
+def _unreachable_reason(url):
+    """Why a declared sitemap was rejected, judged from a streamed prefix only."""
+    try:
+        s = sniff_url(url, headers=HEADERS, timeout=10)
+    except requests.exceptions.RequestException:
+        return "not reachable"
+    s.close()
+    return "soft-404 (HTML response)" if s.kind == "other" and s.text else "not reachable"
+
+
+# ── Speculative prefetch ─────────────────────────────────────────────────────
+# The UI calls /prefetch (debounced) while a domain is being typed, so DNS,
+# TLS connections, both robots.txt files and the canonical origin are ready
+# before "Start Deep Extraction" is pressed.  Results are Futures in a short
+# TTL cache; discover_sitemaps takes robots.txt from here, waiting on a fetch
+# that is still in flight rather than starting a second one.  Finished results
+# are also copied to shared_state(), since the /extract that follows a
+# /prefetch may be served by another worker.
+
+_PREFETCH_TTL   = 120        # seconds a prefetched result stays usable
+_PREFETCH_MAX   = 256
+_prefetch_cache = {}         # key → (expires, Future)
+_prefetch_lock  = threading.Lock()
+_prefetch_pool  = None
+
+
+def _prefetch_submit(key, fn, *args):
+    """Run fn(*args) in the background unless a fresh result for key exists."""
+    global _prefetch_pool
+    now = time.monotonic()
+    with _prefetch_lock:
+        hit = _prefetch_cache.get(key)
+        if hit and hit[0] > now:
+            return hit[1]
+        if _prefetch_pool is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _prefetch_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="crawlsync-prefetch")
+        if len(_prefetch_cache) >= _PREFETCH_MAX:
+            for k in [k for k, (exp, _) in _prefetch_cache.items() if exp <= now]:
+                del _prefetch_cache[k]
+        fut = _prefetch_pool.submit(fn, *args)
+        _prefetch_cache[key] = (now + _PREFETCH_TTL, fut)
+    if shared_state() is not None:
+        fut.add_done_callback(lambda f: _share_prefetch(key, f))
+    return fut
+
+
+def _share_prefetch(key, fut):
+    if fut.exception() is None:
+        try:
+            shared_state().put("prefetch:" + key, fut.result(), _PREFETCH_TTL)
+        except Exception as e:
+            print(f"[prefetch] not shared — {e}", file=sys.stderr)
+
+
+def prefetched(key, timeout=15):
+    """(hit, value) from the prefetch cache, waiting up to timeout for an in-flight fetch."""
+    with _prefetch_lock:
+        hit = _prefetch_cache.get(key)
+    if not hit or hit[0] <= time.monotonic():
+        shared = shared_state()
+        return shared.get("prefetch:" + key) if shared is not None else (False, None)
+    try:
+        return True, hit[1].result(timeout=timeout)
+    except Exception:
+        return False, None
+
+
+def _probe_origin(origin):
+    """Resolve DNS, open a pooled connection and follow redirects to the canonical origin."""
+    import socket
+    p = urlparse(origin)
+    out = {"origin": origin, "resolved": False, "canonical": None, "status": None}
+    try:
+        socket.getaddrinfo(p.hostname, p.port or (443 if p.scheme == "https" else 80))
+        out["resolved"] = True
+    except (OSError, UnicodeError):
+        return out
+    try:
+        with http_session().get(origin + "/", headers=HEADERS, timeout=8,
+                                allow_redirects=True, stream=True) as r:
+            f = urlparse(r.url)
+            out["canonical"] = f"{f.scheme}://{f.netloc}"
+            out["status"]    = r.status_code
+    except requests.exceptions.RequestException:
+        pass
+    return out
+
+
+def prefetch_domain(raw):
+    """Queue DNS / connection / robots.txt warm-up for both www variants of a domain."""
+    origin = base_url(raw)
+    if "." not in (urlparse(origin).hostname or ""):
+        return []
+    origins = list(dict.fromkeys([origin, _www_alt(origin)]))
+    for o in origins:
+        _prefetch_submit("origin:" + o, _probe_origin, o)
+        _prefetch_submit(o + "/robots.txt", fetch, o + "/robots.txt", 8)
+    return origins
+
+
 def parse_locs(text):
     """Extract all <loc> values from sitemap XML — handles namespaces, CDATA, and HTML entities."""
     # Handle CDATA: <loc><![CDATA[https://...]]></loc>
@@ -465,79 +1413,381 @@ def is_sitemap_index(text):
     return bool(re.search(r"<sitemap[\s>]", text, re.IGNORECASE))
 
 
-def fetch_sitemap(url, timeout=15, log_lines=None):
-    """Fetch a sitemap URL, preferring XML Accept headers to avoid XSL/HTML rendering."""
+# ── Streamed sniffing ────────────────────────────────────────────────────────
+# Sitemap candidates are judged from the first few KB of a streamed response.
+# Soft-404 HTML pages and ordinary pages listed in an index are dropped there
+# instead of being downloaded in full; accepted bodies keep reading the same
+# stream, so nothing is requested twice.
+
+_PROBE_BYTES = 4096
+
+
+class _Sniff:
+    """A streamed response whose first bytes have been read and classified.
+
+    kind is "xml" (passes _is_xml_sitemap), "other" (2xx but not XML),
+    "blocked" (Cloudflare challenge) or "error" (non-2xx status).
+    """
+    __slots__ = ("r", "head", "rest", "eof", "text", "kind")
+
+    def __init__(self, r, n=_PROBE_BYTES):
+        self.r    = r
+        self.rest = bounded_chunks(r)
+        self.head = b""
+        self.eof  = True
+        for chunk in self.rest:
+            self.head += chunk
+            if len(self.head) >= n:
+                self.eof = False
+                break
+        self.text = ResponseBody(self.head).head_text(n)
+        if _cloudflare_markers(r.status_code, self.text):
+            self.kind = "blocked"
+        elif not r.ok:
+            self.kind = "error"
+        else:
+            self.kind = "xml" if _is_xml_sitemap(self.text) else "other"
+
+    def body(self):
+        """Read the rest of the stream and decode it like a normal response."""
+        return _decode_response(read_bounded(self.r, self.head, self.rest))
+
+    def close(self):
+        self.r.close()
+
+
+def sniff_url(url, headers=HEADERS_CRAWLER, timeout=15):
+    """Open `url` streamed and classify it from its first few KB.  Network
+    errors propagate; call .body() to keep an accepted response or .close()."""
+    r = http_session().get(url, headers=headers, timeout=timeout, allow_redirects=True, stream=True)
+    try:
+        return _Sniff(r)
+    except Exception:
+        r.close()
+        raise
+
+
+def _sniff_sitemap(text):
+    """True/False when the first bytes settle it, None when they don't."""
+    if "<urlset" in text or "<sitemapindex" in text or "<loc>" in text:
+        return True
+    if text.startswith("<!doctype html") or "<html" in text[:1000]:
+        return False
+    return None
+
+
+def probe_sitemap(url, timeout=15):
+    """Return the body of `url` if it is a sitemap, else None — only the first
+    few KB of anything else are downloaded."""
+    try:
+        s = sniff_url(url, timeout=timeout)
+    except requests.exceptions.RequestException:
+        return None
+    if s.kind == "blocked" or s.r.status_code in (403, 429, 503):
+        # Blocked — let fetch() run its bypass chain
+        s.close()
+        return fetch(url, timeout=timeout)
+    verdict = s.kind != "error" and _sniff_sitemap(s.text)
+    if verdict is None and not s.eof and "xml" in s.r.headers.get("Content-Type", "").lower():
+        verdict = True      # XML with a long preamble — read on and let the parser decide
+    if not verdict:
+        s.close()
+        return None
+    try:
+        return s.body()
+    except requests.exceptions.RequestException:
+        return None
+
+
+def fetch_sitemap(url, timeout=15, log_lines=None, fallback=True):
+    """Fetch a sitemap URL, preferring XML Accept headers to avoid XSL/HTML rendering.
+
+    Each attempt is judged from its first few KB and HTML is dropped there.
+    With fallback=False a URL that never serves XML returns None instead of
+    whatever body the server sent.
+    """
     def _log(msg):
         if log_lines is not None:
             log_lines.append(msg)
 
-    # Try XML-preferring headers first (avoids Yoast XSL → HTML rendering)
-    for headers in [HEADERS_CRAWLER, HEADERS]:
-        try:
-            r = requests.get(url, headers=headers, timeout=timeout, allow_redirects=True)
-            if _is_cloudflare_block(r):
-                _log("  Cloudflare protection detected — trying bypass methods")
-                return _try_cloudflare_bypass(url, timeout, log_lines)
-            if not r.ok:
-                continue
-            text = _decode_response(r)
-            if text and _is_xml_sitemap(text):
-                return text
-            # Got a response but it's not XML — try next header set
-            if text:
-                _log(f"  Non-XML response with {headers.get('User-Agent','?')[:30]}… trying alternate headers")
-        except requests.exceptions.SSLError as e:
-            _log(f"  SSL error: {e}")
-            return None
-        except requests.exceptions.ConnectionError as e:
-            _log(f"  Connection error: {e}")
-            return None
-        except Exception as e:
-            _log(f"  Error: {e}")
+    last = None
+    try:
+        # Try XML-preferring headers first (avoids Yoast XSL → HTML rendering)
+        for headers in [HEADERS_CRAWLER, HEADERS]:
+            try:
+                s = sniff_url(url, headers=headers, timeout=timeout)
+                if s.kind == "blocked":
+                    s.close()
+                    _log("  Cloudflare protection detected — trying bypass methods")
+                    return _try_cloudflare_bypass(url, timeout, log_lines)
+                if s.kind == "error":
+                    s.close()
+                    continue
+                if s.kind == "xml":
+                    text = s.body()
+                    if s.r.truncated:
+                        _log(f"  Download cut short ({s.r.truncated}) — parsing what arrived")
+                    if text:
+                        return text
+                    continue
+                # Got a response but it's not XML — try next header set
+                if s.text:
+                    _log(f"  Non-XML response with {headers.get('User-Agent','?')[:30]}… trying alternate headers")
+                if last is not None:
+                    last.close()
+                last = s
+            except requests.exceptions.SSLError as e:
+                _log(f"  SSL error: {e}")
+                return None
+            except requests.exceptions.ConnectionError as e:
+                _log(f"  Connection error: {e}")
+                return None
+            except Exception as e:
+                _log(f"  Error: {e}")
+                return None
+
+        if not fallback:
             return None
+        # Last resort: return whatever we can get — from the stream already open
+        if last is not None:
+            s, last = last, None
+            try:
+                return s.body()
+            except Exception as e:
+                _log(f"  Error: {e}")
+                return None
+        return fetch(url, timeout=timeout, log_lines=log_lines)
+    finally:
+        if last is not None:
+            last.close()
+
+
+# ── Sitemap frontier ─────────────────────────────────────────────────────────
+# Sitemaps still to fetch, as an explicit priority queue rather than recursion:
+# nested indexes can go arbitrarily deep without touching the recursion limit,
+# several fetches can run at once, and the pending set can be checkpointed and
+# resumed later.  Lower keys pop first — urlsets before nested indexes, then
+# shallower before deeper, then the order they were queued in.
+
+EXTRACT_WORKERS = 4     # concurrent sitemap fetches per extraction
+
+
+class SitemapFrontier:
+    def __init__(self):
+        self._heap     = []
+        self._queued   = set()
+        self._inflight = {}      # url → entry popped but not yet through _crawl_one
+        self._seq      = 0
+        self._lock     = threading.Lock()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, url, depth=0, parent=None, probe=False):
+        """Queue a sitemap; `probe` marks index children that don't look like sitemaps."""
+        with self._lock:
+            if url in self._queued:
+                return False
+            self._queued.add(url)
+            named_index = "index" in url.split("?")[0].rsplit("/", 1)[-1].lower()
+            key = (bool(depth) and named_index, depth, self._seq)
+            self._seq += 1
+            heapq.heappush(self._heap, (key, url, depth, parent, probe))
+            return True
+
+    def pop(self):
+        """Next (url, depth, parent, probe) entry, or None when empty.  The entry
+        stays in flight — and in checkpoints — until done() is called for it."""
+        with self._lock:
+            if not self._heap:
+                return None
+            _, url, depth, parent, probe = heapq.heappop(self._heap)
+            self._inflight[url] = (url, depth, parent, probe)
+            return url, depth, parent, probe
+
+    def done(self, url):
+        """Mark a popped entry as fully handled (or skipped)."""
+        with self._lock:
+            self._inflight.pop(url, None)
+
+    def pending(self):
+        with self._lock:
+            return [e[1:] for e in sorted(self._heap)]
+
+    def checkpoint(self, visited=(), collected=()):
+        """JSON-safe snapshot; pass it to restore() to resume the crawl.
+
+        The page URLs found so far travel with it, so a resumed crawl ends
+        with the same result as one that never stopped.  Entries still being
+        fetched count as pending, not visited.  The frontier is read before
+        `visited` and `collected` are copied, so a sitemap that finishes
+        meanwhile is at worst fetched again on resume.
+        """
+        with self._lock:
+            inflight = list(self._inflight.values())
+            queued   = [e[1:] for e in sorted(self._heap)]
+        visited, collected = set(visited), set(collected)
+        visited.difference_update(e[0] for e in inflight)
+        return {
+            "pending": [{"url": u, "depth": d, "parent": p, "probe": pr}
+                        for u, d, p, pr in inflight + queued],
+            "visited": sorted(visited),
+            "collected": sorted(collected),
+        }
+
+    @classmethod
+    def restore(cls, data, visited=None, collected=None):
+        """Rebuild from checkpoint(); visited sitemaps are added to `visited` and
+        not re-queued, and the URLs already found are added to `collected`."""
+        frontier = cls()
+        done = set(data.get("visited") or ())
+        if visited is not None:
+            visited.update(done)
+        if collected is not None:
+            collected.update(u for u in data.get("collected") or () if isinstance(u, str))
+        frontier._queued.update(done)
+        for e in data.get("pending") or ():
+            if isinstance(e, dict) and isinstance(e.get("url"), str):
+                frontier.push(e["url"], int(e.get("depth") or 0), e.get("parent"), bool(e.get("probe")))
+        return frontier
+
+
+def _fetch_frontier_entry(entry, budget, prefetched):
+    """(text, log lines, already charged) for one frontier entry."""
+    url, depth, parent, probe = entry
+    if url in prefetched:
+        return prefetched.pop(url), [], True
+    timeout = budget.timeout(15) if budget is not None else 15
+    if probe:
+        # child loc doesn't look like a sitemap — sniff it, keeping the body
+        # only if it turns out to be one
+        return probe_sitemap(url, timeout=timeout), [], False
+    lines = []
+    text = fetch_sitemap(url, timeout=timeout, log_lines=lines)
+    return text, lines, False
+
+
+def crawl_frontier(frontier, collected=None, visited=None, log_lines=None, budget=None,
+                   workers=EXTRACT_WORKERS, prefetched=None, record=None):
+    """Drain the frontier, adding page URLs to `collected` and queuing index children.
+
+    Fetches run `workers` at a time; parsing and bookkeeping stay on the
+    calling thread.  Whatever is still queued when the budget runs out stays
+    in the frontier for a later resume.  `prefetched` maps sitemap URLs to
+    bodies already downloaded (by discovery) so they aren't fetched again.
+    `record(sitemap, locs, entries)` is called with every batch of URLs added
+    (see _store_recorder).
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    prefetched = {} if prefetched is None else prefetched
+    collected = set() if collected is None else collected
+    visited   = set() if visited is None else visited
+    log_lines = [] if log_lines is None else log_lines
+
+    pool = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        while len(frontier):
+            batch = []
+            while len(batch) < workers:
+                if budget is not None and budget.exhausted(len(collected)):
+                    break
+                entry = frontier.pop()
+                if entry is None:
+                    break
+                if entry[0] in visited:
+                    frontier.done(entry[0])
+                    continue
+                visited.add(entry[0])
+                if budget is not None:
+                    budget.sitemaps += 1
+                batch.append(entry)
+            if not batch:
+                break
+
+            if pool is not None and len(batch) > 1:
+                results = list(pool.map(lambda e: _fetch_frontier_entry(e, budget, prefetched), batch))
+            else:
+                results = [_fetch_frontier_entry(e, budget, prefetched) for e in batch]
 
-    # Last resort: return whatever we can get
-    return fetch(url, timeout=timeout, log_lines=log_lines)
+            for entry, res in zip(batch, results):
+                _crawl_one(frontier, entry, res, collected, visited, log_lines, budget, record)
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=False)
 
+    if budget is not None and len(frontier):
+        for url, *_ in frontier.pending():
+            budget.skip(url)
+    return collected
 
-def extract_urls(url, collected=None, visited=None, log_lines=None):
-    if collected is None:
-        collected = set()
-    if visited is None:
-        visited = set()
-    if log_lines is None:
-        log_lines = []
-    if url in visited:
-        return collected
-    visited.add(url)
 
+def _crawl_one(frontier, entry, res, collected, visited, log_lines, budget, record=None):
+    try:
+        _crawl_entry(frontier, entry, res, collected, visited, log_lines, budget, record)
+    finally:
+        frontier.done(entry[0])
+
+
+def _crawl_entry(frontier, entry, res, collected, visited, log_lines, budget, record):
+    url, depth, parent, probe = entry
+    text, lines, charged = res
+    if budget is not None and not charged:
+        budget.charge(text)
+    if probe and not (text and "<loc>" in text.lower()):
+        # a regular page listed in the index — count it as a URL, not a sitemap
+        visited.discard(url)
+        if budget is not None:
+            budget.sitemaps -= 1
+        collected.add(url)
+        if record is not None:
+            record(parent, [url])
+        return
     log_lines.append(f"Scanning: {url}")
-    text = fetch_sitemap(url, log_lines=log_lines)
+    log_lines.extend(lines)
     if not text:
         log_lines.append(f"Could not fetch: {url}")
-        return collected
-
-    locs = parse_locs(text)
+        return
+
+    index = is_sitemap_index(text)
+    # A recorded urlset is parsed once, by parse_entries(): its URLs and their
+    # metadata come out of the same pass
+    entries = parse_entries(text) if record is not None and not index else None
+    locs = [e["loc"] for e in entries] if entries else parse_locs(text)
+    entries = entries or None
     log_lines.append(f"  → {len(locs)} <loc> entries found")
 
-    if is_sitemap_index(text):
-        # It's an index — recurse into each child sitemap
+    if index:
+        # It's an index — queue each child sitemap, best candidates first
         log_lines.append(f"  → sitemap index with {len(locs)} children")
-        for loc in locs:
-            if looks_like_sitemap(loc):
-                extract_urls(loc, collected, visited, log_lines)
-            else:
-                # child loc doesn't look like a sitemap — try fetching it anyway
-                child_text = fetch(loc)
-                if child_text and ("<loc>" in child_text.lower()):
-                    extract_urls(loc, collected, visited, log_lines)
-                else:
-                    collected.add(loc)
+        if budget is not None and depth + 1 > budget.max_depth:
+            budget.depth_cut += len(locs)
+            log_lines.append(f"  → max depth {budget.max_depth} reached — skipping {len(locs)} children")
+            return
+        for loc in prioritize_children(text, locs):
+            frontier.push(loc, depth + 1, url, probe=not looks_like_sitemap(loc))
+    elif budget is None or budget.max_urls - len(collected) >= len(locs):
+        collected.update(locs)
+        if record is not None:
+            record(url, locs, entries)
     else:
-        for loc in locs:
+        for i, loc in enumerate(locs):
+            if len(collected) >= budget.max_urls:
+                budget.dropped_urls += len(locs) - i
+                budget.exhausted(len(collected))
+                locs = locs[:i]
+                entries = entries and entries[:i]
+                break
             collected.add(loc)
+        if record is not None:
+            record(url, locs, entries)
 
-    return collected
+
+def extract_urls(url, collected=None, visited=None, log_lines=None, budget=None,
+                 workers=EXTRACT_WORKERS):
+    """Collect every page URL reachable from one sitemap (index children included)."""
+    frontier = SitemapFrontier()
+    frontier.push(url)
+    return crawl_frontier(frontier, collected, visited, log_lines, budget, workers)
 
 
 FALLBACK_PATHS = [
@@ -559,6 +1809,24 @@ def base_url(raw):
     return f"{p.scheme}://{p.netloc}"
 
 
+@app.route("/prefetch", methods=["POST"])
+def prefetch():
+    """Speculative warm-up for a domain being typed; returns immediately.
+
+    ?wait=1 blocks until the origin probes finish and reports them.
+    """
+    data = request.get_json(force=True, silent=True) or {}
+    raw  = (data.get("url") or "").strip()
+    if not raw:
+        return jsonify({"error": "No URL provided"}), 400
+    origins = prefetch_domain(raw)
+    out = {"origins": origins}
+    if not request.args.get("wait"):
+        return jsonify(out), 202
+    out["probes"] = [prefetched("origin:" + o, 10)[1] for o in origins]
+    return jsonify(out)
+
+
 @app.route("/extract", methods=["POST"])
 def extract():
     data = request.get_json(force=True)
@@ -568,38 +1836,1051 @@ def extract():
     if not raw and not override:
         return jsonify({"error": "No URL provided"}), 400
 
-    log_lines = []
-    if override:
-        sitemap_urls = [override]
-    else:
-        sitemap_urls = discover_sitemaps(raw, log_lines=log_lines)
-    log_lines.append(f"Using {len(sitemap_urls)} sitemap(s)")
+    budget = CrawlBudget.from_request(data.get("budget"))
+    return jsonify(run_extraction(raw, override, budget=budget))
+
+
+class _Extraction:
+    """One run_extraction() split into its phases — discovery, the crawl and
+    the bookkeeping after it — so the ASGI mode can run the crawl itself on
+    its event loop and only the blocking phases in its executor."""
+
+    def __init__(self, raw, override="", log_lines=None, collected=None, visited=None, budget=None,
+                 frontier=None, store=True, workers=EXTRACT_WORKERS):
+        self.raw       = raw
+        self.override  = override
+        self.log_lines = [] if log_lines is None else log_lines
+        self.collected = set() if collected is None else collected
+        self.visited   = set() if visited is None else visited
+        self.budget    = CrawlBudget() if budget is None else budget
+        self.frontier  = SitemapFrontier() if frontier is None else frontier
+        self.store     = store
+        self.workers   = workers
+        self.bodies    = {}
+        self.sitemap_urls = []
+        self.run_id    = None
+        self.record    = None
+
+    def begin(self):
+        """Discover the root sitemaps (unless resuming) and open the store run."""
+        log_lines, frontier = self.log_lines, self.frontier
+        if len(frontier):
+            self.sitemap_urls = [u for u, *_ in frontier.pending()]
+            log_lines.append(f"Resuming crawl — {len(self.sitemap_urls)} sitemap(s) queued, "
+                             f"{len(self.visited)} already scanned")
+        elif self.override:
+            self.sitemap_urls = [self.override]
+        else:
+            self.sitemap_urls = discover_sitemaps(self.raw, log_lines=log_lines, budget=self.budget,
+                                                  bodies=self.bodies)
+        log_lines.append(f"Using {len(self.sitemap_urls)} sitemap(s)")
 
-    collected = set()
-    visited = set()
-    for sitemap_url in sitemap_urls:
-        extract_urls(sitemap_url, collected, visited, log_lines)
+        for sitemap_url in self.sitemap_urls:
+            frontier.push(sitemap_url)
 
-    return jsonify({
-        "sitemap": ", ".join(sitemap_urls),
-        "urls": sorted(collected),
-        "count": len(collected),
-        "sitemap_count": len(visited),
-        "robots_sitemaps": len(sitemap_urls),
-        "log": log_lines,
-    })
+        store = get_store() if self.store else None
+        if store is not None:
+            try:
+                host = urlparse(base_url(self.raw or self.sitemap_urls[0])).netloc.lower()
+                self.run_id = store.begin_run(host)
+                self.record = _store_recorder(store, self.run_id)
+            except Exception as e:
+                log_lines.append(f"Crawl store unavailable: {e}")
+                store = None
+        self.store = store
+
+    def crawl_args(self):
+        """Positional arguments for crawl_frontier() / acrawl_frontier()."""
+        return (self.frontier, self.collected, self.visited, self.log_lines, self.budget,
+                self.workers, self.bodies, self.record)
+
+    def finish(self, completed):
+        if self.store is not None:
+            status = (self.budget.reason or "done") if completed else "error"
+            self.store.finish_run(self.run_id, status, len(self.collected), len(self.visited))
+
+    def result(self):
+        """The /extract payload."""
+        report = self.budget.report()
+        if report["truncated"]:
+            self.log_lines.append(f"Budget exhausted ({report['reason']}) — partial results: "
+                                  f"{report['skipped_sitemaps'] + report['depth_cut']} sitemap(s) not fetched, "
+                                  f"{report['dropped_urls']} URL(s) dropped")
+        frontier, visited = self.frontier, self.visited
+        return {
+            "sitemap": ", ".join(self.sitemap_urls),
+            "urls": sorted(self.collected),
+            "count": len(self.collected),
+            "sitemap_count": len(visited),
+            "robots_sitemaps": len(self.sitemap_urls),
+            "log": self.log_lines,
+            "budget": report,
+            "checkpoint": frontier.checkpoint(visited, self.collected) if len(frontier) else None,
+            "run_id": self.run_id,
+        }
 
 
-@app.route("/robots")
-def robots_txt():
-    url = request.args.get("url", "").strip()
-    if not url:
-        return jsonify({"error": "No URL provided"}), 400
-    if not url.startswith("http"):
-        url = "https://" + url
-    parsed = urlparse(url)
-    base = f"{parsed.scheme}://{parsed.netloc}"
-    text = fetch(base + "/robots.txt")
+def run_extraction(raw, override="", log_lines=None, collected=None, visited=None, budget=None,
+                   frontier=None, store=True, workers=EXTRACT_WORKERS):
+    """Discover + extract every URL for one domain; returns the /extract payload.
+
+    collected/visited/log_lines may be passed in so a background job can read
+    progress while the crawl runs; the budget (default limits if None) caps
+    the crawl and its stop Event cancels it early.  A non-empty frontier
+    (e.g. SitemapFrontier.restore()) resumes a crawl and skips discovery.
+    Unless store=False, URLs and their metadata are recorded as a new run in
+    the crawl store (get_store()).
+    """
+    ex = _Extraction(raw, override, log_lines, collected, visited, budget, frontier, store, workers)
+    ex.begin()
+    completed = False
+    try:
+        crawl_frontier(*ex.crawl_args())
+        completed = True
+    finally:
+        ex.finish(completed)
+    return ex.result()
+
+# ── Batch extraction — many domains at once, isolated from each other ───────
+# Each domain gets its own budget (so its own deadline), its own fetch
+# concurrency and its own error handling: a Cloudflare-walled or dead site
+# just produces an error / truncated line for that domain while the others
+# carry on.  Results stream back as NDJSON in completion order, so wall time
+# is roughly that of the slowest domain rather than the sum.
+
+_BATCH_CONCURRENCY = 8      # domains crawled at once
+_BATCH_MAX_DOMAINS = 200
+
+
+def _batch_one(domain, budget_spec, stop, per_host, include_urls):
+    started = time.monotonic()
+    budget = CrawlBudget.from_request(budget_spec, stop=stop)
+    try:
+        payload = run_extraction(domain, budget=budget, workers=per_host)
+        out = {
+            "domain":        domain,
+            "ok":            True,
+            "sitemap":       payload["sitemap"],
+            "count":         payload["count"],
+            "sitemap_count": payload["sitemap_count"],
+            "run_id":        payload["run_id"],
+            "budget":        payload["budget"],
+            "log":           payload["log"],
+        }
+        if include_urls:
+            out["urls"] = payload["urls"]
+    except Exception as e:
+        out = {"domain": domain, "ok": False, "error": str(e), "count": 0}
+    out["seconds"] = round(time.monotonic() - started, 2)
+    return out
+
+
+def extract_batch(domains, budget=None, concurrency=_BATCH_CONCURRENCY, per_host=EXTRACT_WORKERS,
+                  include_urls=True, stop=None):
+    """Yield one result dict per domain as each finishes.
+
+    Closing the generator early (e.g. the client disconnects) sets `stop`,
+    which every domain's budget watches, and drops domains not yet started.
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    stop = threading.Event() if stop is None else stop
+    pool = ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(domains) or 1)),
+                              thread_name_prefix="crawlsync-batch")
+    try:
+        futures = [pool.submit(_batch_one, d, budget, stop, per_host, include_urls) for d in domains]
+        for f in as_completed(futures):
+            yield f.result()
+    finally:
+        stop.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+@app.route("/extract-batch", methods=["POST"])
+def extract_batch_route():
+    """Body: {domains: [...], budget?: {...}, concurrency?: n, per_host?: n, urls?: bool}.
+
+    Streams NDJSON: one line per domain in completion order, then a
+    {"summary": …} line.
+    """
+    _json = app.json
+    data = request.get_json(force=True, silent=True) or {}
+    seen, domains = set(), []
+    for d in data.get("domains") or []:
+        if not isinstance(d, str) or not d.strip():
+            continue
+        key = urlparse(base_url(d)).netloc.lower()
+        if key not in seen:
+            seen.add(key)
+            domains.append(d.strip())
+    if not domains:
+        return jsonify({"error": "No domains provided"}), 400
+    if len(domains) > _BATCH_MAX_DOMAINS:
+        return jsonify({"error": f"At most {_BATCH_MAX_DOMAINS} domains per batch"}), 400
+    try:
+        concurrency = max(1, min(int(data.get("concurrency") or _BATCH_CONCURRENCY), 32))
+        per_host    = max(1, min(int(data.get("per_host") or EXTRACT_WORKERS), 16))
+    except (TypeError, ValueError):
+        return jsonify({"error": "concurrency/per_host must be integers"}), 400
+    include_urls = data.get("urls", True) is not False
+
+    def stream():
+        started = time.monotonic()
+        ok = failed = truncated = urls = 0
+        for res in extract_batch(domains, data.get("budget"), concurrency, per_host, include_urls):
+            ok        += res["ok"]
+            failed    += not res["ok"]
+            truncated += bool(res.get("budget", {}).get("truncated"))
+            urls      += res["count"]
+            yield _json.dumps(res) + "\n"
+        yield _json.dumps({"summary": {
+            "domains":   len(domains),
+            "ok":        ok,
+            "failed":    failed,
+            "truncated": truncated,
+            "urls":      urls,
+            "seconds":   round(time.monotonic() - started, 2),
+        }}) + "\n"
+
+    return Response(stream(), mimetype="application/x-ndjson",
+                    headers={"X-Accel-Buffering": "no", "Cache-Control": "no-cache"})
+
+
+# ── Crawl store — every extracted URL with its sitemap metadata, in SQLite ───
+# Each extraction is a run keyed by domain.  URLs are stored with lastmod /
+# changefreq / priority, the sitemap that listed them and any image / video /
+# news extension entries, so freshness questions and run-to-run comparisons
+# are indexed queries instead of fresh crawls.  WAL mode lets the UI read
+# while a background job is still writing.  Only the newest CRAWL_KEEP_RUNS
+# runs of each domain are kept; older ones are pruned when a new run begins.
+# A run still marked running from before this server started (the app was
+# closed or crashed mid-crawl) is marked aborted on open, so it can be pruned.
+
+CRAWL_DB = os.environ.get("CRAWLSYNC_DB") or os.path.join(os.path.expanduser("~"), "CrawlSync", "crawlsync.db")
+CRAWL_KEEP_RUNS = int(os.environ.get("CRAWLSYNC_KEEP_RUNS") or 10)     # per domain; 0 keeps everything
+_STORE_BATCH = 5000
+_STORE_BOOT  = time.time()      # set before any prefork, so every worker agrees on it
+
+_STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id            INTEGER PRIMARY KEY,
+    domain        TEXT NOT NULL,
+    started       REAL NOT NULL,
+    finished      REAL,
+    status        TEXT NOT NULL DEFAULT 'running',
+    url_count     INTEGER NOT NULL DEFAULT 0,
+    sitemap_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS runs_domain ON runs (domain, started);
+CREATE TABLE IF NOT EXISTS urls (
+    run_id     INTEGER NOT NULL,
+    url        TEXT NOT NULL,
+    host       TEXT NOT NULL,
+    path       TEXT NOT NULL,
+    lastmod    TEXT,
+    changefreq TEXT,
+    priority   REAL,
+    sitemap    TEXT,
+    images     INTEGER NOT NULL DEFAULT 0,
+    videos     INTEGER NOT NULL DEFAULT 0,
+    news       INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (run_id, url)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS urls_host_path ON urls (run_id, host, path);
+CREATE INDEX IF NOT EXISTS urls_path      ON urls (run_id, path);
+CREATE INDEX IF NOT EXISTS urls_lastmod   ON urls (run_id, lastmod);
+CREATE TABLE IF NOT EXISTS url_media (
+    run_id INTEGER NOT NULL,
+    url    TEXT NOT NULL,
+    kind   TEXT NOT NULL,
+    loc    TEXT,
+    title  TEXT,
+    date   TEXT
+);
+CREATE INDEX IF NOT EXISTS url_media_url ON url_media (run_id, url);
+"""
+
+_URL_BLOCK_RE   = re.compile(r"<url[\s>].*?</url>", re.IGNORECASE | re.DOTALL)
+_TAG_RES        = {t: re.compile(rf"<{t}>\s*(.*?)\s*</{t}>", re.IGNORECASE | re.DOTALL)
+                   for t in ("lastmod", "changefreq", "priority")}
+_IMAGE_RE       = re.compile(r"<image:loc>\s*(.*?)\s*</image:loc>", re.IGNORECASE | re.DOTALL)
+_VIDEO_RE       = re.compile(r"<video:video>(.*?)</video:video>", re.IGNORECASE | re.DOTALL)
+_NEWS_RE        = re.compile(r"<news:news>(.*?)</news:news>", re.IGNORECASE | re.DOTALL)
+_EXT_FIELD_RES  = {t: re.compile(rf"<{t}>\s*(.*?)\s*</{t}>", re.IGNORECASE | re.DOTALL)
+                   for t in ("video:content_loc", "video:player_loc", "video:title",
+                             "video:publication_date", "news:title", "news:publication_date")}
+
+
+def _xml_text(s):
+    s = re.sub(r"<!\[CDATA\[(.*?)\]\]>", r"\1", s, flags=re.DOTALL)
+    return html_mod.unescape(s).strip()
+
+
+def _norm_lastmod(value):
+    """W3C datetime → 'YYYY-MM-DDTHH:MM:SSZ' (UTC) so lastmods sort and compare as text."""
+    from datetime import datetime, timezone
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        return value.strip()[:40] or None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _ext_field(block, tag):
+    m = _EXT_FIELD_RES[tag].search(block)
+    return _xml_text(m.group(1)) if m else None
+
+
+def parse_entries(text):
+    """Per-<url> metadata from a urlset: dicts with loc, lastmod, changefreq,
+    priority and a `media` list of image / video / news extension entries."""
+    out = []
+    for m in _URL_BLOCK_RE.finditer(text):
+        block = m.group(0)
+        locs = parse_locs(block)
+        if not locs:
+            continue
+        e = {"loc": locs[0], "media": []}
+        for tag, rx in _TAG_RES.items():
+            t = rx.search(block)
+            e[tag] = _xml_text(t.group(1)) if t else None
+        e["lastmod"] = _norm_lastmod(e["lastmod"])
+        try:
+            e["priority"] = float(e["priority"]) if e["priority"] else None
+        except ValueError:
+            e["priority"] = None
+        if "image:" in block or "video:" in block or "news:" in block:
+            for loc in _IMAGE_RE.findall(block):
+                e["media"].append(("image", _xml_text(loc), None, None))
+            for v in _VIDEO_RE.findall(block):
+                e["media"].append(("video",
+                                   _ext_field(v, "video:content_loc") or _ext_field(v, "video:player_loc"),
+                                   _ext_field(v, "video:title"), _ext_field(v, "video:publication_date")))
+            for n in _NEWS_RE.findall(block):
+                e["media"].append(("news", None, _ext_field(n, "news:title"),
+                                   _norm_lastmod(_ext_field(n, "news:publication_date"))))
+        out.append(e)
+    return out
+
+
+class CrawlStore:
+    """SQLite crawl store; one connection per thread, WAL journal."""
+
+    def __init__(self, path=CRAWL_DB):
+        self.path   = path
+        self._local = threading.local()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn().executescript(_STORE_SCHEMA)
+        with self.conn() as c:
+            c.execute("UPDATE runs SET status='aborted', finished=? "
+                      "WHERE status='running' AND finished IS NULL AND started < ?",
+                      (time.time(), _STORE_BOOT))
+
+    def conn(self):
+        import sqlite3
+        c = getattr(self._local, "conn", None)
+        if c is None:
+            c = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            c.row_factory = sqlite3.Row
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = c
+        return c
+
+    def begin_run(self, domain, keep=None):
+        """Start a run for `domain`, first pruning all but its newest keep-1 finished runs."""
+        keep = CRAWL_KEEP_RUNS if keep is None else keep
+        if keep > 0:
+            old = self.conn().execute(
+                "SELECT id FROM runs WHERE domain=? AND status!='running' ORDER BY id DESC LIMIT -1 OFFSET ?",
+                (domain, keep - 1)).fetchall()
+            self.delete_runs([r["id"] for r in old])
+        with self.conn() as c:
+            cur = c.execute("INSERT INTO runs (domain, started) VALUES (?, ?)", (domain, time.time()))
+        return cur.lastrowid
+
+    def delete_runs(self, run_ids):
+        """Drop runs with their URLs and media rows; returns how many runs existed."""
+        ids = [(i,) for i in run_ids]
+        if not ids:
+            return 0
+        with self.conn() as c:
+            c.executemany("DELETE FROM url_media WHERE run_id=?", ids)
+            c.executemany("DELETE FROM urls WHERE run_id=?", ids)
+            return c.executemany("DELETE FROM runs WHERE id=?", ids).rowcount
+
+    def finish_run(self, run_id, status, url_count, sitemap_count):
+        with self.conn() as c:
+            c.execute("UPDATE runs SET finished=?, status=?, url_count=?, sitemap_count=? WHERE id=?",
+                      (time.time(), status, url_count, sitemap_count, run_id))
+
+    def add_entries(self, run_id, sitemap, entries):
+        """Insert parsed entries in batches of _STORE_BATCH rows per transaction."""
+        for i in range(0, len(entries), _STORE_BATCH):
+            rows, media = [], []
+            for e in entries[i:i + _STORE_BATCH]:
+                p = urlparse(e["loc"])
+                kinds = [m[0] for m in e["media"]]
+                rows.append((run_id, e["loc"], p.netloc.lower(), p.path or "/", e["lastmod"],
+                             e["changefreq"], e["priority"], sitemap,
+                             kinds.count("image"), kinds.count("video"), kinds.count("news")))
+                media.extend((run_id, e["loc"]) + m for m in e["media"])
+            with self.conn() as c:
+                c.executemany("INSERT OR IGNORE INTO urls VALUES (?,?,?,?,?,?,?,?,?,?,?)", rows)
+                if media:
+                    c.executemany("INSERT INTO url_media VALUES (?,?,?,?,?,?)", media)
+
+    def add_urls(self, run_id, sitemap, urls):
+        """Bare URLs with no sitemap metadata (e.g. pages listed directly in an index)."""
+        self.add_entries(run_id, sitemap, [{"loc": u, "lastmod": None, "changefreq": None,
+                                            "priority": None, "media": []} for u in urls])
+
+    def runs(self, domain=None, limit=50):
+        sql, args = "SELECT * FROM runs", []
+        if domain:
+            sql, args = sql + " WHERE domain=?", [domain]
+        rows = self.conn().execute(sql + " ORDER BY id DESC LIMIT ?", args + [limit]).fetchall()
+        return [dict(r) for r in rows]
+
+    def latest_run(self, domain):
+        r = self.conn().execute("SELECT id FROM runs WHERE domain=? AND status='done' ORDER BY id DESC LIMIT 1",
+                                (domain,)).fetchone()
+        return r["id"] if r else None
+
+    def query(self, run_id, host=None, prefix=None, since=None, offset=0, limit=1000):
+        """URLs of a run filtered by host, path prefix and lastmod >= since; (total, rows)."""
+        where, args = ["run_id=?"], [run_id]
+        if host:
+            where.append("host=?")
+            args.append(host.lower())
+        if prefix:
+            where.append("path >= ? AND path < ?")
+            args += [prefix, prefix + "\U0010ffff"]
+        if since:
+            where.append("lastmod >= ?")
+            args.append(since)
+        cond = " AND ".join(where)
+        c = self.conn()
+        total = c.execute(f"SELECT COUNT(*) FROM urls WHERE {cond}", args).fetchone()[0]
+        rows = c.execute(f"SELECT url, lastmod, changefreq, priority, sitemap, images, videos, news "
+                         f"FROM urls WHERE {cond} ORDER BY url LIMIT ? OFFSET ?",
+                         args + [limit, offset]).fetchall()
+        return total, [dict(r) for r in rows]
+
+    def freshness(self, run_id, days=(1, 7, 30, 90, 365)):
+        """URL counts with a lastmod in each of the last N days, plus undated."""
+        from datetime import datetime, timedelta, timezone
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        c = self.conn()
+        out = {"total": c.execute("SELECT COUNT(*) FROM urls WHERE run_id=?", (run_id,)).fetchone()[0],
+               "undated": c.execute("SELECT COUNT(*) FROM urls WHERE run_id=? AND lastmod IS NULL",
+                                    (run_id,)).fetchone()[0]}
+        for d in days:
+            since = (now - timedelta(days=d)).strftime("%Y-%m-%dT%H:%M:%SZ")
+            out[f"last_{d}d"] = c.execute("SELECT COUNT(*) FROM urls WHERE run_id=? AND lastmod >= ?",
+                                          (run_id, since)).fetchone()[0]
+        return out
+
+    def diff(self, run_id, base_id, limit=100):
+        """URLs added / removed / re-dated in run_id compared with base_id."""
+        c = self.conn()
+        added_sql = ("FROM urls a WHERE a.run_id=? AND NOT EXISTS "
+                     "(SELECT 1 FROM urls b WHERE b.run_id=? AND b.url=a.url)")
+        changed_sql = ("FROM urls a JOIN urls b ON b.run_id=? AND b.url=a.url "
+                       "WHERE a.run_id=? AND a.lastmod IS NOT b.lastmod")
+        out = {}
+        for key, sql, args in (("added",   added_sql,   (run_id, base_id)),
+                               ("removed", added_sql,   (base_id, run_id)),
+                               ("changed", changed_sql, (base_id, run_id))):
+            out[key] = {
+                "count":  c.execute(f"SELECT COUNT(*) {sql}", args).fetchone()[0],
+                "sample": [r[0] for r in c.execute(f"SELECT a.url {sql} LIMIT ?", args + (limit,))],
+            }
+        return out
+
+
+_store      = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """The shared CrawlStore, or None when disabled (CRAWLSYNC_DB=off) or unopenable."""
+    global _store
+    if CRAWL_DB.lower() == "off":
+        return None
+    with _store_lock:
+        if _store is None:
+            try:
+                _store = CrawlStore(CRAWL_DB)
+            except Exception as e:
+                print(f"[store] disabled — {e}", file=sys.stderr)
+                _store = False
+    return _store or None
+
+
+def _store_recorder(store, run_id):
+    """Callback for crawl_frontier: record(sitemap_url, added_locs, entries=None);
+    `entries` are the parse_entries() dicts for those locs, None for bare URLs
+    (pages listed directly in an index, or a sitemap without <url> blocks)."""
+    failed = []
+
+    def record(sitemap, locs, entries=None):
+        if failed:
+            return
+        try:
+            if entries is None:
+                store.add_urls(run_id, sitemap, locs)
+            else:
+                store.add_entries(run_id, sitemap, entries)
+        except Exception as e:
+            # A full disk or locked DB shouldn't cost the crawl itself
+            failed.append(e)
+            print(f"[store] run {run_id}: recording stopped — {e}", file=sys.stderr)
+    return record
+
+
+def _store_arg(name, default=None, cast=str):
+    v = request.args.get(name)
+    if v in (None, ""):
+        return default
+    return cast(v)
+
+
+@app.route("/store/runs")
+def store_runs():
+    store = get_store()
+    if store is None:
+        return jsonify({"error": "Crawl store disabled"}), 503
+    return jsonify({"runs": store.runs(_store_arg("domain"), _store_arg("limit", 50, int))})
+
+
+@app.route("/store/runs/<int:run_id>", methods=["DELETE"])
+def store_delete_run(run_id):
+    store = get_store()
+    if store is None:
+        return jsonify({"error": "Crawl store disabled"}), 503
+    row = store.conn().execute("SELECT status FROM runs WHERE id=?", (run_id,)).fetchone()
+    if row is None:
+        return jsonify({"error": f"No such run: {run_id}"}), 404
+    if row["status"] == "running":
+        return jsonify({"error": "Run is still in progress"}), 409
+    store.delete_runs([run_id])
+    return jsonify({"deleted": run_id})
+
+
+def _store_run_id(store):
+    """?run= explicitly, else the latest finished run for ?domain=."""
+    run_id = _store_arg("run", None, int)
+    if run_id is None and _store_arg("domain"):
+        run_id = store.latest_run(_store_arg("domain"))
+    return run_id
+
+
+@app.route("/store/urls")
+def store_urls():
+    """?run|domain, host, prefix, since (ISO) or days, offset, limit."""
+    store = get_store()
+    if store is None:
+        return jsonify({"error": "Crawl store disabled"}), 503
+    try:
+        run_id = _store_run_id(store)
+        since  = _store_arg("since")
+        days   = _store_arg("days", None, float)
+        offset = max(0, _store_arg("offset", 0, int))
+        limit  = max(1, min(_store_arg("limit", 1000, int), 50000))
+    except ValueError:
+        return jsonify({"error": "run/days/offset/limit must be numbers"}), 400
+    if run_id is None:
+        return jsonify({"error": "No run found — pass ?run= or ?domain="}), 404
+    if days is not None:
+        since = _norm_lastmod(time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() - days * 86400)))
+    elif since:
+        since = _norm_lastmod(since)
+    total, rows = store.query(run_id, _store_arg("host"), _store_arg("prefix"), since, offset, limit)
+    return jsonify({"run_id": run_id, "total": total, "offset": offset, "urls": rows})
+
+
+@app.route("/store/freshness")
+def store_freshness():
+    store = get_store()
+    if store is None:
+        return jsonify({"error": "Crawl store disabled"}), 503
+    try:
+        run_id = _store_run_id(store)
+    except ValueError:
+        return jsonify({"error": "run must be an integer"}), 400
+    if run_id is None:
+        return jsonify({"error": "No run found — pass ?run= or ?domain="}), 404
+    return jsonify(dict(store.freshness(run_id), run_id=run_id))
+
+
+@app.route("/store/diff")
+def store_diff():
+    """?run=&base= — base defaults to the run before `run` for the same domain."""
+    store = get_store()
+    if store is None:
+        return jsonify({"error": "Crawl store disabled"}), 503
+    try:
+        run_id = _store_run_id(store)
+        base   = _store_arg("base", None, int)
+        limit  = max(0, min(_store_arg("limit", 100, int), 5000))
+    except ValueError:
+        return jsonify({"error": "run/base/limit must be integers"}), 400
+    if run_id is None:
+        return jsonify({"error": "No run found — pass ?run= or ?domain="}), 404
+    if base is None:
+        row = store.conn().execute(
+            "SELECT id FROM runs WHERE domain=(SELECT domain FROM runs WHERE id=?) AND id<? "
+            "AND status='done' ORDER BY id DESC LIMIT 1", (run_id, run_id)).fetchone()
+        if row is None:
+            return jsonify({"error": "No earlier run to compare with"}), 404
+        base = row["id"]
+    return jsonify(dict(store.diff(run_id, base, limit), run_id=run_id, base_id=base))
+
+
+# ── Shared state — jobs, caches and host slots across worker processes ───────
+# A single server process keeps jobs, IA trees and prefetch results in module
+# dicts.  Under serve_production() the app runs in several forked workers and
+# a client's next request can land on any of them, so that state is mirrored
+# into one small SQLite file every worker opens (CRAWLSYNC_SHARED, set by
+# serve_production).  A job still runs in the worker that accepted it; the
+# others serve its published snapshot and pass cancellation back through the
+# same row.  Browsers and HTTP pools stay per-process — they can't be shared.
+
+SHARED_DB              = os.environ.get("CRAWLSYNC_SHARED", "")
+_SHARED_SNAPSHOT_EVERY = 5.0     # seconds between partial / checkpoint snapshots of a running job
+
+_SHARED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    key     TEXT PRIMARY KEY,
+    expires REAL NOT NULL,
+    value   BLOB
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS host_slots (
+    host    TEXT PRIMARY KEY,
+    next_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS jobs (
+    id         TEXT PRIMARY KEY,
+    owner      INTEGER NOT NULL,
+    created    REAL NOT NULL,
+    status     TEXT NOT NULL,
+    cancel     INTEGER NOT NULL DEFAULT 0,
+    log_len    INTEGER NOT NULL DEFAULT 0,
+    summary    TEXT,
+    partial    TEXT,
+    checkpoint TEXT,
+    result     TEXT
+);
+CREATE TABLE IF NOT EXISTS job_log (
+    job_id TEXT NOT NULL,
+    seq    INTEGER NOT NULL,
+    line   TEXT,
+    PRIMARY KEY (job_id, seq)
+) WITHOUT ROWID;
+"""
+
+
+class SharedState:
+    """Process-safe cache, host slots and job snapshots in one SQLite file (WAL)."""
+
+    def __init__(self, path):
+        self.path   = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn().executescript(_SHARED_SCHEMA)
+
+    def conn(self):
+        """This thread's connection — reopened after a fork, never inherited."""
+        import sqlite3
+        c = getattr(self._local, "conn", None)
+        if c is None or self._local.pid != os.getpid():
+            c = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            c.row_factory = sqlite3.Row
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = c, os.getpid()
+        return c
+
+    def close(self):
+        c = getattr(self._local, "conn", None)
+        if c is not None and self._local.pid == os.getpid():
+            c.close()
+        self._local.conn = None
+
+    def reset(self):
+        """New server run: drop caches and host slots, fail jobs a previous run left unfinished."""
+        with self.conn() as c:
+            c.execute("DELETE FROM kv")
+            c.execute("DELETE FROM host_slots")
+            c.execute("UPDATE jobs SET status='error' WHERE status IN ('queued', 'running')")
+
+    # key/value cache ---------------------------------------------------------
+
+    def put(self, key, value, ttl):
+        import pickle
+        now = time.time()
+        with self.conn() as c:
+            c.execute("DELETE FROM kv WHERE expires <= ?", (now,))
+            c.execute("INSERT OR REPLACE INTO kv VALUES (?, ?, ?)",
+                      (key, now + ttl, pickle.dumps(value, pickle.HIGHEST_PROTOCOL)))
+
+    def get(self, key):
+        """(hit, value) for an unexpired key."""
+        import pickle
+        row = self.conn().execute("SELECT expires, value FROM kv WHERE key=?", (key,)).fetchone()
+        if row is None or row["expires"] <= time.time():
+            return False, None
+        return True, pickle.loads(row["value"])
+
+    # per-host request slots --------------------------------------------------
+
+    def host_slot(self, host, interval):
+        """Reserve the host's next request slot; returns seconds to wait for it."""
+        c = self.conn()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            row = c.execute("SELECT next_at FROM host_slots WHERE host=?", (host,)).fetchone()
+            now = time.time()
+            at  = max(now, row["next_at"] if row else 0.0)
+            c.execute("INSERT OR REPLACE INTO host_slots VALUES (?, ?)", (host, at + interval))
+            c.execute("COMMIT")
+        except BaseException:
+            c.execute("ROLLBACK")
+            raise
+        return at - now
+
+    # jobs --------------------------------------------------------------------
+
+    def publish_job(self, job, snapshot=False):
+        """Write a local job's summary and new log lines — plus partial results
+        and checkpoint when `snapshot` or finished, and the result once done.
+        Returns True if another worker has asked for it to be cancelled."""
+        dumps = app.json.dumps
+        with self.conn() as c:
+            row = c.execute("SELECT log_len, cancel FROM jobs WHERE id=?", (job.id,)).fetchone()
+            if row is None:
+                c.execute("INSERT INTO jobs (id, owner, created, status) VALUES (?, ?, ?, ?)",
+                          (job.id, os.getpid(), job.created, job.status))
+                log_len, cancel = 0, 0
+            else:
+                log_len, cancel = row["log_len"], row["cancel"]
+            lines = job.log[log_len:]
+            c.executemany("INSERT OR IGNORE INTO job_log VALUES (?, ?, ?)",
+                          [(job.id, log_len + i, line) for i, line in enumerate(lines)])
+            cols = {"status": job.status, "summary": dumps(job.summary()), "log_len": log_len + len(lines)}
+            if snapshot or job.finished:
+                cols["partial"] = dumps(job.partial_items())
+                cp = job.checkpoint()
+                cols["checkpoint"] = dumps(cp) if cp is not None else None
+            if job.finished and job.result is not None:
+                cols["result"] = dumps(job.result)
+            c.execute(f"UPDATE jobs SET {', '.join(k + '=?' for k in cols)} WHERE id=?",
+                      [*cols.values(), job.id])
+        return bool(cancel)
+
+    def trim_jobs(self, keep):
+        with self.conn() as c:
+            old = [r[0] for r in c.execute(
+                "SELECT id FROM jobs WHERE status NOT IN ('queued', 'running') "
+                "ORDER BY created DESC LIMIT -1 OFFSET ?", (keep,))]
+            c.executemany("DELETE FROM job_log WHERE job_id=?", [(i,) for i in old])
+            c.executemany("DELETE FROM jobs WHERE id=?", [(i,) for i in old])
+
+    def job(self, job_id):
+        row = self.conn().execute("SELECT id, owner, status, summary FROM jobs WHERE id=?",
+                                  (job_id,)).fetchone()
+        return _SharedJob(self, row) if row and row["summary"] else None
+
+    def jobs(self):
+        rows = self.conn().execute("SELECT id, owner, status, summary FROM jobs "
+                                   "WHERE summary IS NOT NULL ORDER BY created").fetchall()
+        return [_SharedJob(self, r) for r in rows]
+
+    def job_log(self, job_id, start=0):
+        return [r[0] for r in self.conn().execute(
+            "SELECT line FROM job_log WHERE job_id=? AND seq >= ? ORDER BY seq", (job_id, start))]
+
+    def job_field(self, job_id, col):
+        """Decoded JSON of one snapshot column (partial, checkpoint or result)."""
+        import json
+        row = self.conn().execute(f"SELECT {col} FROM jobs WHERE id=?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row and row[0] is not None else None
+
+    def cancel_job(self, job_id):
+        with self.conn() as c:
+            c.execute("UPDATE jobs SET cancel=1 WHERE id=?", (job_id,))
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True         # exists, owned by someone else
+    return True
+
+
+class _SharedJob:
+    """A job owned by another worker process, seen through its published snapshot."""
+
+    def __init__(self, shared, row):
+        import json
+        self._shared = shared
+        self.id      = row["id"]
+        s            = json.loads(row["summary"])
+        self.kind    = s["kind"]
+        self.status  = row["status"]
+        self.error   = s.get("error")
+        if self.status in ("queued", "running") and not _pid_alive(row["owner"]):
+            self.status, self.error = "error", "Worker process exited before the job finished"
+        elif self.status == "error" and s["status"] != "error" and not self.error:
+            self.error = "Server restarted before the job finished"
+        s.update(status=self.status, error=self.error)
+        self._summary = s
+
+    @property
+    def finished(self):
+        return self.status not in ("queued", "running")
+
+    @property
+    def finished_ok(self):
+        return self.status in ("done", "cancelled")
+
+    @property
+    def result(self):
+        return self._shared.job_field(self.id, "result")
+
+    def summary(self):
+        return dict(self._summary)
+
+    def log_since(self, start):
+        return self._shared.job_log(self.id, start)
+
+    def partial_items(self):
+        return self._shared.job_field(self.id, "partial") or []
+
+    def checkpoint(self):
+        return self._shared.job_field(self.id, "checkpoint")
+
+    def request_cancel(self):
+        self._shared.cancel_job(self.id)
+
+
+_shared      = None
+_shared_lock = threading.Lock()
+
+
+def shared_state():
+    """The cross-process SharedState, or None in single-process mode (CRAWLSYNC_SHARED unset)."""
+    global _shared
+    if not SHARED_DB:
+        return None
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                _shared = SharedState(SHARED_DB)
+    return _shared
+
+
+# ── IA tree — trie of path segments with per-node page counts ───────────────
+# The IA Builder table is one row per URL, which the browser can't render for
+# very large sites.  The tree is built once here, in a single pass over the
+# URL list, and clients expand one node at a time via /ia-tree/<id>/node.
+
+_IA_TREE_LIMIT = 8          # trees kept in memory; oldest evicted first
+_IA_TREE_TTL   = 3600       # seconds a tree stays in shared_state() for other workers
+_ia_trees      = OrderedDict()
+_ia_lock       = threading.Lock()
+
+
+def _ia_label(seg):
+    """Human label for a path segment — mirrors sanitize() in the IA Builder UI."""
+    words = [w for w in re.split(r"[-_]+", seg) if w]
+    return " ".join(w[:1].upper() + w[1:] for w in words) or seg
+
+
+class _IANode:
+    __slots__ = ("name", "count", "pages", "deepest", "url", "children", "_ranked")
+
+    def __init__(self, name):
+        self.name     = name
+        self.count    = 0      # URLs at or below this node
+        self.pages    = 0      # URLs whose path ends exactly at this node
+        self.deepest  = 0      # deepest URL depth in this subtree
+        self.url      = None   # first URL that ends here (for linking/copying)
+        self.children = {}
+        self._ranked  = None   # children sorted by count, built on first expand
+
+    def ranked(self):
+        if self._ranked is None:
+            self._ranked = sorted(self.children.values(), key=lambda n: (-n.count, n.name))
+        return self._ranked
+
+
+def build_ia_tree(urls):
+    """Build the IA trie from a URL list and return it with site-wide depth stats."""
+    root         = _IANode("")
+    depth_counts = {}
+    hosts        = set()
+    total        = 0
+    for u in urls:
+        u = (u or "").strip() if isinstance(u, str) else ""
+        if not u:
+            continue
+        try:
+            p = urlparse(u)
+        except ValueError:
+            continue
+        segs  = [s for s in p.path.split("/") if s]
+        depth = len(segs)
+        total += 1
+        hosts.add(p.netloc)
+        depth_counts[depth] = depth_counts.get(depth, 0) + 1
+        node = root
+        node.count += 1
+        if depth > node.deepest:
+            node.deepest = depth
+        for s in segs:
+            child = node.children.get(s)
+            if child is None:
+                child = node.children[s] = _IANode(s)
+            child.count += 1
+            if depth > child.deepest:
+                child.deepest = depth
+            node = child
+        node.pages += 1
+        if node.url is None:
+            node.url = u
+
+    weighted = sum(d * c for d, c in depth_counts.items())
+    return {
+        "root":  root,
+        "total": total,
+        "hosts": sorted(hosts),
+        "depth": {
+            "max":       max(depth_counts) if depth_counts else 0,
+            "avg":       round(weighted / total, 1) if total else 0,
+            "histogram": {str(d): depth_counts[d] for d in sorted(depth_counts)},
+        },
+    }
+
+
+def _ia_node_json(node, path, total):
+    return {
+        "path":     path or "/",
+        "name":     node.name,
+        "label":    _ia_label(node.name) if node.name else "Home",
+        "count":    node.count,
+        "pages":    node.pages,
+        "share":    round(node.count / total * 100, 2) if total else 0,
+        "children": len(node.children),
+        "deepest":  node.deepest,
+        "url":      node.url,
+    }
+
+
+def _ia_children_json(node, path, total, offset=0, limit=50):
+    kids = node.ranked()[offset:offset + limit]
+    return [_ia_node_json(k, f"{path}/{k.name}", total) for k in kids]
+
+
+def _ia_find(root, path):
+    """Walk the trie along a '/a/b/c' path; return the node or None."""
+    node = root
+    for s in (path or "").split("/"):
+        if not s:
+            continue
+        node = node.children.get(s)
+        if node is None:
+            return None
+    return node
+
+
+def _ia_remember(tree_id, tree):
+    with _ia_lock:
+        _ia_trees[tree_id] = tree
+        while len(_ia_trees) > _IA_TREE_LIMIT:
+            _ia_trees.popitem(last=False)
+
+
+@app.route("/ia-tree", methods=["POST"])
+def ia_tree_build():
+    data = request.get_json(force=True, silent=True) or {}
+    urls = data.get("urls") or []
+    if not isinstance(urls, list) or not urls:
+        return jsonify({"error": "No URLs provided"}), 400
+    try:
+        top = max(1, min(int(data.get("top", 20) or 20), 500))
+    except (TypeError, ValueError):
+        return jsonify({"error": "top must be an integer"}), 400
+
+    tree    = build_ia_tree(urls)
+    tree_id = uuid.uuid4().hex[:12]
+    _ia_remember(tree_id, tree)
+    if shared_state() is not None:
+        shared_state().put("ia:" + tree_id, tree, _IA_TREE_TTL)
+
+    root = tree["root"]
+    return jsonify({
+        "tree_id":  tree_id,
+        "total":    tree["total"],
+        "hosts":    tree["hosts"],
+        "sections": len(root.children),
+        "depth":    tree["depth"],
+        "root":     _ia_node_json(root, "", tree["total"]),
+        "top":      _ia_children_json(root, "", tree["total"], 0, top),
+    })
+
+
+@app.route("/ia-tree/<tree_id>/node")
+def ia_tree_node(tree_id):
+    with _ia_lock:
+        tree = _ia_trees.get(tree_id)
+        if tree is not None:
+            _ia_trees.move_to_end(tree_id)
+    if tree is None and shared_state() is not None:
+        hit, tree = shared_state().get("ia:" + tree_id)     # built by another worker
+        if hit:
+            _ia_remember(tree_id, tree)
+    if tree is None:
+        return jsonify({"error": "Unknown or expired tree — rebuild it"}), 404
+
+    path = "/" + "/".join(s for s in request.args.get("path", "").split("/") if s)
+    node = _ia_find(tree["root"], path)
+    if node is None:
+        return jsonify({"error": f"No such node: {path}"}), 404
+    try:
+        offset = max(0, int(request.args.get("offset", 0)))
+        limit  = max(1, min(int(request.args.get("limit", 50)), 1000))
+    except ValueError:
+        return jsonify({"error": "offset/limit must be integers"}), 400
+
+    base = "" if path == "/" else path
+    return jsonify({
+        "node":     _ia_node_json(node, base, tree["total"]),
+        "children": _ia_children_json(node, base, tree["total"], offset, limit),
+        "offset":   offset,
+        "limit":    limit,
+        "has_more": offset + limit < len(node.children),
+    })
+
+
+@app.route("/robots")
+def robots_txt():
+    url = request.args.get("url", "").strip()
+    if not url:
+        return jsonify({"error": "No URL provided"}), 400
+    if not url.startswith("http"):
+        url = "https://" + url
+    parsed = urlparse(url)
+    base = f"{parsed.scheme}://{parsed.netloc}"
+    text = fetch(base + "/robots.txt")
     if not text:
         return jsonify({"raw": "", "ok": False, "error": "Could not fetch robots.txt"})
     return jsonify({"raw": text, "ok": True})
@@ -617,22 +2898,468 @@ def restart():
     return jsonify({"ok": True})
 
 
+# ── Background jobs ──────────────────────────────────────────────────────────
+# Long extractions and bulk inspections run on a dedicated executor so the
+# server's request threads stay free for /ping, /inspect-page etc.  Jobs live
+# in memory for the lifetime of the server, so the UI can reattach to a running
+# job after a page reload or a /restart.  With several worker processes each
+# job is also published to shared_state() about once a second, and the routes
+# fall back to that snapshot for jobs another worker is running.
+
+_JOB_WORKERS  = 4
+_JOB_KEEP     = 50         # finished jobs retained for result fetches
+_jobs         = OrderedDict()
+_jobs_lock    = threading.Lock()
+_job_executor = None
+_job_publisher = None
+
+
+class _Job:
+    def __init__(self, kind, params):
+        self.id        = uuid.uuid4().hex[:12]
+        self.kind      = kind
+        self.params    = params
+        self.status    = "queued"    # queued → running → done | error | cancelled
+        self.created   = time.time()
+        self.started   = None
+        self.finished  = None
+        self.error     = None
+        self.result    = None
+        self.log       = []
+        self.collected = set()       # extract: URLs found so far
+        self.visited   = set()       # extract: sitemaps scanned so far
+        self.frontier  = None        # extract: SitemapFrontier of sitemaps still queued
+        self.pages     = []          # inspect: per-URL results so far
+        self.total     = 0
+        self.cancel    = threading.Event()
+        self.published = False       # final state written to shared_state()
+
+    @property
+    def finished_ok(self):
+        return self.status in ("done", "cancelled")
+
+    def progress(self):
+        if self.kind == "extract":
+            queued = len(self.frontier) if self.frontier is not None else 0
+            return {"done": len(self.visited), "total": None, "queued": queued, "found": len(self.collected)}
+        return {"done": len(self.pages), "total": self.total, "found": len(self.pages)}
+
+    def log_since(self, start):
+        return self.log[start:]
+
+    def partial_items(self):
+        if self.kind == "extract":
+            return sorted(self.collected.copy())   # set.copy() is atomic — safe mid-crawl
+        return self.pages[:]
+
+    def checkpoint(self):
+        """Frontier snapshot of an extract job, or None."""
+        if self.kind != "extract" or self.frontier is None:
+            return None
+        return self.frontier.checkpoint(self.visited, self.collected)
+
+    def request_cancel(self):
+        self.cancel.set()
+
+    def summary(self):
+        end = self.finished or time.time()
+        return {
+            "job_id":   self.id,
+            "kind":     self.kind,
+            "status":   self.status,
+            "params":   self.params,
+            "created":  self.created,
+            "elapsed":  round(end - self.started, 1) if self.started else 0,
+            "progress": self.progress(),
+            "error":    self.error,
+        }
+
+
+def _job_extract(job):
+    p = job.params
+    budget = CrawlBudget.from_request(p.get("budget"), stop=job.cancel)
+    job.frontier = SitemapFrontier.restore(p["checkpoint"], job.visited, job.collected) if p.get("checkpoint") \
+        else SitemapFrontier()
+    job.result = run_extraction(p.get("url", ""), p.get("override", ""),
+                                job.log, job.collected, job.visited, budget, job.frontier)
+
+
+def _job_inspect(job):
+    urls = job.params.get("urls", [])
+    job.total = len(urls)
+    for u in urls:
+        if job.cancel.is_set():
+            break
+        try:
+            data, status = inspect_url(u)
+        except Exception as e:
+            data, status = {"error": str(e)}, 500
+        job.pages.append(dict(data, requested_url=u, http_status=status))
+        job.log.append(f"{'✓' if status == 200 else '✗'} {u}")
+    job.result = {"pages": job.pages, "count": len(job.pages)}
+
+
+_JOB_KINDS = {"extract": _job_extract, "inspect": _job_inspect}
+
+
+def _run_job(job):
+    if job.cancel.is_set():
+        job.status, job.finished = "cancelled", time.time()
+        return
+    job.status, job.started = "running", time.time()
+    try:
+        _JOB_KINDS[job.kind](job)
+        job.status = "cancelled" if job.cancel.is_set() else "done"
+    except Exception as e:
+        job.status = "error"
+        job.error  = str(e)
+        job.log.append(f"Job failed: {e}")
+    finally:
+        job.finished = time.time()
+
+
+def submit_job(kind, params):
+    """Queue a job on the background executor and return it."""
+    global _job_executor, _job_publisher
+    job    = _Job(kind, params)
+    shared = shared_state()
+    if shared is not None:
+        shared.publish_job(job)     # visible to every worker before the response goes out
+    with _jobs_lock:
+        if _job_executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _job_executor = ThreadPoolExecutor(max_workers=_JOB_WORKERS, thread_name_prefix="crawlsync-job")
+        if shared is not None and _job_publisher is None:
+            _job_publisher = threading.Thread(target=_publish_jobs, args=(shared,),
+                                              name="crawlsync-job-publisher", daemon=True)
+            _job_publisher.start()
+        _jobs[job.id] = job
+        finished = [j.id for j in _jobs.values() if j.finished]
+        for jid in finished[:max(0, len(finished) - _JOB_KEEP)]:
+            del _jobs[jid]
+    _job_executor.submit(_run_job, job)
+    return job
+
+
+def _publish_jobs(shared):
+    """Mirror this worker's jobs into shared_state() and pick up cancellations."""
+    snapped = {}
+    while True:
+        time.sleep(1.0)
+        with _jobs_lock:
+            jobs = [j for j in _jobs.values() if not j.published]
+        for job in jobs:
+            finished = job.finished is not None
+            now      = time.monotonic()
+            snapshot = now - snapped.get(job.id, 0.0) >= _SHARED_SNAPSHOT_EVERY
+            try:
+                if shared.publish_job(job, snapshot):
+                    job.cancel.set()
+                if finished:
+                    job.published = True
+                    snapped.pop(job.id, None)
+                    shared.trim_jobs(_JOB_KEEP)
+                elif snapshot:
+                    snapped[job.id] = now
+            except Exception as e:
+                print(f"[jobs] publishing {job.id} failed — {e}", file=sys.stderr)
+
+
+def _get_job(job_id):
+    """A local _Job, else another worker's job as a _SharedJob, else None."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+    if job is None and shared_state() is not None:
+        job = shared_state().job(job_id)
+    return job
+
+
+@app.route("/jobs", methods=["POST"])
+def jobs_submit():
+    data = request.get_json(force=True, silent=True) or {}
+    kind = data.get("kind", "extract")
+    if kind == "extract":
+        raw        = (data.get("url") or "").strip()
+        override   = (data.get("override") or "").strip()
+        checkpoint = data.get("checkpoint")
+        if checkpoint is not None and not isinstance(checkpoint, dict):
+            return jsonify({"error": "checkpoint must be an object"}), 400
+        if not raw and not override and not checkpoint:
+            return jsonify({"error": "No URL provided"}), 400
+        params = {"url": raw, "override": override, "budget": data.get("budget") or {}}
+        if checkpoint:
+            params["checkpoint"] = checkpoint
+    elif kind == "inspect":
+        urls = [u.strip() for u in (data.get("urls") or []) if isinstance(u, str) and u.strip()]
+        if not urls:
+            return jsonify({"error": "No URLs provided"}), 400
+        params = {"urls": urls}
+    else:
+        return jsonify({"error": f"Unknown job kind: {kind}"}), 400
+    job = submit_job(kind, params)
+    return jsonify(job.summary()), 202
+
+
+@app.route("/jobs")
+def jobs_list():
+    with _jobs_lock:
+        jobs = list(_jobs.values())
+    if shared_state() is not None:
+        local = {j.id for j in jobs}
+        jobs += [j for j in shared_state().jobs() if j.id not in local]
+        jobs.sort(key=lambda j: j.summary()["created"])
+    return jsonify({"jobs": [j.summary() for j in reversed(jobs)]})
+
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    job = _get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    try:
+        log_from = max(0, int(request.args.get("log_from", 0)))
+    except ValueError:
+        log_from = 0
+    out = job.summary()
+    out["log"]      = job.log_since(log_from)
+    out["log_next"] = log_from + len(out["log"])
+    return jsonify(out)
+
+
+@app.route("/jobs/<job_id>/partial")
+def job_partial(job_id):
+    """Results gathered so far — usable while the job is still running."""
+    job = _get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    try:
+        offset = max(0, int(request.args.get("offset", 0)))
+        limit  = max(1, min(int(request.args.get("limit", 1000)), 50000))
+    except ValueError:
+        return jsonify({"error": "offset/limit must be integers"}), 400
+    items = job.partial_items()
+    return jsonify({
+        "job_id": job.id,
+        "status": job.status,
+        "total":  len(items),
+        "offset": offset,
+        "items":  items[offset:offset + limit],
+    })
+
+
+@app.route("/jobs/<job_id>/checkpoint")
+def job_checkpoint(job_id):
+    """Frontier snapshot of an extract job — POST it back to /jobs to resume."""
+    job = _get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    checkpoint = job.checkpoint()
+    if checkpoint is None:
+        return jsonify({"error": "Job has no crawl frontier"}), 409
+    return jsonify(dict(checkpoint, job_id=job.id, status=job.status))
+
+
+@app.route("/jobs/<job_id>/cancel", methods=["POST"])
+def job_cancel(job_id):
+    job = _get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    job.request_cancel()
+    return jsonify({"job_id": job.id, "status": job.status, "cancelling": not job.finished})
+
+
+@app.route("/jobs/<job_id>/result")
+def job_result(job_id):
+    job = _get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    if job.status == "error":
+        return jsonify({"error": job.error, "status": job.status}), 500
+    result = job.result
+    if result is None:
+        msg = "Job cancelled before it started" if job.finished_ok else "Job not finished"
+        return jsonify({"error": msg, "status": job.status}), 409
+    return jsonify(dict(result, job_id=job.id, status=job.status))
+
+
+# ── Crawl cache — one extraction per domain, shared by every caller ──────────
+# Front-ends that run in-process (the Streamlit apps) look domains up here
+# instead of crawling on every rerun.  Each entry is the background _Job for
+# that domain: a second caller asking while the crawl is still running
+# attaches to the same job and can follow its log, and once finished the
+# result is served until it is older than the TTL.  Failed and empty crawls
+# are never reused.  The least recently used entries go first once there are
+# more than max_entries.
+
+CRAWL_CACHE_TTL = float(os.environ.get("CRAWLSYNC_CACHE_TTL", 6 * 3600))
+CRAWL_CACHE_MAX = 64
+
+
+def crawl_key(raw, override="", budget=None):
+    """Cache key for a domain (host-level, www-insensitive) or an explicit sitemap URL."""
+    url = raw.strip() if raw.strip().startswith("http") else "https://" + raw.strip()
+    if not override and looks_like_sitemap(url) and "/" in url.split("://", 1)[1]:
+        override = url      # a direct sitemap URL is crawled on its own, not as the domain
+    if override:
+        key = "sitemap:" + override.strip()
+    else:
+        key = urlparse(base_url(raw)).netloc.lower()
+        key = key[4:] if key.startswith("www.") else key
+    return f"{key}|{sorted(budget.items())}" if budget else key
+
+
+class CrawlCache:
+    def __init__(self, ttl=CRAWL_CACHE_TTL, max_entries=CRAWL_CACHE_MAX):
+        self.ttl         = ttl
+        self.max_entries = max_entries
+        self._entries    = OrderedDict()    # key → _Job, least recently used first
+        self._lock       = threading.Lock()
+
+    def _usable(self, job, now):
+        if not job.finished:
+            return not job.cancel.is_set()
+        return (job.status == "done" and bool(job.result and job.result["count"])
+                and now - job.finished < self.ttl)
+
+    def lookup(self, raw, override="", budget=None, refresh=False):
+        """(job, hit) for a domain — the cached or in-flight job, else a newly submitted one.
+
+        `budget` is a CrawlBudget.from_request() spec; crawls with different
+        budgets are cached separately.
+        """
+        key = crawl_key(raw, override, budget)
+        now = time.time()
+        with self._lock:
+            job = self._entries.get(key)
+            if job is not None and not refresh and self._usable(job, now):
+                self._entries.move_to_end(key)
+                return job, True
+            job = submit_job("extract", {"url": raw, "override": override, "budget": budget})
+            self._entries[key] = job
+            self._evict(now)
+        return job, False
+
+    def _evict(self, now):
+        for key in [k for k, j in self._entries.items() if j.finished and not self._usable(j, now)]:
+            del self._entries[key]
+        finished = [k for k, j in self._entries.items() if j.finished]
+        for key in finished[:max(0, len(self._entries) - self.max_entries)]:
+            del self._entries[key]
+
+    def forget(self, raw, override="", budget=None):
+        with self._lock:
+            self._entries.pop(crawl_key(raw, override, budget), None)
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            return [{"key": k, "status": j.status, "count": len(j.collected),
+                     "age": round(now - (j.finished or j.created))}
+                    for k, j in self._entries.items()]
+
+
+def follow_job(job, start=0, interval=0.25):
+    """Yield each batch of new log lines from a running job until it finishes."""
+    while True:
+        finished = job.finished is not None
+        lines = job.log_since(start)
+        start += len(lines)
+        if lines or finished:
+            yield lines
+        if finished:
+            return
+        time.sleep(interval)
+
+
+# ── URL inventory — per-URL feature columns, computed once at ingest ─────────
+# The Streamlit front-ends filter crawl results on every rerun.  Instead of
+# regex-scanning the URL strings each time, url_inventory() sorts the URLs
+# once and derives a feature frame from them; repeated columns are
+# categoricals, so file-type and section filters are lookups on small integer
+# codes and text filters run over a pre-lowercased column.
+
+IMAGE_EXTS = ("jpg", "jpeg", "png", "webp", "gif", "svg", "avif")
+DOC_EXTS   = ("pdf",)
+
+_EXT_RE     = re.compile(r"\.([A-Za-z0-9]{1,8})$")
+_ID_SLUG_RE = re.compile(r"^\d+$|[-_]\d{4,}$|^[0-9a-fA-F]{24,}$")
+
+
+def url_inventory(urls):
+    """Sorted, de-duplicated DataFrame of URLs with their feature columns.
+
+    url, url_lower, host, depth, ext, section (first path segment),
+    has_query and id_slug (last segment is or ends in a numeric/hex ID).
+    """
+    pd = backend("pandas")
+    if pd is None:
+        raise RuntimeError("pandas is not installed")
+    urls = sorted(set(urls))
+    lower, host, depth, ext, section, query, id_slug = [], [], [], [], [], [], []
+    for u in urls:
+        # one pass of str.partition per URL — several times faster than Series.str.extract
+        rest = u.partition("://")[2] or u
+        rest, q, _ = rest.partition("#")[0].partition("?")
+        h, _, path = rest.partition("/")
+        segs = path.strip("/").split("/") if path.strip("/") else []
+        last = segs[-1] if segs else ""
+        m = _EXT_RE.search(last)
+        lower.append(u.lower())
+        host.append(h.lower())
+        depth.append(len(segs))
+        ext.append(m.group(1).lower() if m else "")
+        section.append(segs[0] if segs else "")
+        query.append(bool(q))
+        id_slug.append(bool(_ID_SLUG_RE.search(last)))
+    return pd.DataFrame({
+        "url":       pd.Series(urls, dtype=object),
+        "url_lower": pd.Series(lower, dtype=object),
+        "host":      pd.Categorical(host),
+        "depth":     pd.array(depth, dtype="uint16"),
+        "ext":       pd.Categorical(ext),
+        "section":   pd.Categorical(section),
+        "has_query": query,
+        "id_slug":   id_slug,
+    })
+
+
+def filter_inventory(inv, contains="", exclude="", exts=None, section=None, max_depth=None):
+    """Rows of a url_inventory() frame passing every given filter, still in URL order.
+
+    The column lookups run first so the substring scans only see what's left.
+    """
+    rows = inv
+    if exts:
+        rows = rows[rows["ext"].isin(exts)]
+    if section:
+        rows = rows[rows["section"] == section]
+    if max_depth is not None:
+        rows = rows[rows["depth"] <= max_depth]
+    if contains:
+        rows = rows[rows["url_lower"].str.contains(contains.lower(), regex=False)]
+    if exclude:
+        rows = rows[~rows["url_lower"].str.contains(exclude.lower(), regex=False)]
+    return rows
+
+
+_TEXT_FILE_HEADERS = [
+    HEADERS,
+    HEADERS_GOOGLEBOT,
+    HEADERS_CRAWLER,
+    # Last resort: bare minimum headers
+    {"User-Agent": "curl/8.4.0", "Accept": "*/*"},
+]
+
+
 def _fetch_text_file(url, timeout=20):
     """
     Fetch a plain-text file (e.g. llms.txt).
     Tries multiple user-agent profiles so WAFs / CDNs don't block it.
     Returns the decoded text or None.
     """
-    header_sets = [
-        HEADERS,
-        HEADERS_GOOGLEBOT,
-        HEADERS_CRAWLER,
-        # Last resort: bare minimum headers
-        {"User-Agent": "curl/8.4.0", "Accept": "*/*"},
-    ]
-    for hdrs in header_sets:
+    for hdrs in _TEXT_FILE_HEADERS:
         try:
-            r = requests.get(url, headers=hdrs, timeout=timeout, allow_redirects=True)
+            r = http_session().get(url, headers=hdrs, timeout=timeout, allow_redirects=True)
             if r.status_code == 404:
                 return None  # definitely not there — no point retrying
             if not r.ok:
@@ -670,69 +3397,574 @@ def ai_check():
     })
 
 
-@app.route("/inspect-page")
-def inspect_page():
+# ── Structured data — JSON-LD, microdata and RDFa in one pass ────────────────
+# extract_structured_data() walks the page once, collecting ld+json script
+# bodies and the top-level microdata (itemscope) and RDFa (typeof) items with
+# their properties.  Every item is then checked by validate_schema_node()
+# against SCHEMA_RULES.  The rules are compiled once into _SCHEMA_INDEX, which
+# also maps subtypes that have no rules of their own to their nearest ruled
+# ancestor (Restaurant → LocalBusiness, TechArticle → Article, …).  The
+# per-line annotations for the UI's JSON view are recorded while the node is
+# serialised, so nothing has to re-scan the text afterwards.
+
+SCHEMA_RULES = {
+    "Article":             {"req": ["headline","author","datePublished"],       "rec": ["image","publisher","dateModified","description"]},
+    "NewsArticle":         {"req": ["headline","author","datePublished"],       "rec": ["image","publisher"]},
+    "BlogPosting":         {"req": ["headline","author","datePublished"],       "rec": ["image","publisher","dateModified"]},
+    "Product":             {"req": ["name"],                                    "rec": ["description","image","offers","aggregateRating","brand"]},
+    "FAQPage":             {"req": ["mainEntity"],                              "rec": []},
+    "HowTo":               {"req": ["name","step"],                             "rec": ["description","image","totalTime"]},
+    "Organization":        {"req": ["name"],                                    "rec": ["url","logo","sameAs","contactPoint"]},
+    "LocalBusiness":       {"req": ["name","address"],                         "rec": ["telephone","openingHours","geo","url"]},
+    "BreadcrumbList":      {"req": ["itemListElement"],                        "rec": []},
+    "Event":               {"req": ["name","startDate"],                       "rec": ["endDate","location","description","organizer"]},
+    "WebSite":             {"req": ["name"],                                    "rec": ["url","potentialAction"]},
+    "WebPage":             {"req": ["name"],                                    "rec": ["url","description","breadcrumb"]},
+    "Person":              {"req": ["name"],                                    "rec": ["jobTitle","url","sameAs"]},
+    "SoftwareApplication": {"req": ["name","applicationCategory","operatingSystem"], "rec": ["offers","aggregateRating"]},
+    "Recipe":              {"req": ["name","recipeIngredient","recipeInstructions"], "rec": ["image","author","totalTime","aggregateRating"]},
+    "VideoObject":         {"req": ["name","description","thumbnailUrl","uploadDate"], "rec": ["duration","contentUrl","embedUrl"]},
+    "JobPosting":          {"req": ["title","description","datePosted","hiringOrganization","jobLocation"], "rec": ["baseSalary","employmentType","validThrough"]},
+    "Review":              {"req": ["reviewRating","author"],                  "rec": ["itemReviewed","reviewBody"]},
+    "AggregateRating":     {"req": ["ratingValue","reviewCount"],              "rec": ["bestRating","worstRating"]},
+    # E-commerce / store types
+    "Store":               {"req": ["name","address"],                         "rec": ["url","telephone","openingHours","logo","sameAs"]},
+    "OnlineStore":         {"req": ["name"],                                   "rec": ["url","logo","sameAs","address","telephone","description","acceptedPaymentMethod"]},
+    "ItemList":            {"req": ["itemListElement"],                        "rec": ["name","description","numberOfItems"]},
+    "ListItem":            {"req": ["position","item"],                        "rec": []},
+    # Page types
+    "CollectionPage":      {"req": ["name"],                                   "rec": ["url","description","mainEntity","breadcrumb"]},
+    "AboutPage":           {"req": ["name"],                                   "rec": ["url","description","author"]},
+    "ContactPage":         {"req": ["name"],                                   "rec": ["url","description"]},
+    "SearchResultsPage":   {"req": ["name"],                                   "rec": ["url"]},
+    "ImageObject":         {"req": ["contentUrl"],                             "rec": ["name","description","thumbnail","width","height"]},
+    "Offer":               {"req": ["price","priceCurrency"],                  "rec": ["availability","priceValidUntil","url"]},
+}
+
+# schema.org parent of each type we may meet — only the branches that lead to
+# a type in SCHEMA_RULES matter
+_SCHEMA_PARENTS = {
+    # creative works
+    "NewsArticle": "Article", "BlogPosting": "SocialMediaPosting", "SocialMediaPosting": "Article",
+    "TechArticle": "Article", "ScholarlyArticle": "Article", "Report": "Article",
+    "AnalysisNewsArticle": "NewsArticle", "ReportageNewsArticle": "NewsArticle",
+    "OpinionNewsArticle": "NewsArticle", "LiveBlogPosting": "BlogPosting",
+    "Recipe": "HowTo", "ClaimReview": "Review", "CriticReview": "Review", "UserReview": "Review",
+    "EmployerReview": "Review", "Guide": "Article",
+    # pages
+    "CollectionPage": "WebPage", "AboutPage": "WebPage", "ContactPage": "WebPage",
+    "SearchResultsPage": "WebPage", "FAQPage": "WebPage", "ItemPage": "WebPage",
+    "ProfilePage": "WebPage", "CheckoutPage": "WebPage", "QAPage": "WebPage",
+    "MedicalWebPage": "WebPage", "RealEstateListing": "WebPage", "MediaGallery": "CollectionPage",
+    "ImageGallery": "MediaGallery", "VideoGallery": "MediaGallery",
+    # organisations and places
+    "LocalBusiness": "Organization", "Store": "LocalBusiness", "OnlineBusiness": "Organization",
+    "OnlineStore": "OnlineBusiness", "Corporation": "Organization", "NGO": "Organization",
+    "EducationalOrganization": "Organization", "NewsMediaOrganization": "Organization",
+    "SportsOrganization": "Organization", "MedicalOrganization": "Organization",
+    "FoodEstablishment": "LocalBusiness", "Restaurant": "FoodEstablishment",
+    "CafeOrCoffeeShop": "FoodEstablishment", "Bakery": "FoodEstablishment", "BarOrPub": "FoodEstablishment",
+    "FastFoodRestaurant": "FoodEstablishment", "LodgingBusiness": "LocalBusiness",
+    "Hotel": "LodgingBusiness", "HealthAndBeautyBusiness": "LocalBusiness",
+    "ProfessionalService": "LocalBusiness", "LegalService": "LocalBusiness",
+    "FinancialService": "LocalBusiness", "AutomotiveBusiness": "LocalBusiness",
+    "HomeAndConstructionBusiness": "LocalBusiness", "SportsActivityLocation": "LocalBusiness",
+    "Dentist": "LocalBusiness", "MedicalBusiness": "LocalBusiness", "RealEstateAgent": "LocalBusiness",
+    "TravelAgency": "LocalBusiness", "AutoDealer": "AutomotiveBusiness",
+    "BikeStore": "Store", "BookStore": "Store", "ClothingStore": "Store", "ComputerStore": "Store",
+    "ConvenienceStore": "Store", "DepartmentStore": "Store", "ElectronicsStore": "Store",
+    "Florist": "Store", "FurnitureStore": "Store", "GardenStore": "Store", "GroceryStore": "Store",
+    "HardwareStore": "Store", "HobbyShop": "Store", "HomeGoodsStore": "Store", "JewelryStore": "Store",
+    "LiquorStore": "Store", "MensClothingStore": "Store", "MobilePhoneStore": "Store",
+    "MusicStore": "Store", "OfficeEquipmentStore": "Store", "OutletStore": "Store",
+    "PetStore": "Store", "ShoeStore": "Store", "SportingGoodsStore": "Store", "TireShop": "Store",
+    "ToyStore": "Store", "WholesaleStore": "Store",
+    # products, offers, events, media
+    "ProductModel": "Product", "IndividualProduct": "Product", "ProductGroup": "Product",
+    "Vehicle": "Product", "Car": "Vehicle", "AggregateOffer": "Offer", "EmployerAggregateRating": "AggregateRating",
+    "BusinessEvent": "Event", "MusicEvent": "Event", "SportsEvent": "Event", "Festival": "Event",
+    "EducationEvent": "Event", "SocialEvent": "Event", "TheaterEvent": "Event", "ComedyEvent": "Event",
+    "ExhibitionEvent": "Event", "FoodEvent": "Event", "SaleEvent": "Event",
+    "MobileApplication": "SoftwareApplication", "WebApplication": "SoftwareApplication",
+    "VideoGame": "SoftwareApplication", "Barcode": "ImageObject", "Patient": "Person",
+    "HowToSection": "ItemList", "OfferCatalog": "ItemList", "BreadcrumbList": "ItemList",
+}
+
+
+def _compile_schema_rules():
+    """Type → (type the rules come from, required fields, recommended fields)."""
+    index = {t: (t, tuple(r["req"]), tuple(r["rec"])) for t, r in SCHEMA_RULES.items()}
+    for typ in _SCHEMA_PARENTS:
+        if typ in index:
+            continue
+        seen, parent = {typ}, _SCHEMA_PARENTS.get(typ)
+        while parent is not None and parent not in index and parent not in seen:
+            seen.add(parent)
+            parent = _SCHEMA_PARENTS.get(parent)
+        if parent in index:
+            index[typ] = index[parent]
+    return index
+
+
+_SCHEMA_INDEX = _compile_schema_rules()
+
+
+def _schema_type_name(value):
+    """Bare type name from an itemtype / typeof value: "https://schema.org/Product" → "Product"."""
+    return value.rsplit("/", 1)[-1].rsplit("#", 1)[-1].rsplit(":", 1)[-1] if value else "Unknown"
+
+
+_RDFA_INITIAL_PREFIXES = {"schema": "http://schema.org/"}   # from the RDFa 1.1 initial context
+_RDFA_PREFIX_RE        = re.compile(r"([\w.-]+):\s+(\S+)")
+_SCHEMA_ORG_IRI_RE     = re.compile(r"^https?://schema\.org/(\w+)$")
+
+
+def _rdfa_context(attrs, vocab, prefixes):
+    """(vocab, prefixes) in scope at an element, updated from its vocab / prefix attributes."""
+    if "vocab" in attrs:
+        vocab = (attrs.get("vocab") or "").strip() or None
+    if attrs.get("prefix"):
+        prefixes = dict(prefixes, **dict(_RDFA_PREFIX_RE.findall(attrs["prefix"])))
+    return vocab, prefixes
+
+
+def _rdfa_schema_name(terms, vocab, prefixes):
+    """Bare schema.org name of the first typeof / property term that expands to a
+    schema.org IRI under the in-scope vocab and prefixes, or None."""
+    for term in terms:
+        if "://" in term:
+            iri = term
+        elif ":" in term:
+            pfx, _, local = term.partition(":")
+            iri = prefixes[pfx] + local if pfx in prefixes else None
+        else:
+            iri = vocab.rstrip("/#") + "/" + term if vocab else None
+        m = _SCHEMA_ORG_IRI_RE.match(iri or "")
+        if m:
+            return m.group(1)
+    return None
+
+
+def _annotated_dumps(node):
+    """json.dumps(node, indent=2) plus {top-level key: line index}, built together."""
     import json as _json
-    import re as _re
+    if not isinstance(node, dict) or not node:
+        return _json.dumps(node, indent=2), {}
+    parts, key_line, row = [], {}, 1
+    last = len(node) - 1
+    for i, (key, value) in enumerate(node.items()):
+        key_line.setdefault(str(key), row)
+        chunk = _json.dumps(value, indent=2).replace("\n", "\n  ")
+        parts.append(f"  {_json.dumps(str(key))}: {chunk}{',' if i < last else ''}")
+        row += chunk.count("\n") + 1
+    return "{\n" + "\n".join(parts) + "\n}", key_line
+
+
+def _schema_result(type_str, raw, issues, warnings, known, annotations):
+    return {
+        "type":             type_str,
+        "raw":              raw,
+        "issues":           issues,
+        "warnings":         warnings,
+        # Unknown types have no validation rules — mark valid=None so the
+        # frontend can distinguish "not validated" from "validated & passing"
+        "valid":            None if not known else len(issues) == 0,
+        "score":            None if not known else max(0, 100 - len(issues)*20 - len(warnings)*5),
+        "known":            known,
+        "line_annotations": annotations,
+    }
+
+
+def validate_schema_node(node):
+    """Check one schema.org node against its type's rules; returns the UI's result dict."""
+    if not isinstance(node, dict):
+        return {"type": "Unknown", "raw": str(node)[:500], "issues": ["Not a valid JSON-LD object"], "warnings": [], "valid": False, "score": 0, "known": False, "line_annotations": []}
+    issues, warnings = [], []
+
+    ctx_issue = False
+    if not node.get("@context"):
+        issues.append("Missing @context (should be 'https://schema.org')")
+        ctx_issue = True
+    elif "schema.org" not in str(node["@context"]):
+        warnings.append(f"@context '{node['@context']}' may not be schema.org")
+        ctx_issue = "warn"
+
+    typ = node.get("@type", "")
+    type_issue = not typ
+    if type_issue:
+        issues.append("Missing @type")
+
+    types    = [str(t) for t in typ] if isinstance(typ, list) else [str(typ)] if typ else []
+    type_str = types[0] if types else "Unknown"
+    # the first listed type we have rules for (directly or through a parent type)
+    entry    = next((_SCHEMA_INDEX[t] for t in types if t in _SCHEMA_INDEX), None)
+    req, rec = (entry[1], entry[2]) if entry else ((), ())
+    for f in req:
+        if f not in node:
+            issues.append(f"Missing required property: '{f}'")
+    for f in rec:
+        if f not in node:
+            warnings.append(f"Recommended property missing: '{f}'")
+
+    if entry and entry[0] == "FAQPage":
+        for i, q in enumerate(node.get("mainEntity", []) or []):
+            if isinstance(q, dict):
+                if not q.get("name"):
+                    issues.append(f"FAQ item {i+1}: missing 'name' (the question)")
+                aa = q.get("acceptedAnswer") or {}
+                if not aa.get("text"):
+                    issues.append(f"FAQ item {i+1}: 'acceptedAnswer.text' missing")
+
+    # ── Line annotations, from the key positions recorded while serialising ──
+    raw, key_line = _annotated_dumps(node)
+    annotations = [None] * (raw.count("\n") + 1)
+    if "@context" in key_line:
+        annotations[key_line["@context"]] = "error" if ctx_issue is True else ("warn" if ctx_issue == "warn" else "ok")
+    if "@type" in key_line:
+        annotations[key_line["@type"]] = "error" if type_issue else "ok"
+    # required fields present → green; missing already in issues list (no line)
+    for f in req:
+        if f in key_line:
+            annotations[key_line[f]] = "ok"
+    # recommended fields present → blue note
+    for f in rec:
+        if f in key_line and annotations[key_line[f]] is None:
+            annotations[key_line[f]] = "rec"
+
+    return _schema_result(type_str, raw[:4000], issues, warnings, entry is not None, annotations)
+
+
+def _ld_json_results(raw_text):
+    """Validated nodes of one application/ld+json block (a @graph or list yields several)."""
+    import json as _json
+    try:
+        data = _json.loads(raw_text)
+    except _json.JSONDecodeError as e:
+        ann = [None] * (raw_text.count("\n") + 1)
+        if 1 <= e.lineno <= len(ann):
+            ann[e.lineno - 1] = "error"
+        return [{"type": "Parse Error", "raw": raw_text[:2000], "issues": [f"Invalid JSON at line {e.lineno}, col {e.colno}: {e.msg}"], "warnings": [], "valid": False, "score": 0, "known": False, "line_annotations": ann}]
+    nodes = data.get("@graph", None) if isinstance(data, dict) else None
+    if nodes is not None:
+        ctx = data.get("@context", "")
+        for item in nodes:
+            if isinstance(item, dict):
+                item.setdefault("@context", ctx)
+        return [validate_schema_node(item) for item in nodes]
+    if isinstance(data, list):
+        return [validate_schema_node(item) for item in data]
+    return [validate_schema_node(data)]
+
+
+def _item_prop_value(el, rdfa=False):
+    val = (el.get("content") or (el.get("resource") if rdfa else None) or el.get("href") or
+           el.get("src") or el.get_text(strip=True))
+    return str(val)[:200] if val else ""
+
+
+def extract_structured_data(root):
+    """Validated JSON-LD, microdata and RDFa items under a BeautifulSoup node, in one walk.
+
+    Microdata and RDFa are reported per top-level item (itemscope / typeof
+    with no enclosing item), with every itemprop / property beneath it —
+    first value wins — and only the first item of each type.  RDFa terms are
+    expanded through the vocab / prefix in scope; a typeof outside schema.org
+    (foaf:Person, …) is skipped along with its properties.
+    """
+    ld_blocks  = []
+    items      = {"microdata": [], "rdfa": []}
+    seen_types = {"microdata": set(), "rdfa": set()}
+
+    def open_item(fmt, type_str):
+        if type_str in seen_types[fmt]:
+            return {}, False                 # duplicate type: swallow its props, don't report
+        seen_types[fmt].add(type_str)
+        props = {"@context": "https://schema.org", "@type": type_str}
+        items[fmt].append(props)
+        return props, True
+
+    # explicit stack of (element, open microdata item, open RDFa item, RDFa vocab, prefixes)
+    stack = [(root, None, None, None, _RDFA_INITIAL_PREFIXES)]
+    while stack:
+        el, md, rd, vocab, prefixes = stack.pop()
+        attrs = el.attrs
+        if el.name == "script":
+            if (attrs.get("type") or "").strip().lower() == "application/ld+json":
+                ld_blocks.append(el.string or el.get_text())
+            continue
 
+        if md is not None and md[1] and "itemprop" in attrs:
+            key = (attrs.get("itemprop") or "").strip()
+            if key and key not in md[0]:
+                md[0][key] = _item_prop_value(el)
+        elif md is None and "itemscope" in attrs:
+            md = open_item("microdata", _schema_type_name((attrs.get("itemtype") or "").strip()))
+
+        if "vocab" in attrs or "prefix" in attrs:
+            vocab, prefixes = _rdfa_context(attrs, vocab, prefixes)
+        if rd is not None and rd[1] and "property" in attrs:
+            key = _rdfa_schema_name((attrs.get("property") or "").split(), vocab, prefixes)
+            if key and key not in rd[0]:
+                rd[0][key] = _item_prop_value(el, rdfa=True)
+        elif rd is None and "typeof" in attrs:
+            type_str = _rdfa_schema_name((attrs.get("typeof") or "").split(), vocab, prefixes)
+            rd = open_item("rdfa", type_str) if type_str else ({}, False)
+
+        children = [c for c in el.contents if c.name is not None]
+        stack.extend((c, md, rd, vocab, prefixes) for c in reversed(children))
+
+    results = []
+    for raw_text in ld_blocks:
+        results.extend(_ld_json_results(raw_text))
+    for fmt in ("microdata", "rdfa"):
+        for props in items[fmt]:
+            result = validate_schema_node(props)
+            result["format"] = fmt          # flag so UI can note it's not JSON-LD
+            results.append(result)
+    return results
+
+
+# ── Embedded data — JSON payloads and dataLayer pushes in inline scripts ─────
+# Next.js, Nuxt and Shopify themes ship page content as JSON inside <script>
+# tags, and analytics snippets push page metadata into dataLayer.
+# scan_embedded_data() looks at every script once and classifies it from its
+# type, id and first characters.  Only the candidates are parsed: whole JSON
+# scripts, window.__NUXT__ assignments and dataLayer.push() arguments.  The
+# parse uses raw_decode, so it stops at the end of the value and never minds
+# what follows it.  Scripts larger than EMBEDDED_JSON_MAX are skipped, and
+# analytics bundles and other inline JS are never handed to the parser.
+
+EMBEDDED_JSON_MAX  = 8 * 1024 * 1024
+_EMBEDDED_JSON_MIN = 100        # shorter JSON scripts are config flags, not content
+
+_NUXT_ASSIGN_RE    = re.compile(r"window\.__NUXT__\s*=\s*")
+_DATALAYER_PUSH_RE = re.compile(r"dataLayer\.push\s*\(\s*")
+
+
+class EmbeddedData:
+    def __init__(self):
+        self.payloads  = []     # (kind, parsed JSON) — kind is "next", "json" or "nuxt"
+        self.datalayer = []     # dicts passed to dataLayer.push(), in page order
+        self.oversize  = 0      # candidate scripts skipped for size
+
+
+def _script_kind(attrs, text):
+    """"next", "json", "nuxt", "datalayer" or None for a script we don't parse."""
+    if attrs.get("id") == "__NEXT_DATA__":
+        return "next"
+    typ = (attrs.get("type") or "").strip().lower()
+    if typ == "application/json" or typ.endswith("+json"):
+        return "json"
+    if typ and "javascript" not in typ and typ != "module":
+        return None             # templates and other non-script payloads
+    if text[:1] in ("{", "["):
+        return "json"
+    if "__NUXT__" in text:
+        return "nuxt"
+    if "dataLayer" in text:
+        return "datalayer"
+    return None
+
+
+def _json_at(text, pos):
+    """The JSON value starting at text[pos], or None."""
+    import json as _json
+    try:
+        return _json.JSONDecoder().raw_decode(text, pos)[0]
+    except ValueError:
+        return None
+
+
+def scan_embedded_data(root):
+    """EmbeddedData for every inline script under a BeautifulSoup node."""
+    out = EmbeddedData()
+    for script in root.find_all("script", src=False):
+        text = (script.string or "").strip()
+        if not text:
+            continue
+        kind = _script_kind(script.attrs, text)
+        if kind is None:
+            continue
+        if len(text) > EMBEDDED_JSON_MAX:
+            out.oversize += 1
+            continue
+        if kind == "datalayer":
+            for m in _DATALAYER_PUSH_RE.finditer(text):
+                push = _json_at(text, m.end())
+                if isinstance(push, dict):
+                    out.datalayer.append(push)
+        elif kind == "nuxt":
+            m = _NUXT_ASSIGN_RE.search(text)
+            value = _json_at(text, m.end()) if m else None     # a (function(){…}) payload won't parse
+            if value is not None:
+                out.payloads.append((kind, value))
+        elif len(text) >= _EMBEDDED_JSON_MIN:
+            value = _json_at(text, 0)
+            if value is not None:
+                out.payloads.append((kind, value))
+    return out
+
+
+# ── Raw-HTML prescan — cheap facts about a page before any DOM is built ──────
+# A BeautifulSoup tree costs far more than a few substring and regex scans of
+# the raw text.  prescan_html() runs those scans first: challenge-page
+# markers, a capped word count and framework fingerprints.  The inspect
+# pipeline uses them to decide whether a page needs the headless browser and
+# to name the JS framework of an empty shell without serialising the DOM
+# again.
+
+_CHALLENGE_MARKERS = ("just a moment", "enable javascript and cookies",
+                      "checking your browser", "_cf_chl", "challenge-platform")
+
+_PRESCAN_SCRIPT_RE = re.compile(r"<script\b([^>]*)>(.*?)</script\s*>", re.S)
+_PRESCAN_SRC_RE    = re.compile(r"\bsrc\s*=\s*[\"']?([^\"'\s>]+)")
+_PRESCAN_ROOT_RE   = re.compile(r"\bid\s*=\s*[\"']?(app|root)[\"'\s/>]")
+_ROCKET_TYPE_RE    = re.compile(r"\btype\s*=\s*[\"']?[a-f0-9]{20,}-text/javascript")
+_PRESCAN_WORD_RE   = re.compile(r"\S+")
+
+
+class HtmlPrescan:
+    def __init__(self, html):
+        self.html = html
+        self.size = len(html)
+        low = html.lower()
+        self.challenge = self.size < 20_000 and any(m in low[:3000] for m in _CHALLENGE_MARKERS)
+
+        srcs, rocket = [], False
+        for m in _PRESCAN_SCRIPT_RE.finditer(low):
+            attrs = m.group(1)
+            src = _PRESCAN_SRC_RE.search(attrs)
+            if src:
+                srcs.append(src.group(1))
+            # Cloudflare Rocket Loader replaces script type with a hash prefix
+            # e.g. type="81d772bab91062caecfad702-text/javascript"
+            rocket = rocket or bool(_ROCKET_TYPE_RE.search(attrs))
+        srcs = " ".join(srcs)
+
+        root = _PRESCAN_ROOT_RE.search(low)
+        self.app_root = root.group(1) if root else None         # "app" / "root" mount point
+        frameworks = []
+        if rocket:
+            frameworks.append("rocket")
+        if "__next_data__" in low or "/_next/" in srcs:
+            frameworks.append("nextjs")
+        if "__nuxt" in low or "/_nuxt/" in srcs:
+            frameworks.append("nuxt")
+        if "ng-version" in low or "/angular" in srcs:
+            frameworks.append("angular")
+        if "react" in low[:8000] or "reactdom" in srcs:
+            frameworks.append("react")
+        self.frameworks = frameworks
+
+    def words_fewer_than(self, n):
+        """True if the raw HTML has fewer than n whitespace-separated tokens — stops counting at n."""
+        for i, _ in enumerate(_PRESCAN_WORD_RE.finditer(self.html), 1):
+            if i >= n:
+                return False
+        return True
+
+    def shell_type(self):
+        """render_type for a page that yielded no content, from its framework fingerprints."""
+        fw = self.frameworks
+        if "rocket" in fw:
+            return "full_js_rocket"
+        for name in ("nextjs", "nuxt", "angular"):
+            if name in fw:
+                return "full_js_" + name
+        if self.app_root == "app" and "react" in fw:
+            return "full_js_react"
+        if self.app_root:
+            return "full_js_spa"
+        return "full_js"
+
+
+def prescan_html(html):
+    return HtmlPrescan(html or "")
+
+
+@app.route("/inspect-page")
+def inspect_page():
     url = request.args.get("url", "").strip()
     if not url:
         return jsonify({"error": "No URL provided"}), 400
+    result, status = inspect_url(url)
+    return jsonify(result), status
+
+
+def inspect_url(url):
+    """Fetch and analyse one page — returns (payload, http_status) for /inspect-page."""
     if not url.startswith("http"):
         url = "https://" + url
-
     try:
-        resp = requests.get(url, headers=HEADERS, timeout=20, allow_redirects=True)
-        final_url   = resp.url
-        status_code = resp.status_code
-        html        = _decode_response(resp)
-
-        # Cloudflare challenge — try bypass methods
-        _was_cf_block = _is_cloudflare_block(resp)
-        if _was_cf_block or not html:
-            bypassed = _try_cloudflare_bypass(url, 25, None)
-            if bypassed:
-                html        = bypassed
-                status_code = 200
-                _was_cf_block = False
-            elif not html:
-                return jsonify({"error": f"Could not fetch page (HTTP {status_code})"}), 500
-        # Final check: if the HTML we ended up with still looks like a CF challenge
-        # (bypass returned challenge page), mark it as blocked.
-        if not _was_cf_block and html:
-            _cf_markers = ("just a moment", "enable javascript and cookies",
-                           "checking your browser", "_cf_chl", "challenge-platform")
-            _short_html = html[:3000].lower()
-            if any(m in _short_html for m in _cf_markers) and len(html) < 20_000:
-                _was_cf_block = True
-
-        # ── Playwright fallback ───────────────────────────────────────────
-        # If the page is CF-blocked or appears JS-rendered (body near-empty),
-        # try the headless browser before falling back to the "no content" UI.
-        _used_playwright = False
-        _needs_pw = _was_cf_block or (html and len(html.split()) < 100)
-        if _needs_pw and _PW_AVAILABLE:
-            pw_html = _render_with_playwright(url)
-            if pw_html and len(pw_html.split()) > 100:
-                html          = pw_html
-                final_url     = url
-                status_code   = 200
-                _was_cf_block = False
-                _used_playwright = True
-
+        resp = http_session().get(url, headers=HEADERS, timeout=20, allow_redirects=True)
+        page = _inspect_resolve(url, resp.url, resp.status_code, _decode_response(resp),
+                                _is_cloudflare_block(resp))
+        if "error" not in page and not page["used_playwright"]:
+            page["truncated"] = resp.truncated
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return {"error": str(e)}, 500
+    if "error" in page:
+        return page, 500
+    return inspect_html(url, **page)
+
+
+def _inspect_resolve(url, final_url, status_code, html, was_cf_block):
+    """Apply the Cloudflare-bypass and headless-render fallbacks to a fetched
+    page; returns inspect_html() keyword arguments, or {"error": …}."""
+    _was_cf_block = was_cf_block
+    # Cloudflare challenge — try bypass methods
+    if _was_cf_block or not html:
+        bypassed = _try_cloudflare_bypass(url, 25, None)
+        if bypassed:
+            html        = bypassed
+            status_code = 200
+            _was_cf_block = False
+        elif not html:
+            return {"error": f"Could not fetch page (HTTP {status_code})"}
+    scan = prescan_html(html)
+    # Final check: if the HTML we ended up with still looks like a CF challenge
+    # (bypass returned challenge page), mark it as blocked.
+    if not _was_cf_block and scan.challenge:
+        _was_cf_block = True
+
+    # ── Playwright fallback ───────────────────────────────────────────
+    # If the page is CF-blocked or appears JS-rendered (body near-empty),
+    # try the headless browser before falling back to the "no content" UI.
+    _used_playwright = False
+    _needs_pw = _was_cf_block or (html and scan.words_fewer_than(100))
+    if _needs_pw and backend_available("playwright"):
+        pw_html = _render_with_playwright(url)
+        pw_scan = prescan_html(pw_html)
+        if pw_html and not pw_scan.words_fewer_than(101):
+            html          = pw_html
+            scan          = pw_scan
+            final_url     = url
+            status_code   = 200
+            _was_cf_block = False
+            _used_playwright = True
+
+    return {"final_url": final_url, "status_code": status_code, "html": html,
+            "was_cf_block": _was_cf_block, "used_playwright": _used_playwright, "prescan": scan}
+
+
+def inspect_html(url, final_url, status_code, html, was_cf_block=False, used_playwright=False,
+                 truncated=None, prescan=None):
+    """Analyse a fetched page — the CPU-bound half of inspect_url; returns (payload, http_status).
+
+    `prescan` is the page's HtmlPrescan if the caller already has one.
+    """
+    import re as _re
+    _was_cf_block, _used_playwright = was_cf_block, used_playwright
 
     try:
+        if backend("bs4") is None:
+            return {"error": _BACKENDS["bs4"].error}, 500
         from bs4 import BeautifulSoup
         # lxml handles Shopify's inline <link>/<style> body injections correctly;
         # html.parser treats them as container elements, leaving body with only ~4
         # direct children and breaking _iter_blocks which walks body.children.
-        try:
-            import lxml as _lxml_check  # noqa
-            _bs_parser = "lxml"
-        except ImportError:
-            _bs_parser = "html.parser"
+        _bs_parser = "lxml" if backend("lxml") is not None else "html.parser"
+        scan = prescan if prescan is not None else prescan_html(html)
         soup = BeautifulSoup(html, _bs_parser)
 
         title_tag = soup.find("title")
@@ -1074,8 +4306,11 @@ def inspect_page():
         # ── Pass 3: extract from __NEXT_DATA__ / embedded JSON payloads ────
         # Frameworks like Next.js store all page content as escaped HTML inside
         # a JSON script tag. Walk title+description and stack items, map by heading.
-        import json as _json2
-        def _extract_json_sections(soup_obj):
+        # The scripts are scanned once (scan_embedded_data) for this pass and
+        # for the dataLayer page meta below.
+        embedded = scan_embedded_data(soup)
+
+        def _extract_json_sections(payloads):
             results = {}  # heading_text -> [content blocks]
             def _text_from_html(html_str):
                 return _clean(BeautifulSoup(html_str, "html.parser"))
@@ -1172,20 +4407,12 @@ def inspect_page():
                     for item in obj:
                         _walk(item, depth + 1)
 
-            for script in soup_obj.find_all("script"):
-                raw = script.string or ""
-                if not raw or len(raw) < 100:
-                    continue
-                # __NEXT_DATA__ and similar JSON blobs
-                try:
-                    payload = _json2.loads(raw)
-                    _walk(payload)
-                except Exception:
-                    pass
+            for _kind, payload in payloads:
+                _walk(payload)
             return results
 
-        if content_sections:
-            json_data = _extract_json_sections(soup)
+        if content_sections and embedded.payloads:
+            json_data = _extract_json_sections(embedded.payloads)
             heading_map_lower = {s["heading"].lower(): s for s in content_sections}
 
             def _norm_title(t):
@@ -1289,174 +4516,9 @@ def inspect_page():
         # images_total, images_no_alt, internal_links, external_links
         # already computed above from the full pre-filter soup.
 
-        SCHEMA_RULES = {
-            "Article":             {"req": ["headline","author","datePublished"],       "rec": ["image","publisher","dateModified","description"]},
-            "NewsArticle":         {"req": ["headline","author","datePublished"],       "rec": ["image","publisher"]},
-            "BlogPosting":         {"req": ["headline","author","datePublished"],       "rec": ["image","publisher","dateModified"]},
-            "Product":             {"req": ["name"],                                    "rec": ["description","image","offers","aggregateRating","brand"]},
-            "FAQPage":             {"req": ["mainEntity"],                              "rec": []},
-            "HowTo":               {"req": ["name","step"],                             "rec": ["description","image","totalTime"]},
-            "Organization":        {"req": ["name"],                                    "rec": ["url","logo","sameAs","contactPoint"]},
-            "LocalBusiness":       {"req": ["name","address"],                         "rec": ["telephone","openingHours","geo","url"]},
-            "BreadcrumbList":      {"req": ["itemListElement"],                        "rec": []},
-            "Event":               {"req": ["name","startDate"],                       "rec": ["endDate","location","description","organizer"]},
-            "WebSite":             {"req": ["name"],                                    "rec": ["url","potentialAction"]},
-            "WebPage":             {"req": ["name"],                                    "rec": ["url","description","breadcrumb"]},
-            "Person":              {"req": ["name"],                                    "rec": ["jobTitle","url","sameAs"]},
-            "SoftwareApplication": {"req": ["name","applicationCategory","operatingSystem"], "rec": ["offers","aggregateRating"]},
-            "Recipe":              {"req": ["name","recipeIngredient","recipeInstructions"], "rec": ["image","author","totalTime","aggregateRating"]},
-            "VideoObject":         {"req": ["name","description","thumbnailUrl","uploadDate"], "rec": ["duration","contentUrl","embedUrl"]},
-            "JobPosting":          {"req": ["title","description","datePosted","hiringOrganization","jobLocation"], "rec": ["baseSalary","employmentType","validThrough"]},
-            "Review":              {"req": ["reviewRating","author"],                  "rec": ["itemReviewed","reviewBody"]},
-            "AggregateRating":     {"req": ["ratingValue","reviewCount"],              "rec": ["bestRating","worstRating"]},
-            # E-commerce / store types
-            "Store":               {"req": ["name","address"],                         "rec": ["url","telephone","openingHours","logo","sameAs"]},
-            "OnlineStore":         {"req": ["name"],                                   "rec": ["url","logo","sameAs","address","telephone","description","acceptedPaymentMethod"]},
-            "ItemList":            {"req": ["itemListElement"],                        "rec": ["name","description","numberOfItems"]},
-            "ListItem":            {"req": ["position","item"],                        "rec": []},
-            # Page types
-            "CollectionPage":      {"req": ["name"],                                   "rec": ["url","description","mainEntity","breadcrumb"]},
-            "AboutPage":           {"req": ["name"],                                   "rec": ["url","description","author"]},
-            "ContactPage":         {"req": ["name"],                                   "rec": ["url","description"]},
-            "SearchResultsPage":   {"req": ["name"],                                   "rec": ["url"]},
-            "ImageObject":         {"req": ["contentUrl"],                             "rec": ["name","description","thumbnail","width","height"]},
-            "Offer":               {"req": ["price","priceCurrency"],                  "rec": ["availability","priceValidUntil","url"]},
-        }
-
-        def validate_node(node):
-            issues, warnings = [], []
-            if not isinstance(node, dict):
-                return {"type": "Unknown", "raw": str(node)[:500], "issues": ["Not a valid JSON-LD object"], "warnings": [], "valid": False, "score": 0, "known": False, "line_annotations": []}
-
-            ctx_issue = False
-            if not node.get("@context"):
-                issues.append("Missing @context (should be 'https://schema.org')")
-                ctx_issue = True
-            elif "schema.org" not in str(node["@context"]):
-                warnings.append(f"@context '{node['@context']}' may not be schema.org")
-                ctx_issue = "warn"
-
-            typ = node.get("@type", "")
-            type_issue = not typ
-            if type_issue:
-                issues.append("Missing @type")
-
-            type_str = (typ[0] if isinstance(typ, list) else str(typ)) if typ else "Unknown"
-            rules = SCHEMA_RULES.get(type_str, {})
-            req_set = set(rules.get("req", []))
-            rec_set = set(rules.get("rec", []))
-            for f in req_set:
-                if f not in node:
-                    issues.append(f"Missing required property: '{f}'")
-            for f in rec_set:
-                if f not in node:
-                    warnings.append(f"Recommended property missing: '{f}'")
-
-            if type_str == "FAQPage":
-                for i, q in enumerate(node.get("mainEntity", []) or []):
-                    if isinstance(q, dict):
-                        if not q.get("name"):
-                            issues.append(f"FAQ item {i+1}: missing 'name' (the question)")
-                        aa = q.get("acceptedAnswer") or {}
-                        if not aa.get("text"):
-                            issues.append(f"FAQ item {i+1}: 'acceptedAnswer.text' missing")
-
-            # ── Build line annotations ──────────────────────────────
-            raw = _json.dumps(node, indent=2)
-            lines = raw.split('\n')
-            annotations = [None] * len(lines)
-            prop_line = {}   # key -> first line index
-            for i, line in enumerate(lines):
-                m = _re.match(r'\s*"([^"]+)"\s*:', line)
-                if m:
-                    key = m.group(1)
-                    if key not in prop_line:
-                        prop_line[key] = i
-
-            # @context line
-            if "@context" in prop_line:
-                annotations[prop_line["@context"]] = "error" if ctx_issue is True else ("warn" if ctx_issue == "warn" else "ok")
-            # @type line
-            if "@type" in prop_line:
-                annotations[prop_line["@type"]] = "error" if type_issue else "ok"
-            # required fields present → green; missing already in issues list (no line)
-            for f in req_set:
-                if f in prop_line:
-                    annotations[prop_line[f]] = "ok"
-            # recommended fields present → blue note
-            for f in rec_set:
-                if f in prop_line and annotations[prop_line[f]] is None:
-                    annotations[prop_line[f]] = "rec"
-
-            is_known = type_str in SCHEMA_RULES
-            return {
-                "type":             type_str,
-                "raw":              raw[:4000],
-                "issues":           issues,
-                "warnings":         warnings,
-                # Unknown types have no validation rules — mark valid=None so the
-                # frontend can distinguish "not validated" from "validated & passing"
-                "valid":            None if not is_known else len(issues) == 0,
-                "score":            None if not is_known else max(0, 100 - len(issues)*20 - len(warnings)*5),
-                "known":            is_known,
-                "line_annotations": annotations,
-            }
+        schema_results = extract_structured_data(soup)
 
-        schema_results = []
-        for script in soup.find_all("script", type="application/ld+json"):
-            raw_text = script.string or script.get_text()
-            try:
-                data = _json.loads(raw_text)
-                nodes = data.get("@graph", None) if isinstance(data, dict) else None
-                if nodes is not None:
-                    ctx = data.get("@context", "")
-                    for item in nodes:
-                        if isinstance(item, dict):
-                            item.setdefault("@context", ctx)
-                        schema_results.append(validate_node(item))
-                elif isinstance(data, list):
-                    for item in data:
-                        schema_results.append(validate_node(item))
-                else:
-                    schema_results.append(validate_node(data))
-            except _json.JSONDecodeError as e:
-                err_lines = raw_text.split('\n')
-                ann = [None] * len(err_lines)
-                if 1 <= e.lineno <= len(ann):
-                    ann[e.lineno - 1] = "error"
-                schema_results.append({"type": "Parse Error", "raw": raw_text[:2000], "issues": [f"Invalid JSON at line {e.lineno}, col {e.colno}: {e.msg}"], "warnings": [], "valid": False, "score": 0, "known": False, "line_annotations": ann})
-
-        # ── Microdata detection ──────────────────────────────────────────────
-        # Many Shopify themes use HTML microdata (itemscope/itemtype) instead of
-        # JSON-LD. Extract top-level itemscope elements and report them.
-        _seen_microdata_types = set()
-        for el in soup.find_all(attrs={"itemscope": True}):
-            # Skip nested itemscopes — only process top-level (no itemscope ancestor)
-            if el.find_parent(attrs={"itemscope": True}):
-                continue
-            itemtype_url = (el.get("itemtype") or "").strip()
-            # Normalise: "https://schema.org/Product" → "Product"
-            md_type = itemtype_url.rsplit("/", 1)[-1].rsplit("#", 1)[-1] if itemtype_url else "Unknown"
-            if md_type in _seen_microdata_types:
-                continue
-            _seen_microdata_types.add(md_type)
-            # Collect itemprop names at any depth within this element
-            props = {}
-            for prop_el in el.find_all(attrs={"itemprop": True}):
-                key = prop_el.get("itemprop", "").strip()
-                if not key or key in props:
-                    continue
-                val = (prop_el.get("content") or prop_el.get("href") or
-                       prop_el.get("src") or prop_el.get_text(strip=True))
-                props[key] = str(val)[:200] if val else ""
-            # Build a pseudo-JSON for display
-            pseudo = {"@context": "https://schema.org", "@type": md_type}
-            pseudo.update(props)
-            result = validate_node(pseudo)
-            result["format"] = "microdata"   # flag so UI can note it's not JSON-LD
-            schema_results.append(result)
-
-        def _detect_render_type(soup_obj, sections, wc):
+        def _detect_render_type(sections, wc):
             """Return render type string based on content extraction results."""
             total_blocks = sum(len(s["content"]) for s in sections) if sections else 0
             if sections and total_blocks >= 1:
@@ -1465,57 +4527,28 @@ def inspect_page():
                 return "static"
             if wc >= 50:
                 return "static"
-            # No content — detect the JS framework to give a better hint
-            raw_html = str(soup_obj)[:8000].lower()
-            srcs = " ".join(s.get("src","") for s in soup_obj.find_all("script") if s.get("src")).lower()
-            # Cloudflare Rocket Loader replaces script type with a hash prefix
-            # e.g. type="81d772bab91062caecfad702-text/javascript"
-            import re as _re_rl
-            rocket_loader = any(
-                _re_rl.match(r'[a-f0-9]{20,}-text/javascript', s.get("type",""))
-                for s in soup_obj.find_all("script")
-            )
-            if rocket_loader:
-                return "full_js_rocket"
-            if "__next_data__" in raw_html or "/_next/" in srcs:
-                return "full_js_nextjs"
-            if "__nuxt" in raw_html or "/_nuxt/" in srcs:
-                return "full_js_nuxt"
-            if "ng-version" in raw_html or "/angular" in srcs:
-                return "full_js_angular"
-            if soup_obj.find(id="app") and ("react" in raw_html or "reactdom" in srcs):
-                return "full_js_react"
-            if soup_obj.find(id="app") or soup_obj.find(id="root"):
-                return "full_js_spa"
-            return "full_js"
-
-        def _extract_page_meta(soup_obj):
-            """Extract page metadata from GTM dataLayer pushes and meta tags."""
-            import json as _jj, re as _rr
+            # No content — the prescan's framework fingerprints give a better hint
+            return scan.shell_type()
+
+        def _extract_page_meta(pushes):
+            """Extract page metadata from GTM dataLayer pushes."""
             meta = {}
-            for script in soup_obj.find_all("script"):
-                raw = script.string or ""
-                for m in _rr.finditer(r'dataLayer\.push\s*\(\s*(\{.+?\})\s*\)', raw, _rr.DOTALL):
-                    try:
-                        d = _jj.loads(m.group(1))
-                        if isinstance(d, dict):
-                            if d.get("page_category") and not meta.get("page_category"):
-                                meta["page_category"] = d["page_category"]
-                            cpv = d.get("content_pageview", {})
-                            if isinstance(cpv, dict):
-                                if cpv.get("content_title") and not meta.get("content_title"):
-                                    meta["content_title"] = cpv["content_title"]
-                                if cpv.get("content_category") and not meta.get("content_category"):
-                                    meta["content_category"] = cpv["content_category"]
-                            # also check top-level event_category / page_type
-                            for key in ("page_type", "event_category", "content_type"):
-                                if d.get(key) and not meta.get(key):
-                                    meta[key] = d[key]
-                    except Exception:
-                        pass
+            for d in pushes:
+                if d.get("page_category") and not meta.get("page_category"):
+                    meta["page_category"] = d["page_category"]
+                cpv = d.get("content_pageview", {})
+                if isinstance(cpv, dict):
+                    if cpv.get("content_title") and not meta.get("content_title"):
+                        meta["content_title"] = cpv["content_title"]
+                    if cpv.get("content_category") and not meta.get("content_category"):
+                        meta["content_category"] = cpv["content_category"]
+                # also check top-level event_category / page_type
+                for key in ("page_type", "event_category", "content_type"):
+                    if d.get(key) and not meta.get(key):
+                        meta[key] = d[key]
             return meta
 
-        return jsonify({
+        return {
             "url":            final_url,
             "status":         status_code,
             "title":          title,
@@ -1532,13 +4565,14 @@ def inspect_page():
             "schema":           schema_results,
             "content_sections": content_sections,
             "js_rendered":      content_sections and sum(len(s["content"]) for s in content_sections) < len(content_sections) // 2,
-            "render_type":      "cf_block" if _was_cf_block else _detect_render_type(soup, content_sections, word_count),
-            "page_meta":        _extract_page_meta(soup),
+            "render_type":      "cf_block" if _was_cf_block else _detect_render_type(content_sections, word_count),
+            "page_meta":        _extract_page_meta(embedded.datalayer),
             "used_playwright":  _used_playwright,
-        })
+            "truncated":        truncated,
+        }, 200
 
     except Exception as e:
-        return jsonify({"error": f"Parse error: {e}"}), 500
+        return {"error": f"Parse error: {e}"}, 500
 
 
 @app.route("/inspect-page-rendered")
@@ -1550,7 +4584,7 @@ def inspect_page_rendered():
         return jsonify({"error": "No URL provided"}), 400
     if not url.startswith("http"):
         url = "https://" + url
-    if not _PW_AVAILABLE:
+    if not backend_available("playwright"):
         return jsonify({"error": "Playwright not installed"}), 503
     html = _render_with_playwright(url)
     if not html:
@@ -1558,131 +4592,166 @@ def inspect_page_rendered():
     return jsonify({"html": html, "url": url})
 
 
-@app.route("/export-geo", methods=["POST"])
-def export_geo():
+# ── XLSX export engine — write-only workbooks with shared named styles ───────
+# Rows are streamed from generators straight into openpyxl's write-only
+# worksheets (each row is flushed to a temp file as it is appended), every
+# distinct look is registered once as a NamedStyle, and the finished file is
+# streamed back in chunks instead of being buffered in a BytesIO.
+
+_XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Colour palette shared by the GEO audit and IA exports
+C_NAV  = 'FF1A1F3D'  # deep navy
+C_MID  = 'FF1E2547'  # mid navy (section headers)
+C_WHT  = 'FFFFFFFF'
+C_SKY  = 'FF0EA5E9'  # sky blue (row numbers)
+C_DARK = 'FF1E293B'  # body text
+C_MUTE = 'FF94A3B8'  # muted subtitle
+C_CYAN = 'FF22D3EE'  # section score accent
+C_YLW  = 'FFFFF2CC'  # input yellow
+C_LITE = 'FFF0F4F8'  # alternating row bg
+C_RED  = 'FFEF4444'  # P1
+C_AMB  = 'FFF59E0B'  # P2
+C_GRN  = 'FF10B981'  # P3
+
+
+class _XlsxStyles:
+    """Hands out NamedStyle names, registering each distinct combination once."""
+
+    def __init__(self, wb):
+        self._wb    = wb
+        self._names = {}
+
+    def __call__(self, bold=False, sz=9, fc=C_DARK, bg=None, align_h='center',
+                 wrap=True, border=False, fmt=None, italic=False):
+        key  = (bold, sz, fc, bg, align_h, wrap, border, fmt, italic)
+        name = self._names.get(key)
+        if name is None:
+            from openpyxl.styles import NamedStyle, Font, PatternFill, Alignment, Border, Side
+            name = f"cs{len(self._names)}"
+            ns = NamedStyle(name=name)
+            ns.font      = Font(name='Arial', bold=bold, size=sz, color=fc, italic=italic)
+            ns.alignment = Alignment(horizontal=align_h, vertical='center', wrap_text=wrap)
+            if bg:
+                ns.fill = PatternFill('solid', fgColor=bg)
+            if border:
+                side = Side(style='thin', color='FFCCCCCC')
+                ns.border = Border(left=side, right=side, top=side, bottom=side)
+            if fmt is not None:
+                ns.number_format = fmt
+            self._wb.add_named_style(ns)
+            self._names[key] = name
+        return name
+
+
+def _xrow(*cells, height=None, merge=()):
+    """One streamed row: cells are (value, style) pairs or None, merge is column spans like ('A', 'H')."""
+    return {"cells": cells, "height": height, "merge": merge}
+
+
+def _xlsx_write_sheet(wb, title, widths, rows):
+    """Append a write-only sheet and stream every row from the `rows` generator into it."""
+    from openpyxl.cell import WriteOnlyCell
+    ws = wb.create_sheet(title[:31])
+    # Column/row dimensions must be set before the cells they apply to are written
+    for col, w in widths.items():
+        ws.column_dimensions[col].width = w
+    r = 0
+    for row in rows:
+        r += 1
+        if row["height"] is not None:
+            ws.row_dimensions[r].height = row["height"]
+        for a, b in row["merge"]:
+            ws.merged_cells.add(f"{a}{r}:{b}{r}")
+        out = []
+        for spec in row["cells"]:
+            if spec is None:
+                out.append(None)
+                continue
+            value, style = spec
+            if not style:
+                out.append(value)   # plain values skip cell construction entirely
+                continue
+            c = WriteOnlyCell(ws, value=value)
+            c.style = style
+            out.append(c)
+        ws.append(out)
+    return r
+
+
+def _xlsx_response(wb, filename):
+    """Save a workbook to a temp file and stream it back in chunks, deleting it afterwards."""
+    import tempfile
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
     try:
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-        from openpyxl.utils import get_column_letter
-        import io
-    except ImportError:
-        return jsonify({"error": "openpyxl not installed — run: pip install openpyxl"}), 500
+        wb.save(path)
+        size = os.path.getsize(path)
+    except Exception:
+        os.unlink(path)
+        raise
 
-    data        = request.get_json(force=True) or {}
-    domain      = data.get("domain", "GEO-Audit")
-    sections    = data.get("sections", [])
-    entity_cats = data.get("entityStack", [])
-    platform    = data.get("platform", {"headers": [], "rows": []})
+    def _stream():
+        try:
+            with open(path, "rb") as fh:
+                while True:
+                    chunk = fh.read(256 * 1024)
+                    if not chunk:
+                        break
+                    yield chunk
+        finally:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    safe = re.sub(r'[^\w.\- ]+', '_', filename)
+    return Response(_stream(), mimetype=_XLSX_MIME, headers={
+        "Content-Disposition": f'attachment; filename="{safe}"',
+        "Content-Length":      str(size),
+    })
 
-    # ── Colour palette ──────────────────────────────────────────────
-    C_NAV  = 'FF1A1F3D'  # deep navy
-    C_MID  = 'FF1E2547'  # mid navy (section headers)
-    C_WHT  = 'FFFFFFFF'
-    C_SKY  = 'FF0EA5E9'  # sky blue (row numbers)
-    C_DARK = 'FF1E293B'  # body text
-    C_MUTE = 'FF94A3B8'  # muted subtitle
-    C_CYAN = 'FF22D3EE'  # section score accent
-    C_YLW  = 'FFFFF2CC'  # input yellow
-    C_LITE = 'FFF0F4F8'  # alternating row bg
-    C_RED  = 'FFEF4444'  # P1
-    C_AMB  = 'FFF59E0B'  # P2
-    C_GRN  = 'FF10B981'  # P3
-
-    thin_side = Side(style='thin', color='FFCCCCCC')
-
-    def mkfill(c):
-        return PatternFill('solid', fgColor=c)
-
-    def mkfont(bold=False, sz=9, color=C_DARK, italic=False):
-        return Font(name='Arial', bold=bold, size=sz, color=color, italic=italic)
-
-    def mkalign(h='center', wrap=True):
-        return Alignment(horizontal=h, vertical='center', wrap_text=wrap)
-
-    def mkborder():
-        return Border(left=thin_side, right=thin_side, top=thin_side, bottom=thin_side)
-
-    def cell_style(cell, value=None, bold=False, sz=9, fc=C_DARK, bg=None,
-                   align_h='center', wrap=True, border=False, fmt=None, italic=False):
-        if value is not None:
-            cell.value = value
-        cell.font      = mkfont(bold=bold, sz=sz, color=fc, italic=italic)
-        cell.alignment = mkalign(h=align_h, wrap=wrap)
-        if bg:
-            cell.fill = mkfill(bg)
-        if border:
-            cell.border = mkborder()
-        if fmt is not None:
-            cell.number_format = fmt
-
-    def prio_label(p):
-        return 'P1 Critical' if p == 'P1' else ('P2 Important' if p == 'P2' else 'P3 Nice to Have')
-
-    def prio_fc(label):
-        return C_RED if 'P1' in label else (C_AMB if 'P2' in label else C_GRN)
-
-    STATE_EMOJI = {'pass': '✅ Done', 'partial': '⚠️ Partial', 'fail': '❌ Missing'}
-
-    wb = Workbook()
-
-    # ═══════════════════════════════════════════════════════════════
-    # Sheet 1 — GEO Page Audit
-    # ═══════════════════════════════════════════════════════════════
-    ws = wb.active
-    ws.title = 'GEO Page Audit'
-    ws.column_dimensions['A'].width = 4
-    ws.column_dimensions['B'].width = 30
-    ws.column_dimensions['C'].width = 44
-    ws.column_dimensions['D'].width = 9
-    ws.column_dimensions['E'].width = 17.29
-    ws.column_dimensions['F'].width = 13
-    ws.column_dimensions['G'].width = 9
-    ws.column_dimensions['H'].width = 32
-
-    def banner(ws, row, text, bg, fc=C_WHT, sz=14, bold=True, h=36):
-        ws.merge_cells(f'A{row}:H{row}')
-        ws.row_dimensions[row].height = h
-        cell_style(ws[f'A{row}'], text, bold=bold, sz=sz, fc=fc, bg=bg)
-
-    # Row 1 — Title
-    banner(ws, 1, 'GEO PAGE AUDIT CHECKLIST  -  WEIGHTED SCORING', C_NAV)
-    # Row 2 — Subtitle
-    banner(ws, 2, 'Generative Engine Optimisation  |  Weighted scoring with signal detection',
-           C_MID, fc=C_MUTE, sz=9, bold=False, h=21.75)
 
-    # Row 3 — Client / URL
-    ws.row_dimensions[3].height = 25.5
-    ws.merge_cells('A3:B3')
-    cell_style(ws['A3'], 'Client:', bold=True, sz=9, fc=C_WHT, bg=C_SKY)
-    ws.merge_cells('C3:D3')
-    cell_style(ws['C3'], domain, sz=9, fc=C_DARK, bg=C_WHT, border=True)
-    cell_style(ws['E3'], 'URL:', bold=True, sz=9, fc=C_WHT, bg=C_SKY)
-    ws.merge_cells('F3:H3')
-    cell_style(ws['F3'], '', sz=9, fc=C_DARK, bg=C_WHT, border=True)
+def _geo_prio_label(p):
+    return 'P1 Critical' if p == 'P1' else ('P2 Important' if p == 'P2' else 'P3 Nice to Have')
 
-    # Row 4 — Focus Keyword / Date
-    ws.row_dimensions[4].height = 25.5
-    ws.merge_cells('A4:B4')
-    cell_style(ws['A4'], 'Focus Keyword:', bold=True, sz=9, fc=C_WHT, bg=C_SKY)
-    ws.merge_cells('C4:D4')
-    cell_style(ws['C4'], '', sz=9, fc=C_DARK, bg=C_WHT, border=True)
-    cell_style(ws['E4'], 'Date:', bold=True, sz=9, fc=C_WHT, bg=C_SKY)
-    ws.merge_cells('F4:H4')
-    cell_style(ws['F4'], '', sz=9, fc=C_DARK, bg=C_WHT, border=True)
 
-    # Row 5 — Spacer
-    ws.row_dimensions[5].height = 6
-    for col in 'ABCDEFGH':
-        ws[f'{col}5'].fill = mkfill(C_LITE)
+def _geo_prio_fc(label):
+    return C_RED if 'P1' in label else (C_AMB if 'P2' in label else C_GRN)
+
+
+_GEO_STATE_EMOJI = {'pass': '✅ Done', 'partial': '⚠️ Partial', 'fail': '❌ Missing'}
 
+
+def _geo_audit_rows(st, domain, sections, page_url=''):
+    """Rows of the 'GEO Page Audit' sheet. Row numbers are tracked here for the score formulas."""
+    def banner(text, bg, fc=C_WHT, sz=14, bold=True, h=36):
+        return _xrow((text, st(bold=bold, sz=sz, fc=fc, bg=bg)), height=h, merge=[('A', 'H')])
+
+    def spacer():
+        lite = st(bg=C_LITE)
+        return _xrow(*[(None, lite)] * 8, height=6)
+
+    label = st(bold=True, sz=9, fc=C_WHT, bg=C_SKY)
+    field = st(sz=9, fc=C_DARK, bg=C_WHT, border=True)
+
+    # Rows 1–2 — title + subtitle
+    yield banner('GEO PAGE AUDIT CHECKLIST  -  WEIGHTED SCORING', C_NAV)
+    yield banner('Generative Engine Optimisation  |  Weighted scoring with signal detection',
+                 C_MID, fc=C_MUTE, sz=9, bold=False, h=21.75)
+    # Row 3 — Client / URL
+    yield _xrow(('Client:', label), None, (domain, field), None, ('URL:', label), (page_url, field), None, None,
+                height=25.5, merge=[('A', 'B'), ('C', 'D'), ('F', 'H')])
+    # Row 4 — Focus Keyword / Date
+    yield _xrow(('Focus Keyword:', label), None, ('', field), None, ('Date:', label), ('', field), None, None,
+                height=25.5, merge=[('A', 'B'), ('C', 'D'), ('F', 'H')])
+    # Row 5 — Spacer
+    yield spacer()
     # Row 6 — Column headers
-    ws.row_dimensions[6].height = 27.75
-    col_heads = ['#', 'Check Item', 'Detail / What to Look For', 'Weight', 'Priority', 'Status', 'Score', 'Notes / Action']
-    for i, h in enumerate(col_heads, 1):
-        c = ws[f'{get_column_letter(i)}6']
-        cell_style(c, h, bold=True, sz=10, fc=C_WHT, bg=C_NAV, border=True)
+    head = st(bold=True, sz=10, fc=C_WHT, bg=C_NAV, border=True)
+    yield _xrow(*[(h, head) for h in ['#', 'Check Item', 'Detail / What to Look For', 'Weight',
+                                       'Priority', 'Status', 'Score', 'Notes / Action']], height=27.75)
 
-    # ── Write sections ──────────────────────────────────────────────
     cur = 7
     score_cells = []   # list of G{row} cell refs for overall formula
     sec_ranges  = []   # (item_start, item_end) per section
@@ -1697,211 +4766,212 @@ def export_geo():
         if not items:
             continue
 
-        # Section weight % label
+        # Section header with weight % label
         sec_weight = sum(i.get('weight', 1) for i in items)
         pct = round(sec_weight / total_all_weight * 100) if total_all_weight else 0
-        sec_title = f"{sec['title'].upper()}  (Weight: {pct}%)"
-
-        # Section header
-        ws.merge_cells(f'A{cur}:H{cur}')
-        ws.row_dimensions[cur].height = 25.5
-        cell_style(ws[f'A{cur}'], sec_title, bold=True, sz=11, fc=C_WHT, bg=C_MID)
+        yield _xrow((f"{sec['title'].upper()}  (Weight: {pct}%)", st(bold=True, sz=11, fc=C_WHT, bg=C_MID)),
+                    height=25.5, merge=[('A', 'H')])
         cur += 1
 
         item_start = cur
         for idx, item in enumerate(items):
-            ws.row_dimensions[cur].height = 37.5
             row_bg = C_WHT if idx % 2 == 0 else C_LITE
-            prio   = prio_label(item.get('priority', 'P2'))
-            emoji  = STATE_EMOJI.get(item.get('state'), '')
-
-            cell_style(ws[f'A{cur}'], idx + 1, bold=True, sz=9, fc=C_SKY,  bg=row_bg, border=True)
-            cell_style(ws[f'B{cur}'], item.get('label', ''),   sz=9, fc=C_DARK, bg=row_bg, border=True)
-            cell_style(ws[f'C{cur}'], item.get('detail', ''),  sz=9, fc=C_DARK, bg=row_bg, border=True)
-            cell_style(ws[f'D{cur}'], item.get('weight', 1),   bold=True, sz=9, fc=C_DARK, bg=row_bg, border=True, fmt='0')
-            cell_style(ws[f'E{cur}'], prio, bold=True, sz=9, fc=prio_fc(prio), bg=row_bg, border=True)
-            cell_style(ws[f'F{cur}'], emoji, sz=9, fc=C_DARK, bg=C_YLW, border=True)
-            # Score formula
+            prio   = _geo_prio_label(item.get('priority', 'P2'))
+            body   = st(sz=9, fc=C_DARK, bg=row_bg, border=True)
+            inp    = st(sz=9, fc=C_DARK, bg=C_YLW, border=True)
             r = cur
-            ws[f'G{r}'].value       = f'=IF(F{r}="✅ Done",D{r},IF(F{r}="⚠️ Partial",D{r}*0.5,IF(F{r}="❌ Missing",0,"")))'
-            ws[f'G{r}'].font        = mkfont(bold=True, sz=9, color=C_DARK)
-            ws[f'G{r}'].fill        = mkfill(row_bg)
-            ws[f'G{r}'].alignment   = mkalign()
-            ws[f'G{r}'].border      = mkborder()
-            ws[f'G{r}'].number_format = '0'
-            cell_style(ws[f'H{cur}'], '', sz=9, fc=C_DARK, bg=C_YLW, border=True)
+            yield _xrow(
+                (idx + 1,                  st(bold=True, sz=9, fc=C_SKY, bg=row_bg, border=True)),
+                (item.get('label', ''),    body),
+                (item.get('detail', ''),   body),
+                (item.get('weight', 1),    st(bold=True, sz=9, fc=C_DARK, bg=row_bg, border=True, fmt='0')),
+                (prio,                     st(bold=True, sz=9, fc=_geo_prio_fc(prio), bg=row_bg, border=True)),
+                (_GEO_STATE_EMOJI.get(item.get('state'), ''), inp),
+                (f'=IF(F{r}="✅ Done",D{r},IF(F{r}="⚠️ Partial",D{r}*0.5,IF(F{r}="❌ Missing",0,"")))',
+                 st(bold=True, sz=9, fc=C_DARK, bg=row_bg, border=True, fmt='0')),
+                ('', inp),
+                height=37.5)
             cur += 1
 
         item_end = cur - 1
         sec_ranges.append((item_start, item_end))
 
         # Section score footer
-        ws.row_dimensions[cur].height = 27.75
-        ws.merge_cells(f'A{cur}:E{cur}')
-        cell_style(ws[f'A{cur}'], 'Section Score:', bold=True, sz=10, fc=C_CYAN, bg=C_NAV)
-        cell_style(ws[f'F{cur}'], 'Earned:', sz=9, fc=C_MUTE, bg=C_NAV)
         sg = cur
-        ws[f'G{sg}'].value          = (f'=SUMPRODUCT((F{item_start}:F{item_end}="✅ Done")*D{item_start}:D{item_end})'
-                                       f'+SUMPRODUCT((F{item_start}:F{item_end}="⚠️ Partial")*D{item_start}:D{item_end})*0.5')
-        ws[f'G{sg}'].font           = mkfont(bold=True, sz=12, color=C_CYAN)
-        ws[f'G{sg}'].fill           = mkfill(C_NAV)
-        ws[f'G{sg}'].alignment      = mkalign()
-        ws[f'G{sg}'].number_format  = '0'
-        ws[f'H{sg}'].value          = (f'=IF(COUNTA(F{item_start}:F{item_end})=0,"",ROUND(G{sg},1)'
-                                       f'&" / "&ROUND(SUMPRODUCT((D{item_start}:D{item_end}>0)*D{item_start}:D{item_end}),0)&" pts")')
-        ws[f'H{sg}'].font           = mkfont(sz=10, color=C_MUTE)
-        ws[f'H{sg}'].fill           = mkfill(C_NAV)
-        ws[f'H{sg}'].alignment      = mkalign()
+        yield _xrow(
+            ('Section Score:', st(bold=True, sz=10, fc=C_CYAN, bg=C_NAV)), None, None, None, None,
+            ('Earned:', st(sz=9, fc=C_MUTE, bg=C_NAV)),
+            (f'=SUMPRODUCT((F{item_start}:F{item_end}="✅ Done")*D{item_start}:D{item_end})'
+             f'+SUMPRODUCT((F{item_start}:F{item_end}="⚠️ Partial")*D{item_start}:D{item_end})*0.5',
+             st(bold=True, sz=12, fc=C_CYAN, bg=C_NAV, fmt='0')),
+            (f'=IF(COUNTA(F{item_start}:F{item_end})=0,"",ROUND(G{sg},1)'
+             f'&" / "&ROUND(SUMPRODUCT((D{item_start}:D{item_end}>0)*D{item_start}:D{item_end}),0)&" pts")',
+             st(sz=10, fc=C_MUTE, bg=C_NAV)),
+            height=27.75, merge=[('A', 'E')])
         score_cells.append(f'G{sg}')
         cur += 1
 
-        # Spacer
-        ws.row_dimensions[cur].height = 6
-        for col in 'ABCDEFGH':
-            ws[f'{col}{cur}'].fill = mkfill(C_LITE)
+        yield spacer()
         cur += 1
 
     # ── Overall GEO Score ───────────────────────────────────────────
-    cur += 1  # blank separator
-    ws.merge_cells(f'A{cur}:H{cur}')
-    ws.row_dimensions[cur].height = 36
-    cell_style(ws[f'A{cur}'], 'OVERALL GEO READINESS SCORE', bold=True, sz=14, fc=C_WHT, bg=C_NAV)
-    cur += 1
-
-    ws.row_dimensions[cur].height = 39.75
-    ws.merge_cells(f'A{cur}:C{cur}')
-    cell_style(ws[f'A{cur}'], 'Total Points Earned:', bold=True, sz=12, fc=C_WHT, bg=C_MID)
+    yield _xrow()   # blank separator
+    yield banner('OVERALL GEO READINESS SCORE', C_NAV)
 
     total_formula = '+'.join(score_cells) if score_cells else '0'
-    ws.merge_cells(f'D{cur}:E{cur}')
-    ws[f'D{cur}'].value          = f'={total_formula}'
-    ws[f'D{cur}'].font           = mkfont(bold=True, sz=18, color=C_SKY)
-    ws[f'D{cur}'].fill           = mkfill(C_MID)
-    ws[f'D{cur}'].alignment      = mkalign()
-    ws[f'D{cur}'].number_format  = '0'
-
     d_ranges = '+'.join(f'SUM(D{s}:D{e})' for s, e in sec_ranges) if sec_ranges else '1'
-    ws.merge_cells(f'F{cur}:H{cur}')
-    ws[f'F{cur}'].value     = f'=IF(({total_formula})=0,"0%",TEXT(({total_formula})/({d_ranges}),"0%")&"  GEO Readiness")'
-    ws[f'F{cur}'].font      = mkfont(bold=True, sz=12, color=C_CYAN)
-    ws[f'F{cur}'].fill      = mkfill(C_MID)
-    ws[f'F{cur}'].alignment = mkalign()
-    cur += 1
-
-    ws.merge_cells(f'A{cur}:H{cur}')
-    ws.row_dimensions[cur].height = 27.75
-    cell_style(ws[f'A{cur}'],
-               'RATING:   90-100% = AI Citation Ready   |   70-89% = Strong Foundation   |   50-69% = Work Required   |   <50% = Major Gaps',
-               sz=9, fc=C_CYAN, bg=C_NAV)
-    cur += 1
+    yield _xrow(
+        ('Total Points Earned:', st(bold=True, sz=12, fc=C_WHT, bg=C_MID)), None, None,
+        (f'={total_formula}', st(bold=True, sz=18, fc=C_SKY, bg=C_MID, fmt='0')), None,
+        (f'=IF(({total_formula})=0,"0%",TEXT(({total_formula})/({d_ranges}),"0%")&"  GEO Readiness")',
+         st(bold=True, sz=12, fc=C_CYAN, bg=C_MID)),
+        height=39.75, merge=[('A', 'C'), ('D', 'E'), ('F', 'H')])
+
+    yield _xrow(('RATING:   90-100% = AI Citation Ready   |   70-89% = Strong Foundation   |   50-69% = Work Required   |   <50% = Major Gaps',
+                 st(sz=9, fc=C_CYAN, bg=C_NAV)), height=27.75, merge=[('A', 'H')])
 
     # P1 summary row
     p1_f_ranges = ','.join(f'F{s}:F{e}' for s, e in sec_ranges)
     p1_d_ranges = ','.join(f'D{s}:D{e}' for s, e in sec_ranges)
-    ws.merge_cells(f'A{cur}:H{cur}')
-    ws.row_dimensions[cur].height = 24
     if p1_f_ranges:
-        ws[f'A{cur}'].value = (f'="P1 Critical items remaining: "&COUNTIFS({p1_f_ranges},"",'
-                               f'{p1_d_ranges},">=1")&" of "&COUNTIF({p1_f_ranges},"<>")&" assessed"')
+        p1 = (f'="P1 Critical items remaining: "&COUNTIFS({p1_f_ranges},"",'
+              f'{p1_d_ranges},">=1")&" of "&COUNTIF({p1_f_ranges},"<>")&" assessed"')
     else:
-        ws[f'A{cur}'].value = 'P1 Critical items remaining: —'
-    ws[f'A{cur}'].font      = mkfont(sz=9, color=C_MUTE)
-    ws[f'A{cur}'].fill      = mkfill(C_NAV)
-    ws[f'A{cur}'].alignment = mkalign()
-
-    # ═══════════════════════════════════════════════════════════════
-    # Sheet 2 — Entity Stacking
-    # ═══════════════════════════════════════════════════════════════
-    ws2 = wb.create_sheet('Entity Stacking')
-    ws2.column_dimensions['A'].width = 4
-    ws2.column_dimensions['B'].width = 28
-    ws2.column_dimensions['C'].width = 50
-    ws2.column_dimensions['D'].width = 12
-    ws2.column_dimensions['E'].width = 32
-
-    ws2.merge_cells('A1:E1')
-    ws2.row_dimensions[1].height = 36
-    cell_style(ws2['A1'], 'ENTITY STACKING CHECKLIST', bold=True, sz=14, fc=C_WHT, bg=C_NAV)
-    ws2.merge_cells('A2:E2')
-    ws2.row_dimensions[2].height = 21.75
-    cell_style(ws2['A2'], f'Based on Floate framework  |  {domain}  |  Track entity presence across all platforms',
-               sz=9, fc=C_MUTE, bg=C_MID)
-
-    ws2.row_dimensions[3].height = 27.75
-    for i, h in enumerate(['#', 'Entity Signal', 'What to Do', 'Status', 'URL / Notes'], 1):
-        c = ws2[f'{get_column_letter(i)}3']
-        cell_style(c, h, bold=True, sz=10, fc=C_WHT, bg=C_SKY, border=True)
+        p1 = 'P1 Critical items remaining: —'
+    yield _xrow((p1, st(sz=9, fc=C_MUTE, bg=C_NAV)), height=24, merge=[('A', 'H')])
+
+
+def _geo_entity_rows(st, domain, entity_cats):
+    yield _xrow(('ENTITY STACKING CHECKLIST', st(bold=True, sz=14, fc=C_WHT, bg=C_NAV)),
+                height=36, merge=[('A', 'E')])
+    yield _xrow((f'Based on Floate framework  |  {domain}  |  Track entity presence across all platforms',
+                 st(sz=9, fc=C_MUTE, bg=C_MID)), height=21.75, merge=[('A', 'E')])
+    head = st(bold=True, sz=10, fc=C_WHT, bg=C_SKY, border=True)
+    yield _xrow(*[(h, head) for h in ['#', 'Entity Signal', 'What to Do', 'Status', 'URL / Notes']],
+                height=27.75)
 
     ecur = 4
     for cat in entity_cats:
-        ws2.merge_cells(f'A{ecur}:E{ecur}')
-        ws2.row_dimensions[ecur].height = 25.5
-        cell_style(ws2[f'A{ecur}'], cat.get('title', '').upper(), bold=True, sz=11, fc=C_WHT, bg=C_MID)
+        yield _xrow((cat.get('title', '').upper(), st(bold=True, sz=11, fc=C_WHT, bg=C_MID)),
+                    height=25.5, merge=[('A', 'E')])
         ecur += 1
         for idx, item in enumerate(cat.get('items', [])):
-            ws2.row_dimensions[ecur].height = 31.5
-            row_bg  = C_WHT if idx % 2 == 0 else C_LITE
-            checked = item.get('checked', False)
-            cell_style(ws2[f'A{ecur}'], idx + 1,           bold=True, sz=9, fc=C_SKY,  bg=row_bg, border=True)
-            cell_style(ws2[f'B{ecur}'], item.get('label',''),  sz=9, fc=C_DARK, bg=row_bg, border=True)
-            cell_style(ws2[f'C{ecur}'], item.get('note',''),   sz=9, fc=C_DARK, bg=row_bg, border=True)
-            cell_style(ws2[f'D{ecur}'], '✅ Live' if checked else '', sz=9, fc=C_DARK, bg=C_YLW, border=True)
-            cell_style(ws2[f'E{ecur}'], '', sz=9, fc=C_DARK, bg=C_YLW, border=True)
+            row_bg = C_WHT if idx % 2 == 0 else C_LITE
+            body   = st(sz=9, fc=C_DARK, bg=row_bg, border=True)
+            inp    = st(sz=9, fc=C_DARK, bg=C_YLW, border=True)
+            yield _xrow(
+                (idx + 1,              st(bold=True, sz=9, fc=C_SKY, bg=row_bg, border=True)),
+                (item.get('label', ''), body),
+                (item.get('note', ''),  body),
+                ('✅ Live' if item.get('checked', False) else '', inp),
+                ('', inp),
+                height=31.5)
             ecur += 1
 
-    ws2.row_dimensions[ecur].height = 15.75
+    yield _xrow(height=15.75)
     ecur += 1
-    ws2.merge_cells(f'A{ecur}:E{ecur}')
-    ws2.row_dimensions[ecur].height = 27.75
-    ws2[f'A{ecur}'].value     = f'=COUNTIF(D4:D{ecur-1},"✅ Live")&" / "&COUNTA(B4:B{ecur-1})&" live"'
-    ws2[f'A{ecur}'].font      = mkfont(sz=10, color=C_CYAN)
-    ws2[f'A{ecur}'].fill      = mkfill(C_NAV)
-    ws2[f'A{ecur}'].alignment = mkalign()
-
-    # ═══════════════════════════════════════════════════════════════
-    # Sheet 3 — Platform Citation Matrix
-    # ═══════════════════════════════════════════════════════════════
-    ws3 = wb.create_sheet('Platform Citation Matrix')
-    pm_headers = platform.get('headers', [])
-    pm_rows    = platform.get('rows', [])
-
-    ws3.column_dimensions['A'].width = 24
-    for i in range(len(pm_headers)):
-        ws3.column_dimensions[get_column_letter(i + 2)].width = 22
-
-    ws3.merge_cells(f'A1:{get_column_letter(len(pm_headers) + 1)}1')
-    ws3.row_dimensions[1].height = 36
-    cell_style(ws3['A1'], 'PLATFORM CITATION MATRIX', bold=True, sz=14, fc=C_WHT, bg=C_NAV)
-    ws3.merge_cells(f'A2:{get_column_letter(len(pm_headers) + 1)}2')
-    ws3.row_dimensions[2].height = 21.75
-    cell_style(ws3['A2'], 'How each AI platform retrieves, weights, and cites content  |  Use to prioritise optimisation effort',
-               sz=9, fc=C_MUTE, bg=C_MID)
-
-    ws3.row_dimensions[3].height = 27.75
-    cell_style(ws3['A3'], 'Signal', bold=True, sz=10, fc=C_WHT, bg=C_NAV, border=True)
-    for i, h in enumerate(pm_headers, 2):
-        c = ws3[f'{get_column_letter(i)}3']
-        cell_style(c, h, bold=True, sz=10, fc=C_WHT, bg=C_NAV, border=True)
-
+    yield _xrow((f'=COUNTIF(D4:D{ecur-1},"✅ Live")&" / "&COUNTA(B4:B{ecur-1})&" live"',
+                 st(sz=10, fc=C_CYAN, bg=C_NAV)), height=27.75, merge=[('A', 'E')])
+
+
+def _geo_platform_rows(st, pm_headers, pm_rows):
+    from openpyxl.utils import get_column_letter
+    last = get_column_letter(len(pm_headers) + 1)
+    yield _xrow(('PLATFORM CITATION MATRIX', st(bold=True, sz=14, fc=C_WHT, bg=C_NAV)),
+                height=36, merge=[('A', last)])
+    yield _xrow(('How each AI platform retrieves, weights, and cites content  |  Use to prioritise optimisation effort',
+                 st(sz=9, fc=C_MUTE, bg=C_MID)), height=21.75, merge=[('A', last)])
+    head = st(bold=True, sz=10, fc=C_WHT, bg=C_NAV, border=True)
+    yield _xrow(('Signal', head), *[(h, head) for h in pm_headers], height=27.75)
     for ridx, row_data in enumerate(pm_rows):
-        r = ridx + 4
-        ws3.row_dimensions[r].height = 31.5
         row_bg = C_WHT if ridx % 2 == 0 else C_LITE
-        cell_style(ws3[f'A{r}'], row_data.get('signal', ''), bold=True, sz=9, fc=C_DARK, bg=row_bg, border=True)
-        for ci, val in enumerate(row_data.get('vals', []), 2):
-            cell_style(ws3[f'{get_column_letter(ci)}{r}'], val, sz=9, fc=C_DARK, bg=row_bg, border=True)
+        body   = st(sz=9, fc=C_DARK, bg=row_bg, border=True)
+        yield _xrow((row_data.get('signal', ''), st(bold=True, sz=9, fc=C_DARK, bg=row_bg, border=True)),
+                    *[(v, body) for v in row_data.get('vals', [])], height=31.5)
 
-    # ── Serialise and return ────────────────────────────────────────
-    buf = io.BytesIO()
-    wb.save(buf)
-    buf.seek(0)
-    filename = f'{domain}-GEO-Audit.xlsx'
-    return send_file(
-        buf,
-        as_attachment=True,
-        download_name=filename,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
+
+@app.route("/export-geo", methods=["POST"])
+def export_geo():
+    try:
+        from openpyxl import Workbook
+        from openpyxl.utils import get_column_letter
+    except ImportError:
+        return jsonify({"error": "openpyxl not installed — run: pip install openpyxl"}), 500
+
+    data        = request.get_json(force=True) or {}
+    domain      = data.get("domain", "GEO-Audit")
+    sections    = data.get("sections", [])
+    entity_cats = data.get("entityStack", [])
+    platform    = data.get("platform", {"headers": [], "rows": []})
+    # Multi-page audits: one audit sheet per page, each with its own URL row.
+    # A single-page payload (top-level "sections") keeps the original layout.
+    pages       = data.get("pages") or [{"url": "", "sections": sections}]
+
+    wb = Workbook(write_only=True)
+    st = _XlsxStyles(wb)
+    audit_widths = {'A': 4, 'B': 30, 'C': 44, 'D': 9, 'E': 17.29, 'F': 13, 'G': 9, 'H': 32}
+
+    # ═══ Sheet 1..n — GEO Page Audit ═══════════════════════════════
+    for n, page in enumerate(pages, 1):
+        title = 'GEO Page Audit' if len(pages) == 1 else f'GEO Page Audit {n}'
+        _xlsx_write_sheet(wb, title, audit_widths,
+                          _geo_audit_rows(st, domain, page.get("sections", []), page.get("url", "")))
+
+    # ═══ Entity Stacking ═══════════════════════════════════════════
+    _xlsx_write_sheet(wb, 'Entity Stacking', {'A': 4, 'B': 28, 'C': 50, 'D': 12, 'E': 32},
+                      _geo_entity_rows(st, domain, entity_cats))
+
+    # ═══ Platform Citation Matrix ══════════════════════════════════
+    pm_headers = platform.get('headers', [])
+    pm_widths  = {'A': 24}
+    pm_widths.update({get_column_letter(i + 2): 22 for i in range(len(pm_headers))})
+    _xlsx_write_sheet(wb, 'Platform Citation Matrix', pm_widths,
+                      _geo_platform_rows(st, pm_headers, platform.get('rows', [])))
+
+    return _xlsx_response(wb, f'{domain}-GEO-Audit.xlsx')
+
+
+def _ia_rows(st, urls):
+    """IA table rows — same decomposition as processSitemapIA() in the UI."""
+    head = st(bold=True, sz=10, fc=C_WHT, bg=C_NAV, border=True)
+    yield _xrow(*[(h, head) for h in ["Main"] + [f"Sub {i}" for i in range(1, 10)]
+                                     + ["Item", "URL", "Depth"]], height=24)
+    # Body cells stay unstyled (bar the Main column) so 100k-row tables write quickly
+    main = st(bold=True, sz=9, fc=C_DARK, align_h='left', wrap=False)
+    cell = None
+    for u in urls:
+        u = (u or "").strip() if isinstance(u, str) else ""
+        if not u:
+            continue
+        try:
+            segs = [s for s in urlparse(u).path.split("/") if s]
+        except ValueError:
+            continue
+        clean = [_ia_label(s.split("?")[0].rstrip("/")) or s for s in segs]
+        subs  = [(clean[i] if i < len(clean) else None, cell) for i in range(1, 10)]
+        yield _xrow((clean[0] if clean else "Home", main), *subs,
+                    (clean[-1] if len(clean) > 10 else None, cell), (u, cell), (len(segs), cell))
+
+
+@app.route("/export-ia", methods=["POST"])
+def export_ia():
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        return jsonify({"error": "openpyxl not installed — run: pip install openpyxl"}), 500
+
+    data   = request.get_json(force=True, silent=True) or {}
+    urls   = data.get("urls") or []
+    domain = data.get("domain") or "IA"
+    if not isinstance(urls, list) or not urls:
+        return jsonify({"error": "No URLs provided"}), 400
+
+    wb = Workbook(write_only=True)
+    st = _XlsxStyles(wb)
+    widths = {"A": 22, "K": 28, "L": 70, "M": 7}
+    widths.update({c: 18 for c in "BCDEFGHIJ"})
+    _xlsx_write_sheet(wb, "IA Structure", widths, _ia_rows(st, urls))
+    return _xlsx_response(wb, f"{domain}-IA.xlsx")
 
 
 def _docx_add_hyperlink(para, url, text):
@@ -1928,83 +4998,282 @@ def _docx_add_hyperlink(para, url, text):
     para._p.append(hl)
 
 
-def _docx_fill_html(para, html_str):
-    """Parse HTML and add runs/hyperlinks to an existing paragraph."""
-    from html.parser import HTMLParser
-    from docx.shared import RGBColor
-    import html as html_mod
-
-    class _P(HTMLParser):
-        def __init__(self):
-            super().__init__()
-            self._href = None
-            self._buf  = []
-            self._bold = False
-            self._ital = False
-
-        def _commit(self):
-            t = "".join(self._buf).replace("\xa0", " ")
-            self._buf = []
-            return t
-
-        def _flush(self):
-            t = self._commit()
-            if t:
-                r = para.add_run(t)
-                r.bold   = self._bold
-                r.italic = self._ital
-
-        def _flush_link(self):
-            t = self._commit()
-            if not t:
+class _DocxHTMLFiller(HTMLParser):
+    """Turns an inline HTML snippet into runs/hyperlinks on a python-docx paragraph."""
+
+    def __init__(self, para):
+        super().__init__()
+        self._para = para
+        self._href = None
+        self._buf  = []
+        self._bold = False
+        self._ital = False
+
+    def _commit(self):
+        t = "".join(self._buf).replace("\xa0", " ")
+        self._buf = []
+        return t
+
+    def _flush(self):
+        t = self._commit()
+        if t:
+            r = self._para.add_run(t)
+            # Only write <w:b>/<w:i> when on — explicit "off" props are the
+            # single most expensive part of rendering and change nothing
+            if self._bold:
+                r.bold = True
+            if self._ital:
+                r.italic = True
+
+    def _flush_link(self):
+        from docx.shared import RGBColor
+        t = self._commit()
+        if not t:
+            return
+        if self._href:
+            try:
+                _docx_add_hyperlink(self._para, self._href, t)
                 return
-            if self._href:
-                try:
-                    _docx_add_hyperlink(para, self._href, t)
-                    return
-                except Exception:
-                    pass
-            r = para.add_run(t)
-            r.font.color.rgb = RGBColor(0x00, 0x56, 0xD2)
+            except Exception:
+                pass
+        r = self._para.add_run(t)
+        r.font.color.rgb = RGBColor(0x00, 0x56, 0xD2)
+
+    def handle_starttag(self, tag, attrs):
+        d = dict(attrs)
+        if tag == "a":
+            self._flush(); self._href = d.get("href", "")
+        elif tag in ("b", "strong"):
+            self._flush(); self._bold = True
+        elif tag in ("i", "em"):
+            self._flush(); self._ital = True
+
+    def handle_endtag(self, tag):
+        if tag == "a":
+            self._flush_link(); self._href = None
+        elif tag in ("b", "strong"):
+            self._flush(); self._bold = False
+        elif tag in ("i", "em"):
+            self._flush(); self._ital = False
+
+    def handle_data(self, data):
+        self._buf.append(data)
+
+    def handle_entityref(self, name):
+        self._buf.append(html_mod.unescape(f"&{name};"))
+
+    def handle_charref(self, name):
+        c = chr(int(name[1:], 16) if name.startswith("x") else int(name))
+        self._buf.append(c)
+
 
-        def handle_starttag(self, tag, attrs):
-            d = dict(attrs)
-            if tag == "a":
-                self._flush(); self._href = d.get("href", "")
-            elif tag in ("b", "strong"):
-                self._flush(); self._bold = True
-            elif tag in ("i", "em"):
-                self._flush(); self._ital = True
-
-        def handle_endtag(self, tag):
-            if tag == "a":
-                self._flush_link(); self._href = None
-            elif tag in ("b", "strong"):
-                self._flush(); self._bold = False
-            elif tag in ("i", "em"):
-                self._flush(); self._ital = False
-
-        def handle_data(self, data):
-            self._buf.append(data)
-
-        def handle_entityref(self, name):
-            self._buf.append(html_mod.unescape(f"&{name};"))
-
-        def handle_charref(self, name):
-            c = chr(int(name[1:], 16) if name.startswith("x") else int(name))
-            self._buf.append(c)
-
-    p = _P()
+def _docx_fill_html(para, html_str):
+    """Parse HTML and add runs/hyperlinks to an existing paragraph."""
+    # Most list items / paragraphs are plain text — skip the HTML parser for those
+    if "<" not in html_str and "&" not in html_str:
+        para.add_run(html_str.replace("\xa0", " "))
+        return
+    p = _DocxHTMLFiller(para)
     p.feed(html_str)
     p._flush()
 
 
-@app.route("/save-bulk-files", methods=["POST"])
-def save_bulk_files():
-    import subprocess
+# ── Bulk DOCX rendering ──────────────────────────────────────────────────────
+# Opening the python-docx template parses ~5 XML parts (~15 ms) — more than
+# rendering a typical page.  Each process/thread parses it once, remembers the
+# pristine <w:body>, and resets just the body and hyperlink relationships
+# before each document.  Bulk exports fan out over a process pool, since
+# python-docx is pure Python and threads would serialise on the GIL.
+
+_docx_local     = threading.local()
+_docx_pool      = None
+_docx_pool_lock = threading.Lock()
+
+
+def _docx_new_document():
+    """Return a blank Document backed by this thread's cached, pre-parsed template."""
+    import copy
+    tpl = getattr(_docx_local, "tpl", None)
+    if tpl is None:
+        from docx import Document
+        doc  = Document()
+        part = doc.part
+        tpl  = _docx_local.tpl = (part, copy.deepcopy(part.element.body), set(part.rels))
+        _docx_local.style_ids = {st.name: st.style_id for st in doc.styles if st.type == 1}  # paragraph styles
+    part, body, rels = tpl
+    part.element.replace(part.element.body, copy.deepcopy(body))
+    for r_id in [r for r in part.rels if r not in rels]:
+        del part.rels[r_id]   # hyperlink rels from the previous document
+    return part.document
+
+
+def _docx_styled_para(doc, style_name, text=""):
+    """add_paragraph with a style id resolved once per template — looking a style
+    up by name makes python-docx scan every style definition on each call."""
+    p   = doc.add_paragraph(text)
+    sid = _docx_local.style_ids.get(style_name)
+    if sid:
+        p._p.style = sid
+    return p
+
+
+def _docx_render(f):
+    """Render one bulk-export file dict ({url, sections_json, error}) to .docx bytes."""
+    import io
     import json as _json
+    from docx.shared import RGBColor
+
+    doc = _docx_new_document()
+
+    # Source URL as hyperlink
+    url = f.get("url", "") or ""
+    if url:
+        p = doc.add_paragraph()
+        try:
+            _docx_add_hyperlink(p, url, url)
+        except Exception:
+            r = p.add_run(url)
+            r.font.color.rgb = RGBColor(0x00, 0x56, 0xD2)
+        doc.add_paragraph()
+
+    if f.get("error"):
+        doc.add_paragraph(f'Error: {f["error"]}')
+    else:
+        sections = _json.loads(f.get("sections_json", "[]") or "[]")
+        seen_h = set()
+        for s in sections:
+            hk = (s.get("heading", "") or "").strip().lower()
+            if hk and hk in seen_h:
+                continue
+            if hk:
+                seen_h.add(hk)
+            level   = max(1, min(int(s.get("level", 1) or 1), 9))
+            heading = (s.get("heading", "") or "").strip()
+            if heading:
+                _docx_styled_para(doc, f"Heading {level}", heading)
+            for c in (s.get("content", []) or []):
+                ctype = c.get("type", "")
+                if ctype == "text":
+                    txt = (c.get("text", "") or "").strip()
+                    if txt:
+                        doc.add_paragraph(txt)
+                elif ctype == "html":
+                    html_src = (c.get("html", "") or "").strip()
+                    if html_src:
+                        p = doc.add_paragraph()
+                        _docx_fill_html(p, html_src)
+                elif ctype == "list":
+                    for item in (c.get("items", []) or []):
+                        ih = item.get("html", "") if isinstance(item, dict) else ""
+                        it = item.get("text", "") if isinstance(item, dict) else str(item)
+                        lp = _docx_styled_para(doc, "List Bullet")
+                        if ih:
+                            _docx_fill_html(lp, ih)
+                        elif it:
+                            lp.add_run(it.strip())
+
+    buf = io.BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+
+def _docx_job_to_folder(job):
+    """Pool task: render a file and write it to disk. Returns (path, error)."""
+    import traceback
+    f, path = job
+    try:
+        blob = _docx_render(f)
+        with open(path, "wb") as fh:
+            fh.write(blob)
+        return path, None
+    except Exception:
+        return None, traceback.format_exc()[-300:]
+
+
+def _docx_job_to_bytes(job):
+    """Pool task: render a file in memory. Returns (name, bytes, error)."""
     import traceback
+    f, name = job
+    try:
+        return name, _docx_render(f), None
+    except Exception:
+        return name, None, traceback.format_exc()[-300:]
+
+
+def _get_docx_pool():
+    """Shared process pool for bulk rendering, created on first use (None if unavailable)."""
+    global _docx_pool
+    with _docx_pool_lock:
+        if _docx_pool is None:
+            try:
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+                # spawn, not fork: the pool is created from a request thread, and a
+                # forked child would inherit locks other threads hold (logging,
+                # SQLite, HTTP pools) plus the server's at-fork hooks
+                _docx_pool = ProcessPoolExecutor(max_workers=max(1, min(os.cpu_count() or 1, 8)),
+                                                 mp_context=multiprocessing.get_context("spawn"))
+            except Exception as e:
+                print(f"[docx] Process pool unavailable, rendering in-thread: {e}")
+                _docx_pool = False
+        return _docx_pool or None
+
+
+def _docx_render_many(fn, jobs):
+    """Yield fn(job) for every job, in order — across the process pool when it is usable."""
+    global _docx_pool
+    done = 0
+    pool = _get_docx_pool() if len(jobs) >= 4 else None
+    if pool is not None:
+        workers = pool._max_workers
+        try:
+            for res in pool.map(fn, jobs, chunksize=max(1, len(jobs) // (workers * 4))):
+                done += 1
+                yield res
+            return
+        except Exception as e:
+            # BrokenProcessPool (worker killed, frozen-app spawn failure…) — finish in-thread
+            print(f"[docx] Process pool failed after {done} file(s): {e}")
+            with _docx_pool_lock:
+                _docx_pool = False
+    for job in jobs[done:]:
+        yield fn(job)
+
+
+def _docx_zip_names(files):
+    """Unique, path-free .docx names for ZIP entries."""
+    used, names = {}, []
+    for i, f in enumerate(files):
+        base = os.path.basename(str(f.get("name") or f"page-{i + 1}.docx")) or f"page-{i + 1}.docx"
+        stem, ext = os.path.splitext(base)
+        n = used.get(base.lower(), 0)
+        used[base.lower()] = n + 1
+        names.append(base if n == 0 else f"{stem} ({n + 1}){ext}")
+    return names
+
+
+class _ZipSink(io.RawIOBase):
+    """Write-only, non-seekable buffer so zipfile can stream entries as they are added."""
+
+    def __init__(self):
+        super().__init__()
+        self._buf = bytearray()
+
+    def writable(self):
+        return True
 
+    def write(self, b):
+        self._buf += b
+        return len(b)
+
+    def drain(self):
+        out = bytes(self._buf)
+        self._buf.clear()
+        return out
+
+
+@app.route("/save-bulk-files", methods=["POST"])
+def save_bulk_files():
     # Parse request body safely
     try:
         data = request.get_json(force=True, silent=True) or {}
@@ -2019,93 +5288,72 @@ def save_bulk_files():
     except Exception as e:
         return jsonify({"saved": 0, "errors": [f"Cannot create folder: {e}"], "folder": folder})
 
-    # Import python-docx
-    try:
-        import docx as _docx
-        from docx import Document
-        from docx.shared import RGBColor
-        template = os.path.join(os.path.dirname(_docx.__file__), "templates", "default.docx")
-        if not os.path.exists(template):
-            template = None
-    except Exception as imp_err:
-        return jsonify({"saved": 0, "errors": [f"ImportError: {imp_err}"], "folder": folder})
+    if backend("docx") is None:
+        err = _BACKENDS["docx"].error
+        return jsonify({"saved": 0, "errors": [err], "folder": folder})
 
+    jobs   = [(f, os.path.join(folder, f.get("name", "page.docx"))) for f in files]
     saved  = []
     errors = []
-    for f in files:
-        try:
-            path = os.path.join(folder, f.get("name", "page.docx"))
-            doc  = Document(template) if template else Document()
-
-            # Source URL as hyperlink
-            url = f.get("url", "") or ""
-            if url:
-                p = doc.add_paragraph()
-                try:
-                    _docx_add_hyperlink(p, url, url)
-                except Exception:
-                    r = p.add_run(url)
-                    r.font.color.rgb = RGBColor(0x00, 0x56, 0xD2)
-                doc.add_paragraph()
-
-            if f.get("error"):
-                doc.add_paragraph(f'Error: {f["error"]}')
-            else:
-                sections = _json.loads(f.get("sections_json", "[]") or "[]")
-                seen_h = set()
-                for s in sections:
-                    hk = (s.get("heading", "") or "").strip().lower()
-                    if hk and hk in seen_h:
-                        continue
-                    if hk:
-                        seen_h.add(hk)
-                    level   = max(1, min(int(s.get("level", 1) or 1), 9))
-                    heading = (s.get("heading", "") or "").strip()
-                    if heading:
-                        doc.add_heading(heading, level=level)
-                    for c in (s.get("content", []) or []):
-                        ctype = c.get("type", "")
-                        if ctype == "text":
-                            txt = (c.get("text", "") or "").strip()
-                            if txt:
-                                doc.add_paragraph(txt)
-                        elif ctype == "html":
-                            html_src = (c.get("html", "") or "").strip()
-                            if html_src:
-                                p = doc.add_paragraph()
-                                _docx_fill_html(p, html_src)
-                        elif ctype == "list":
-                            for item in (c.get("items", []) or []):
-                                ih = item.get("html", "") if isinstance(item, dict) else ""
-                                it = item.get("text", "") if isinstance(item, dict) else str(item)
-                                try:
-                                    lp = doc.add_paragraph(style="List Bullet")
-                                except Exception:
-                                    lp = doc.add_paragraph()
-                                if ih:
-                                    _docx_fill_html(lp, ih)
-                                elif it:
-                                    lp.add_run(it.strip())
-
-            doc.save(path)
+    for path, err in _docx_render_many(_docx_job_to_folder, jobs):
+        if err:
+            errors.append(err)
+        else:
             saved.append(path)
-        except Exception:
-            errors.append(traceback.format_exc()[-300:])
 
     if saved:
-        import platform as _platform
-        try:
-            if _platform.system() == "Windows":
-                os.startfile(folder)
-            elif _platform.system() == "Darwin":
-                subprocess.Popen(["open", folder])
-            else:
-                subprocess.Popen(["xdg-open", folder])
-        except Exception:
-            pass
+        _open_folder(folder)
     return jsonify({"saved": len(saved), "errors": errors, "folder": folder})
 
 
+@app.route("/save-bulk-zip", methods=["POST"])
+def save_bulk_zip():
+    """Same documents as /save-bulk-files, streamed back as a ZIP download."""
+    import zipfile
+    data  = request.get_json(force=True, silent=True) or {}
+    files = data.get("files", [])
+    if not files:
+        return jsonify({"error": "No files provided"}), 400
+    if backend("docx") is None:
+        return jsonify({"error": _BACKENDS["docx"].error}), 500
+
+    jobs = list(zip(files, _docx_zip_names(files)))
+
+    def _stream():
+        sink   = _ZipSink()
+        errors = []
+        # .docx is already deflated — store entries as-is
+        with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED) as zf:
+            for name, blob, err in _docx_render_many(_docx_job_to_bytes, jobs):
+                if err:
+                    errors.append(f"{name}:\n{err}")
+                else:
+                    zf.writestr(name, blob)
+                yield sink.drain()
+            if errors:
+                zf.writestr("_errors.txt", "\n\n".join(errors))
+        yield sink.drain()
+
+    name = re.sub(r'[^\w.\- ]+', '_', data.get("zip_name") or "CrawlSync Exports") + ".zip"
+    return Response(_stream(), mimetype="application/zip",
+                    headers={"Content-Disposition": f'attachment; filename="{name}"'})
+
+
+def _open_folder(folder):
+    """Reveal a folder in Finder / Explorer / the desktop file manager."""
+    import subprocess
+    import platform as _platform
+    try:
+        if _platform.system() == "Windows":
+            os.startfile(folder)
+        elif _platform.system() == "Darwin":
+            subprocess.Popen(["open", folder])
+        else:
+            subprocess.Popen(["xdg-open", folder])
+    except Exception:
+        pass
+
+
 @app.route("/pick-folder")
 def pick_folder_dialog():
     """Windows folder-picker via tkinter (used when running in Edge app mode, no pywebview)."""
@@ -2125,12 +5373,649 @@ def pick_folder_dialog():
         return jsonify({"error": str(e), "folder": None})
 
 
+@app.route("/backends")
+def backends():
+    """Optional-dependency availability and import cost; ?load=1 imports them all first."""
+    if request.args.get("load"):
+        for name in _BACKENDS:
+            if backend_available(name):
+                backend(name)
+    return jsonify({"backends": backend_status(),
+                    "http": {"configured": HTTP_BACKEND, "active": http_backend_name()},
+                    "server_import_ms": round(IMPORT_SECONDS * 1000, 1)})
+
+
 @app.route("/quit", methods=["POST"])
 def quit_app():
     threading.Thread(target=lambda: (time.sleep(0.3), os._exit(0))).start()
     return jsonify({"ok": True})
 
 
+# ── ASGI serving mode ────────────────────────────────────────────────────────
+# `python sitemap_server.py --asgi` (or CRAWLSYNC_ASGI=1 in the launcher) serves
+# the app under uvicorn.  /extract, /robots, /ai-check and /inspect-page are
+# async handlers on a shared httpx.AsyncClient, so a slow site holds a
+# coroutine rather than a server thread; parsing and the sync fallbacks
+# (Cloudflare bypass, headless render, discovery) go to an executor.  Every
+# other route runs unchanged through a small WSGI bridge.  Responses are
+# serialised by app.json exactly as jsonify does, so the JSON is identical.
+
+_ASGI_THREADS = 32
+_aclient      = None
+_asgi_pool    = None
+
+
+def _get_aclient():
+    global _aclient
+    if _aclient is None:
+        import httpx
+        from http.cookiejar import CookieJar, DefaultCookiePolicy
+        http2 = HTTP_BACKEND in ("http2", "h2") and backend_available("h2")
+        _aclient = httpx.AsyncClient(
+            http2=http2,
+            verify=requests.certs.where(),
+            cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+            limits=httpx.Limits(max_connections=512, max_keepalive_connections=128),
+        )
+    return _aclient
+
+
+def _get_asgi_pool():
+    global _asgi_pool
+    if _asgi_pool is None:
+        from concurrent.futures import ThreadPoolExecutor
+        _asgi_pool = ThreadPoolExecutor(max_workers=_ASGI_THREADS, thread_name_prefix="crawlsync-asgi")
+    return _asgi_pool
+
+
+async def _in_thread(fn, *args, **kwargs):
+    import asyncio
+    import functools
+    return await asyncio.get_running_loop().run_in_executor(
+        _get_asgi_pool(), functools.partial(fn, *args, **kwargs))
+
+
+async def ahost_throttle(url):
+    """host_throttle() for coroutines: the same slots, awaited instead of slept."""
+    if HOST_RPS <= 0:
+        return
+    import asyncio
+    host, interval = (urlparse(url).hostname or "").lower(), 1.0 / HOST_RPS
+    shared = shared_state()
+    wait = (await _in_thread(shared.host_slot, host, interval) if shared is not None
+            else _host_reserve(host, interval))
+    if wait > 0:
+        await asyncio.sleep(wait)
+
+
+class _AsyncFetched:
+    """Status, final URL and a ResponseBody for one async GET."""
+    __slots__ = ("status_code", "url", "headers", "body", "truncated")
+
+    def __init__(self, status_code, url, headers, body, truncated=None):
+        self.status_code = status_code
+        self.url         = url
+        self.headers     = headers
+        self.body        = body
+        self.truncated   = truncated     # bounded_chunks() cut reason, or None
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+
+async def _abounded_chunks(r):
+    """bounded_chunks() for an httpx response opened with client.stream()."""
+    cap, start, got = download_cap(r.headers.get("Content-Type", "")), time.monotonic(), 0
+    r.truncated = None
+    async for chunk in r.aiter_bytes():
+        got += len(chunk)
+        reason = _download_check(got, cap, start)
+        if reason == "size":
+            chunk = chunk[:len(chunk) - (got - cap)]
+        yield chunk
+        if reason:
+            r.truncated = reason
+            return
+
+
+async def _aget(url, headers, timeout=15):
+    await ahost_throttle(url)
+    async with _get_aclient().stream("GET", url, headers=headers, timeout=timeout,
+                                     follow_redirects=True) as r:
+        data = b"".join([c async for c in _abounded_chunks(r)])
+    body = ResponseBody(data, r.headers.get("Content-Type", ""))
+    body.data                                   # inflate now so a capped body shows in truncated
+    return _AsyncFetched(r.status_code, str(r.url), r.headers, body, r.truncated or body.truncated)
+
+
+async def afetch(url, timeout=15, log_lines=None):
+    """Async fetch(): decoded text or None, with the same header fallbacks and bypass."""
+    def _log(msg):
+        if log_lines is not None:
+            log_lines.append(msg)
+
+    for headers in [HEADERS, HEADERS_CRAWLER]:
+        try:
+            r = await _aget(url, headers, timeout)
+        except Exception as e:
+            _log(f"  Error: {e}")
+            return None
+        if _cloudflare_markers(r.status_code, r.body.head_text(2000)):
+            _log("  Cloudflare protection detected — trying bypass methods")
+            return await _in_thread(_try_cloudflare_bypass, url, timeout, log_lines)
+        if not r.ok:
+            _log(f"  HTTP {r.status_code} for {url}")
+            continue
+        if r.body.text:
+            return r.body.text
+        _log(f"  Empty/undecodable response from {url}")
+    return None
+
+
+async def afetch_sitemap(url, timeout=15, probe=False, log_lines=None):
+    """Async fetch_sitemap() / probe_sitemap(): judge each response from its
+    first KB and only keep reading XML (or, for probes, anything with <loc>)."""
+    def _log(msg):
+        if log_lines is not None:
+            log_lines.append(msg)
+
+    client, last_other = _get_aclient(), None
+    for headers in ([HEADERS_CRAWLER] if probe else [HEADERS_CRAWLER, HEADERS]):
+        try:
+            await ahost_throttle(url)
+            async with client.stream("GET", url, headers=headers, timeout=timeout,
+                                     follow_redirects=True) as r:
+                chunks, head, eof = _abounded_chunks(r), b"", True
+                async for chunk in chunks:
+                    head += chunk
+                    if len(head) >= _PROBE_BYTES:
+                        eof = False
+                        break
+                text = ResponseBody(head).head_text(_PROBE_BYTES)
+                if probe and (r.status_code in (403, 429, 503) or _cloudflare_markers(r.status_code, text)):
+                    return await afetch(url, timeout)     # blocked — afetch runs the bypass chain
+                if _cloudflare_markers(r.status_code, text):
+                    _log("  Cloudflare protection detected — trying bypass methods")
+                    return await _in_thread(_try_cloudflare_bypass, url, timeout, log_lines)
+                if r.status_code >= 400:
+                    continue
+                if probe:
+                    keep = _sniff_sitemap(text)
+                    if keep is None and not eof and "xml" in r.headers.get("Content-Type", "").lower():
+                        keep = True
+                elif _is_xml_sitemap(text):
+                    keep = True
+                else:
+                    if text:
+                        _log(f"  Non-XML response with {headers.get('User-Agent','?')[:30]}… trying alternate headers")
+                    keep = headers is HEADERS       # last resort: whatever the server sent
+                if not keep:
+                    continue
+                rest = b"".join([c async for c in chunks]) if not eof else b""
+                body = ResponseBody(head + rest, r.headers.get("Content-Type", "")).text
+                if body and (probe or _is_xml_sitemap(body) or headers is HEADERS):
+                    return body
+                last_other = body or last_other
+        except Exception as e:
+            _log(f"  Error: {e}")
+            return None
+    if probe:
+        return None
+    return last_other or await afetch(url, timeout, log_lines)
+
+
+async def _afetch_frontier_entry(entry, budget, prefetched):
+    url, depth, parent, probe = entry
+    if url in prefetched:
+        return prefetched.pop(url), [], True
+    timeout = budget.timeout(15) if budget is not None else 15
+    lines = []
+    text = await afetch_sitemap(url, timeout, probe=probe, log_lines=None if probe else lines)
+    return text, lines, False
+
+
+async def acrawl_frontier(frontier, collected=None, visited=None, log_lines=None, budget=None,
+                          workers=EXTRACT_WORKERS, prefetched=None, record=None):
+    """crawl_frontier() with the fetches as coroutines on the shared async client."""
+    import asyncio
+    collected  = set() if collected is None else collected
+    visited    = set() if visited is None else visited
+    log_lines  = [] if log_lines is None else log_lines
+    prefetched = {} if prefetched is None else prefetched
+    while len(frontier):
+        batch = []
+        while len(batch) < workers:
+            if budget is not None and budget.exhausted(len(collected)):
+                break
+            entry = frontier.pop()
+            if entry is None:
+                break
+            if entry[0] in visited:
+                frontier.done(entry[0])
+                continue
+            visited.add(entry[0])
+            if budget is not None:
+                budget.sitemaps += 1
+            batch.append(entry)
+        if not batch:
+            break
+        results = await asyncio.gather(*[_afetch_frontier_entry(e, budget, prefetched) for e in batch])
+        for entry, res in zip(batch, results):
+            # parsing + store writes are CPU / disk — keep them off the event loop
+            await _in_thread(_crawl_one, frontier, entry, res, collected, visited, log_lines, budget, record)
+    if budget is not None and len(frontier):
+        for url, *_ in frontier.pending():
+            budget.skip(url)
+    return collected
+
+
+async def arun_extraction(raw, override="", budget=None):
+    """run_extraction() whose sitemap fetches run on the event loop.
+
+    Discovery (a handful of requests) and the store bookkeeping go to the
+    executor; the crawl is awaited here on the loop.  No executor thread ever
+    waits on the crawl — its per-sitemap parsing needs executor threads too.
+    """
+    ex = _Extraction(raw, override, budget=budget)
+    await _in_thread(ex.begin)
+    completed = False
+    try:
+        await acrawl_frontier(*ex.crawl_args())
+        completed = True
+    finally:
+        await _in_thread(ex.finish, completed)
+    return await _in_thread(ex.result)
+
+
+async def _afetch_text_file(url, timeout=20):
+    """Async _fetch_text_file()."""
+    for hdrs in _TEXT_FILE_HEADERS:
+        try:
+            r = await _aget(url, hdrs, timeout)
+        except Exception as e:
+            if "ssl" in str(e).lower() or "certificate" in str(e).lower():
+                return None
+            continue
+        if r.status_code == 404:
+            return None
+        if not r.ok:
+            continue
+        text = r.body.text
+        if text:
+            return None if text.lstrip().startswith("<") else text
+    return None
+
+
+def _asgi_origin(url):
+    if not url.startswith("http"):
+        url = "https://" + url
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+
+async def _a_extract(query, body):
+    import json as _json
+    try:
+        data = _json.loads(body or b"{}")
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        return 400, {"error": "Failed to decode JSON object"}
+    raw = (data.get("url") or "").strip()
+    override = (data.get("override") or "").strip()
+    if not raw and not override:
+        return 400, {"error": "No URL provided"}
+    budget = CrawlBudget.from_request(data.get("budget"))
+    return 200, await arun_extraction(raw, override, budget)
+
+
+async def _a_robots(query, body):
+    url = query.get("url", "").strip()
+    if not url:
+        return 400, {"error": "No URL provided"}
+    text = await afetch(_asgi_origin(url) + "/robots.txt")
+    if not text:
+        return 200, {"raw": "", "ok": False, "error": "Could not fetch robots.txt"}
+    return 200, {"raw": text, "ok": True}
+
+
+async def _a_ai_check(query, body):
+    import asyncio
+    url = query.get("url", "").strip()
+    if not url:
+        return 400, {"error": "No URL provided"}
+    base = _asgi_origin(url)
+    llms_text, llms_full_text = await asyncio.gather(
+        _afetch_text_file(base + "/llms.txt"), _afetch_text_file(base + "/llms-full.txt"))
+    return 200, {
+        "llms_txt": {
+            "found": bool(llms_text),
+            "content": llms_text[:3000] if llms_text else None,
+        },
+        "llms_full": {"found": bool(llms_full_text)},
+    }
+
+
+async def _a_inspect_page(query, body):
+    url = query.get("url", "").strip()
+    if not url:
+        return 400, {"error": "No URL provided"}
+    if not url.startswith("http"):
+        url = "https://" + url
+    try:
+        r = await _aget(url, HEADERS, 20)
+        page = await _in_thread(_inspect_resolve, url, r.url, r.status_code, r.body.text,
+                                _cloudflare_markers(r.status_code, r.body.head_text(2000)))
+    except Exception as e:
+        return 500, {"error": str(e)}
+    if "error" in page:
+        return 500, page
+    if not page["used_playwright"]:
+        page["truncated"] = r.truncated
+    result, status = await _in_thread(inspect_html, url, **page)
+    return status, result
+
+
+_ASYNC_ROUTES = {
+    ("POST", "/extract"):      _a_extract,
+    ("GET",  "/robots"):       _a_robots,
+    ("GET",  "/ai-check"):     _a_ai_check,
+    ("GET",  "/inspect-page"): _a_inspect_page,
+}
+
+
+async def _asgi_body(receive):
+    chunks = []
+    while True:
+        msg = await receive()
+        if msg["type"] == "http.disconnect":
+            break
+        chunks.append(msg.get("body", b""))
+        if not msg.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+async def _asgi_json(send, status, payload, accept_encoding=None):
+    body    = (app.json.dumps(payload) + "\n").encode("utf-8")
+    headers = [
+        (b"content-type", b"application/json"),
+        (b"access-control-allow-origin", b"*"),     # what CORS(app) adds to every response
+        (b"vary", b"Accept-Encoding"),
+    ]
+    enc = negotiate_encoding(accept_encoding) if len(body) >= COMPRESS_MIN_BYTES else None
+    if enc is not None:
+        body = await _in_thread(compress_bytes, body, enc)
+        headers.append((b"content-encoding", enc.encode()))
+    headers.append((b"content-length", str(len(body)).encode()))
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+def _wsgi_environ(scope, body):
+    server = scope.get("server") or ("127.0.0.1", 80)
+    environ = {
+        "REQUEST_METHOD":    scope["method"],
+        "SCRIPT_NAME":       scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO":         scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING":      scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME":       str(server[0]),
+        "SERVER_PORT":       str(server[1]),
+        "SERVER_PROTOCOL":   "HTTP/" + scope.get("http_version", "1.1"),
+        "REMOTE_ADDR":       (scope.get("client") or ("", 0))[0],
+        "wsgi.version":      (1, 0),
+        "wsgi.url_scheme":   scope.get("scheme", "http"),
+        "wsgi.input":        io.BytesIO(body),
+        "wsgi.errors":       sys.stderr,
+        "wsgi.multithread":  True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once":     False,
+    }
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        key = name if name in ("CONTENT_TYPE", "CONTENT_LENGTH") else "HTTP_" + name
+        environ[key] = environ[key] + "," + value if key in environ else value
+    return environ
+
+
+async def _asgi_wsgi(scope, receive, send):
+    """Run the Flask app for one request in a worker thread, streaming its body back."""
+    import asyncio
+    loop    = asyncio.get_running_loop()
+    environ = _wsgi_environ(scope, await _asgi_body(receive))
+
+    def run():
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            started[:] = [int(status.split(" ", 1)[0]),
+                          [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]]
+            return lambda data: None
+
+        def emit(msg):
+            asyncio.run_coroutine_threadsafe(send(msg), loop).result()
+
+        result = app.wsgi_app(environ, start_response)
+        try:
+            sent_start = False
+            for chunk in result:
+                if not chunk:
+                    continue
+                if not sent_start:
+                    emit({"type": "http.response.start", "status": started[0], "headers": started[1]})
+                    sent_start = True
+                emit({"type": "http.response.body", "body": chunk, "more_body": True})
+            if not sent_start:
+                emit({"type": "http.response.start", "status": started[0], "headers": started[1]})
+            emit({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+
+    await _in_thread(run)
+
+
+async def asgi_app(scope, receive, send):
+    """ASGI entry point — async handlers for the I/O routes, Flask for the rest."""
+    global _aclient
+    if scope["type"] == "lifespan":
+        while True:
+            msg = await receive()
+            if msg["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif msg["type"] == "lifespan.shutdown":
+                if _aclient is not None:
+                    await _aclient.aclose()
+                    _aclient = None
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+    handler = _ASYNC_ROUTES.get((scope["method"], scope["path"]))
+    if handler is None or backend("httpx") is None:
+        return await _asgi_wsgi(scope, receive, send)
+    from urllib.parse import parse_qsl
+    query = dict(parse_qsl(scope.get("query_string", b"").decode("latin-1")))
+    status, payload = await handler(query, await _asgi_body(receive))
+    accept = dict(scope.get("headers", [])).get(b"accept-encoding", b"").decode("latin-1")
+    await _asgi_json(send, status, payload, accept)
+
+
+def serve_asgi(host="127.0.0.1", port=5000, ready=None):
+    """Serve asgi_app with uvicorn; `ready` (an Event) is set once the socket is
+    bound.  A failed bind raises before `ready` is touched."""
+    import socket
+    import uvicorn
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    try:
+        sock.bind((host, port))
+    except OSError:
+        sock.close()
+        raise
+    if ready is not None:
+        ready.set()
+    config = uvicorn.Config(asgi_app, lifespan="on", log_level="warning")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+# ── Production server — pre-fork workers for shared deployments ──────────────
+# `python sitemap_server.py --prod [--workers N] [--threads T]` serves the app
+# from N forked processes (default: one per CPU) with T request threads each,
+# so extraction and parsing scale past one interpreter's GIL.  gunicorn's
+# gthread workers are used when installed; otherwise a built-in pre-fork loop
+# shares one listening socket between Werkzeug servers.  Either way state the
+# workers must agree on goes through shared_state().
+
+PROD_THREADS = 8
+
+
+def _after_fork():
+    """Pools, sockets and browsers are per-process — a forked worker starts its own."""
+    global _http_session, _http_lock, _store, _prefetch_pool, _job_executor, _job_publisher
+    global _pw_owner, _pw_instance, _pw_browser, _aclient, _asgi_pool, _docx_pool
+    _http_session, _http_lock = None, threading.Lock()
+    _store = None
+    _prefetch_cache.clear()
+    _prefetch_pool = None
+    _jobs.clear()
+    _job_executor = _job_publisher = None
+    _pw_owner = _pw_instance = _pw_browser = None
+    _aclient = _asgi_pool = _docx_pool = None
+    _host_next.clear()
+
+
+def _serve_gunicorn(host, port, workers, threads):
+    from gunicorn.app.base import BaseApplication
+
+    class _App(BaseApplication):
+        def load_config(self):
+            for k, v in {"bind": f"{host}:{port}", "workers": workers, "threads": threads,
+                         "worker_class": "gthread", "timeout": 120, "graceful_timeout": 30}.items():
+                self.cfg.set(k, v)
+
+        def load(self):
+            return app
+
+    _App().run()
+
+
+def _prefork_worker(sock, threads):
+    from concurrent.futures import ThreadPoolExecutor
+    from werkzeug.serving import ThreadedWSGIServer
+
+    class _PooledServer(ThreadedWSGIServer):
+        """Werkzeug's threaded server with a fixed-size request pool."""
+        pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="crawlsync-http")
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self.process_request_thread, request, client_address)
+
+    host, port = sock.getsockname()[:2]
+    _PooledServer(host, port, app, fd=sock.fileno()).serve_forever()
+
+
+def _serve_prefork(host, port, workers, threads):
+    import signal
+    import socket
+    sock = socket.create_server((host, port), backlog=1024)
+    sock.set_inheritable(True)
+    children, stopping = set(), []
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                _prefork_worker(sock, threads)
+            except BaseException:
+                code = 1
+            finally:
+                os._exit(code)
+        children.add(pid)
+
+    def stop(signum, frame):
+        stopping.append(signum)
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+    restarts = []
+    while children:
+        try:
+            pid, _ = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        children.discard(pid)
+        if stopping:
+            continue
+        # Replace a crashed worker, but don't spin if they die on start-up
+        now = time.monotonic()
+        restarts = [t for t in restarts if now - t < 10] + [now]
+        if len(restarts) > workers * 3:
+            print("[prod] workers keep exiting — shutting down", file=sys.stderr)
+            stop(signal.SIGTERM, None)
+            continue
+        print(f"[prod] worker {pid} exited — starting a replacement", file=sys.stderr)
+        spawn()
+    sock.close()
+
+
+def serve_production(host="127.0.0.1", port=5000, workers=None, threads=PROD_THREADS, shared_db=None):
+    """Serve the app from `workers` processes (default: CPU count) × `threads` threads."""
+    global SHARED_DB, _shared
+    workers = max(1, workers or os.cpu_count() or 1)
+    SHARED_DB = shared_db or SHARED_DB or os.path.join(os.path.expanduser("~"), "CrawlSync", "shared.db")
+    os.environ["CRAWLSYNC_SHARED"] = SHARED_DB      # for workers that re-import the module
+    _shared = None
+    shared_state().reset()
+    shared_state().close()                          # nothing SQLite crosses the fork
+    if not hasattr(os, "fork"):
+        print("[prod] no fork() on this platform — serving a single process", file=sys.stderr)
+        app.run(host=host, port=port, threaded=True)
+        return
+    os.register_at_fork(after_in_child=_after_fork)
+    if backend_available("gunicorn"):
+        _serve_gunicorn(host, port, workers, threads)
+    else:
+        _serve_prefork(host, port, workers, threads)
+
+
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_T0
+
+
 if __name__ == "__main__":
-    print("CrawlSync server running → http://localhost:5000")
-    app.run(port=5000, debug=False)
+    import argparse
+    ap = argparse.ArgumentParser(description="CrawlSync API server")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=5000)
+    mode = ap.add_mutually_exclusive_group()
+    mode.add_argument("--asgi", action="store_true", help="async I/O handlers under uvicorn")
+    mode.add_argument("--prod", action="store_true", help="pre-fork multi-process server")
+    ap.add_argument("--workers", type=int, default=int(os.environ.get("CRAWLSYNC_WORKERS") or 0),
+                    help="--prod worker processes (default: CPU count)")
+    ap.add_argument("--threads", type=int, default=PROD_THREADS, help="--prod threads per worker")
+    args = ap.parse_args()
+    url = f"http://{args.host}:{args.port}"
+    if args.asgi:
+        print(f"CrawlSync server (ASGI) running → {url}")
+        serve_asgi(args.host, args.port)
+    elif args.prod:
+        workers = args.workers or os.cpu_count() or 1
+        print(f"CrawlSync server running → {url} ({workers} workers × {args.threads} threads)")
+        serve_production(args.host, args.port, workers, args.threads)
+    else:
+        print(f"CrawlSync server running → {url}")
+        app.run(host=args.host, port=args.port, debug=False)
@@ -1,82 +1,50 @@
 import streamlit as st
-import requests
-from bs4 import BeautifulSoup
-import pandas as pd
-from urllib.parse import urlparse, urljoin
 import time
 
+from sitemap_server import CrawlCache, follow_job, url_inventory, filter_inventory, IMAGE_EXTS, DOC_EXTS
+
 # --- CONFIGURATION ---
 st.set_page_config(page_title="Sitemap CrawlSync", layout="wide")
 
 # --- CORE LOGIC (PYTHON) ---
-def get_sitemap_urls(url):
+@st.cache_resource
+def crawl_cache():
     """
-    Determines the sitemap URL. Checks robots.txt first, then falls back to /sitemap.xml.
+    Crawl results shared by every session, per domain, until they expire.
     """
-    url = url.strip()
-    if not url.startswith("http"):
-        url = "https://" + url
-    
-    # If user provided a direct xml link
-    if url.endswith(".xml") or url.endswith(".xml.gz"):
-        return url
-
-    # Check robots.txt
-    domain = f"{urlparse(url).scheme}://{urlparse(url).netloc}"
-    robots_url = urljoin(domain, "robots.txt")
-    
-    try:
-        response = requests.get(robots_url, timeout=10)
-        if response.status_code == 200:
-            for line in response.text.splitlines():
-                if line.lower().startswith("sitemap:"):
-                    return line.split(":", 1)[1].strip()
-    except Exception:
-        pass
+    return CrawlCache()
 
-    # Fallback
-    return urljoin(domain, "sitemap.xml")
+@st.cache_resource(max_entries=16)
+def job_inventory(_job, job_id):
+    """
+    URL inventory (sorted URLs + feature columns) for a finished crawl, built once per crawl.
+    """
+    return url_inventory(_job.result["urls"] if _job.result else [])
 
-def parse_sitemap(url, found_urls=None, recursive=True):
+def extract_sitemap_urls(target, recursive=True, refresh=False):
     """
-    Recursively parses sitemaps to find all URLs.
+    Extracts all URLs for a domain or sitemap URL via the shared crawl cache,
+    streaming progress into a status box as each sitemap is scanned.
     """
-    if found_urls is None:
-        found_urls = set()
-    
-    # Avoid processing the same sitemap twice
-    if url in found_urls: 
-        return found_urls
-    
-    try:
-        with st.spinner(f"Fetching {url}..."):
-            headers = {'User-Agent': 'Mozilla/5.0 (compatible; SitemapExtractor/1.0)'}
-            response = requests.get(url, headers=headers, timeout=10)
-            
-            # Handle XML parsing
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'xml')
-                
-                # 1. Check for Nested Sitemaps (SitemapIndex)
-                sitemaps = soup.find_all("sitemap")
-                if sitemaps and recursive:
-                    for sm in sitemaps:
-                        loc = sm.find("loc")
-                        if loc:
-                            # Recursion
-                            parse_sitemap(loc.text.strip(), found_urls, recursive)
-                
-                # 2. Check for actual URLs (urlset)
-                urls = soup.find_all("url")
-                for tag in urls:
-                    loc = tag.find("loc")
-                    if loc:
-                        found_urls.add(loc.text.strip())
-                        
-    except Exception as e:
-        st.error(f"Error fetching {url}: {e}")
+    budget = None if recursive else {"max_depth": 0}
+    job, hit = crawl_cache().lookup(target, budget=budget, refresh=refresh)
+
+    with st.status("Crawling sitemaps...", expanded=True) as status:
+        seen = 0
+        if hit and job.finished:
+            seen = len(job.log)
+            st.write("Served from the shared cache.")
+        for lines in follow_job(job, seen):
+            for line in lines:
+                if line.startswith(("Scanning:", "Using ", "Could not fetch", "Budget exhausted")):
+                    st.write(line)
+            status.update(label=f"Crawling sitemaps... {len(job.visited)} scanned, {len(job.collected):,} URLs")
 
-    return found_urls
+        if job.status == "error":
+            status.update(label=f"Error crawling {target}: {job.error}", state="error")
+            return None
+        status.update(label=f"Scanned {len(job.visited)} sitemap(s)", state="complete", expanded=False)
+    return job_inventory(job, job.id)
 
 # --- UI LAYOUT ---
 st.title("Sitemap **Crawl**Sync (Python Native)")
@@ -89,9 +57,10 @@ with col1:
         st.subheader("Target")
         target_url = st.text_input("Domain or Sitemap URL", placeholder="example.com")
         recursive_mode = st.checkbox("Recursive Search (Follow Sitemap Indexes)", value=True)
+        refresh_mode = st.checkbox("Ignore cached results", value=False)
         start_btn = st.button("Start Extraction", type="primary", use_container_width=True)
 
-    if 'results' in st.session_state and st.session_state.results:
+    if st.session_state.get('results') is not None and len(st.session_state.results):
         with st.container(border=True):
             st.subheader("Filters")
             search_term = st.text_input("Must Contain", placeholder="/products/")
@@ -102,36 +71,23 @@ with col1:
 with col2:
     if start_btn and target_url:
         # Reset previous results
-        st.session_state.results = set()
+        st.session_state.results = None
         
-        # 1. Find the master sitemap
-        master_sitemap = get_sitemap_urls(target_url)
-        st.info(f"Targeting Sitemap: {master_sitemap}")
-        
-        # 2. Crawl
-        extracted = parse_sitemap(master_sitemap, recursive=recursive_mode)
-        st.session_state.results = list(extracted) # Convert to list for display
-        st.success(f"Extraction Complete! Found {len(st.session_state.results)} URLs.")
+        # Crawl (robots.txt discovery + sitemap indexes), or reuse a cached crawl.
+        # Results are kept as a URL inventory: sorted once, with feature columns for filtering
+        st.session_state.results = extract_sitemap_urls(target_url, recursive=recursive_mode, refresh=refresh_mode)
+        if st.session_state.results is not None:
+            st.success(f"Extraction Complete! Found {len(st.session_state.results)} URLs.")
 
     # --- RESULT DISPLAY ---
-    if 'results' in st.session_state and st.session_state.results:
-        df = pd.DataFrame(st.session_state.results, columns=["URL"])
-        
-        # Apply Filters
-        if 'search_term' in locals() and search_term:
-            df = df[df['URL'].str.contains(search_term, case=False)]
-        
-        if 'exclude_term' in locals() and exclude_term:
-            df = df[~df['URL'].str.contains(exclude_term, case=False)]
-            
-        if 'file_type' in locals():
-            if file_type == "Images":
-                df = df[df['URL'].str.contains(r'\.(jpg|jpeg|png|webp|gif|svg)$', case=False, regex=True)]
-            elif file_type == "PDFs":
-                df = df[df['URL'].str.contains(r'\.pdf$', case=False, regex=True)]
-
-        # Sort
-        df = df.sort_values("URL").reset_index(drop=True)
+    if st.session_state.get('results') is not None and len(st.session_state.results):
+        # Apply Filters — column lookups on the precomputed features, already sorted
+        exts = {"Images": IMAGE_EXTS, "PDFs": DOC_EXTS}.get(locals().get('file_type'))
+        inv = filter_inventory(st.session_state.results,
+                               contains=locals().get('search_term', ''),
+                               exclude=locals().get('exclude_term', ''),
+                               exts=exts)
+        df = inv[["url"]].rename(columns={"url": "URL"}).reset_index(drop=True)
 
         st.markdown(f"### Results ({len(df)})")
         
@@ -143,5 +99,5 @@ with col2:
         # Dataframe Display
         st.dataframe(df, use_container_width=True, height=500)
     
-    elif start_btn:
+    elif start_btn and st.session_state.get('results') is not None:
         st.warning("No URLs found. Check if the sitemap exists or is blocked.")